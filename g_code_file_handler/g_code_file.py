@@ -1,4 +1,5 @@
 import copy
+from typing import Iterator
 from pydantic import StrictInt, StrictStr, StrictFloat, Field, BaseModel
 from configs.configs import PrintConfig, SlicerVendor
 from configs.exceptions import (
@@ -94,3 +95,25 @@ class GCodeFile:
                 raise EndofFile("Slicer Vendor can not be read from file")
 
         return line.strip()
+
+    def commands(self) -> Iterator[str]:
+        """
+        Yields all remaining commands, until the end of file.
+        """
+        while True:
+            try:
+                yield self.next_gcode_command()
+            except EndofFile:
+                return
+
+    def tell(self) -> int:
+        """
+        Position in file, from which the next command will be read.
+        """
+        return self.file_handle.tell()
+
+    def seek(self, offset: int) -> None:
+        """
+        Continue reading from position returned by `tell`.
+        """
+        self.file_handle.seek(offset)
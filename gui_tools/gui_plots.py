@@ -11,6 +11,7 @@ import matplotlib
 from typing import Tuple, List, Optional, Dict
 
 from printer_device_connector.prusa_device import PrusaDevice
+from printer_device_connector.trajectory import Trajectory
 
 # from pass_generators.simple_pass import simple_pass_3d
 
@@ -62,24 +63,21 @@ class PathPlotCanvas(FigureCanvas):
 
     def plot_data(
             self,
-            path: List[Point],
-            antenna_path: List[Point],
+            path: Trajectory,
+            antenna_path: Trajectory,
             antenna_measurement_diameter: float,
             highlight: Optional[Point] = None,
     ):
-        max_x = np.max([point[0] for point in path])
-        max_y = np.max([point[1] for point in path])
-        min_x = np.min([point[0] for point in path])
-        min_y = np.min([point[1] for point in path])
+        (min_x, min_y, _), (max_x, max_y, _) = path.bounds()
 
         x_printer_boundaries = (min_x, min_x, max_x, max_x, min_x)
         y_printer_boundaries = (min_y, max_y, max_y, min_y, min_y)
 
-        x = [pos[0] for pos in path]
-        y = [pos[1] for pos in path]
+        x = path.x
+        y = path.y
 
-        antenna_x = [pos[0] for pos in antenna_path]
-        antenna_y = [pos[1] for pos in antenna_path]
+        antenna_x = antenna_path.x
+        antenna_y = antenna_path.y
 
         self.axes2.cla()
 
@@ -147,24 +145,21 @@ class MeasurementsPlotCanvas(FigureCanvas):
 
     def plot_data(
             self,
-            path: List[Tuple[float, float, float]],
+            path: Trajectory,
             measurements: Optional[Dict[str, List[Tuple[float, float, float, float]]]],
             plot_title: str = "Some Measurement using Unknown analyzer at 69 Hz",
             color_bar_label="no label"
     ):
         self.axes.cla()
 
-        x_labels = np.unique([x for x, _, _ in path])
-        y_labels = np.unique([y for _, y, _ in path])
+        x_labels = np.unique(path.x)
+        y_labels = np.unique(path.y)
 
         filler = (self.min + self.max) / 2
 
         plot_data: Dict[float, Dict[float, float]] = {}
 
-        for id, val in enumerate(path):
-            x = val[0]
-            y = val[1]
-            z = val[2]
+        for id, (x, y, z) in enumerate(path):
             if measurements is not None and id < len(measurements["m"]):
                 m = measurements["m"][id]
             else:
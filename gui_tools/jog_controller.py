@@ -0,0 +1,69 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from gui_tools.gui_buttons import PrinterHeadPositionController
+from printer_device_connector.device import Device
+from printer_device_connector.jog import JogWorker
+
+Direction = PrinterHeadPositionController.Direction
+
+# head displacement of single button press, in mm
+_STEPS = {
+    Direction.UP: (0, 0, 1),
+    Direction.DOWN: (0, 0, -1),
+    Direction.RIGHT: (1, 0, 0),
+    Direction.LEFT: (-1, 0, 0),
+    Direction.FORWARD: (0, 1, 0),
+    Direction.BACK: (0, -1, 0),
+}
+
+
+class JogController(QObject):
+    """
+    **Qt front of `JogWorker`.**
+    Button presses return immediately, position is reported with `position_changed` signal,
+    emitted from worker thread and delivered to slots in GUI thread.
+    """
+
+    position_changed = pyqtSignal(float, float, float)
+    jog_failed = pyqtSignal(str)
+
+    def __init__(self, printer: Device, step: float = 1, center_height: float = 10) -> None:
+        super().__init__()
+        self.printer = printer
+        self.step = step
+        self.center_height = center_height
+        self.worker = JogWorker(printer, on_position=self._report_position, on_error=self._report_error)
+
+    def move(self, direction: Direction) -> None:
+        if direction == Direction.HOME:
+            self.worker.home()
+
+        elif direction == Direction.CENTER:
+            target = self.worker.target
+            if target is None:
+                self.jog_failed.emit("Head position is unknown, home axes first")
+                return
+
+            x, y, z = target
+            z = max(z, self.center_height)
+            self.worker.send(
+                f"G1 X{x} Y{y} Z{z}",
+                f"G1 X{self.printer.x_size / 2} Y{self.printer.y_size / 2} Z{z}",
+            )
+
+        else:
+            x, y, z = _STEPS[direction]
+            try:
+                self.worker.jog(x * self.step, y * self.step, z * self.step)
+            except ValueError as error:
+                self._report_error(error)
+
+    def close(self) -> None:
+        self.worker.close()
+
+    def _report_position(self, position) -> None:
+        if position is not None and None not in position:
+            self.position_changed.emit(*position)
+
+    def _report_error(self, error: Exception) -> None:
+        self.jog_failed.emit(str(error))
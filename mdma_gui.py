@@ -31,13 +31,17 @@ from gui_tools.gui_buttons import (
     SingleParamInput,
 )
 from gui_tools.gui_plots import *
+from gui_tools.jog_controller import JogController
 from hapmd.src.hameg_ci import set_up_hamed_device
 
 from typing import Union
 
+from printer_device_connector.checkpoint import Checkpoint, CheckpointJournal
+from printer_device_connector.device import MotionSync
 from printer_device_connector.device_mock import PrinterDeviceMock
 from printer_device_connector.marlin_device import MarlinDevice
 from printer_device_connector.prusa_device import PrusaDevice
+from printer_device_connector.serial_device import SerialDevice
 from gui_tools.gui_plots import Point
 from hapmd.src.hameg3010.hameg3010device import Hameg3010Device
 from hapmd.src.hameg3010.hameg3010device_mock import Hameg3010DeviceMock
@@ -46,6 +50,8 @@ from pocket_vna_main import PocketVnaDevice, PocketVnaDeviceMock
 
 PRINTER_DEBUG_MODE = False
 ANALYZER_DEBUG_MODE = False
+# progress of interrupted scan, scan with the same config continues from it
+SCAN_JOURNAL_PATH = "scan_checkpoint.json"
 
 
 class MainWindow(QMainWindow):
@@ -68,6 +74,10 @@ class MainWindow(QMainWindow):
         else:
             self.printer: MarlinDevice = MarlinDevice.connect_on_port("COM5")
 
+        self.jog_controller = JogController(self.printer)
+        self.jog_controller.position_changed.connect(self.on_position_changed)
+        self.jog_controller.jog_failed.connect(lambda error: print(f"jog failed: {error}"))
+
     def innit_ui(self):
         self._measurements_plot_canvas = None
         self._path_plot_canvas = None
@@ -241,54 +251,11 @@ class MainWindow(QMainWindow):
         )
 
     def move_extruder(self, direction: PrinterHeadPositionController.Direction):
-        print(
-            f"moving extruder: {direction}, current position: {self.printer.current_position.as_tuple()}"
-        )
-
-        new_position = self.printer.current_position
-
-        if direction == PrinterHeadPositionController.Direction.UP:
-            new_position.z += 1
-
-        elif direction == PrinterHeadPositionController.Direction.DOWN:
-            new_position.z -= 1
+        # returns immediately, presses made before the head arrives are merged into one move
+        self.jog_controller.move(direction)
 
-        elif direction == PrinterHeadPositionController.Direction.RIGHT:
-            new_position.x += 1
-
-        elif direction == PrinterHeadPositionController.Direction.LEFT:
-            new_position.x -= 1
-
-        elif direction == PrinterHeadPositionController.Direction.FORWARD:
-            new_position.y += 1
-
-        elif direction == PrinterHeadPositionController.Direction.BACK:
-            new_position.y -= 1
-
-        elif direction == PrinterHeadPositionController.Direction.HOME:
-            self.printer.send_and_await("G28")
-            print(f"new position: {self.printer.current_position.as_tuple()}")
-            return
-
-        elif direction == PrinterHeadPositionController.Direction.CENTER:
-            if self.printer.current_position.z < 10:
-                new_position.z = 10
-                self.printer.send_and_await(
-                    f"G1 X {self.printer.current_position.x} Y {self.printer.current_position.y} Z {new_position.z}"
-                )
-
-            self.printer.send_and_await(
-                f"G1 X {self.printer.x_size / 2} Y {self.printer.y_size / 2} Z {new_position.z}"
-            )
-
-            print(f"new position: {self.printer.current_position.as_tuple()}")
-            return
-
-        self.printer.send_and_await(
-            f"G1 X {new_position.x} Y {new_position.y} Z {new_position.z}"
-        )
-
-        print(f"new position: {self.printer.current_position.as_tuple()}")
+    def on_position_changed(self, x: float, y: float, z: float):
+        print(f"new position: {(x, y, z)}")
 
     def save_data(self):
         if self.measurement is None:
@@ -494,12 +461,27 @@ class MainWindow(QMainWindow):
         return f"{self.scan_type_btn.text()}, resolution {self.pass_heigth_measurement_radius_btn.val_b} mm, {self.measure_freq_btn.val_a / 10 ** 9}GHz", cbar_title
 
     def start_thread(self):
+        stopped_mid_scan = (
+                self.thread is not None
+                and self.start_stop_measurement_button.state == StartStopContinueButton.State.START
+                and isinstance(self.printer, SerialDevice)
+        )
+        if stopped_mid_scan:
+            # head stops now, not after the move to next point is done
+            self.printer.send_realtime("M410")
+
         if self.thread is not None:
             print("thread is already running")
             self.thread.join()
             print("thread is closed")
             self.thread = None
 
+        if stopped_mid_scan:
+            # quickstop leaves head between points
+            position = self.printer.query_position()
+            if position is not None:
+                self.printer.set_current_position(*position)
+
         if (
                 self.start_stop_measurement_button.state
                 == StartStopContinueButton.State.START
@@ -508,6 +490,8 @@ class MainWindow(QMainWindow):
             return
 
         self.connect_to_analyzer_device()
+        # scan takes over the printer, once the last jog is done
+        self.jog_controller.worker.wait()
 
         self.update_path()
         if len(self.path) == 0:
@@ -540,10 +524,7 @@ class MainWindow(QMainWindow):
         self.thread.start()
 
     def run_outline(self):
-        max_x = np.max([x for x, _, _ in self.path])
-        max_y = np.max([y for _, y, _ in self.path])
-        min_x = np.min([x for x, _, _ in self.path])
-        min_y = np.min([y for _, y, _ in self.path])
+        (min_x, min_y, _), (max_x, max_y, _) = self.path.bounds()
 
         print((max_x, max_y, min_x, min_y))
 
@@ -553,13 +534,15 @@ class MainWindow(QMainWindow):
         z = self.pass_heigth_measurement_radius_btn.val_a + 5
         self.printer.speed = 1500
 
-        self.printer.send_and_await(
+        outline = [
             f"G1 X{self.printer.current_position.x} Y{self.printer.current_position.y} Z{z}"
-        )
+        ]
+        outline += [
+            f"G1 X{x} Y{y} Z{z}"
+            for x, y in zip(x_printer_boundaries, y_printer_boundaries)
+        ]
 
-        for x, y in zip(x_printer_boundaries, y_printer_boundaries):
-            self.printer.send_and_await(f"G1 X{x} Y{y} Z{z}")
-            print(f"\tx:{x}\ty:{y}\tz:{z}")
+        self.printer.stream(outline)
 
         self.printer.speed = 800
 
@@ -571,8 +554,7 @@ class MainWindow(QMainWindow):
             scan_val = get_level(self.analyzer, int(self.measure_freq_btn.val_a), 2)
 
             while scan_val > -17 or scan_val < -22:
-                print(f"\tmeasurement:{scan_val}")
-                print(f"\trepeating measurement")
+                self.printer.traffic_log.event("measurement out of range: %s, repeating", scan_val)
                 scan_val = get_level(self.analyzer, int(self.measure_freq_btn.val_a), 2)
 
             return round(scan_val, 4)
@@ -619,8 +601,40 @@ class MainWindow(QMainWindow):
 
             self.measurements_plot_canvas.draw()
 
+    def load_scan_checkpoint(self, journal: CheckpointJournal) -> Optional[Checkpoint]:
+        """
+        Checkpoint of interrupted scan with current config, None if scan has to start from the first point.
+        """
+        checkpoint = journal.load()
+        if (
+                checkpoint is None
+                or checkpoint.job != json.dumps(self.get_config_dict(), sort_keys=True)
+                or checkpoint.path_index is None
+                or checkpoint.path_index >= len(self.path)
+        ):
+            return None
+        return checkpoint
+
+    def return_to_checkpoint(self, checkpoint: Checkpoint):
+        x, y, z = self.path[checkpoint.path_index]
+        safe_z = self.pass_heigth_measurement_radius_btn.val_a + 5
+
+        self.printer.stream([
+            f"G1 X{self.printer.current_position.x} Y{self.printer.current_position.y} Z{safe_z}",
+            f"G1 X{round(x, 3)} Y{round(y, 3)} Z{safe_z}",
+        ])
+
     def main_loop(self):
-        if self.scan_type_btn.text() in (
+        # written periodically, and once more when scan ends early
+        journal = CheckpointJournal(SCAN_JOURNAL_PATH)
+        checkpoint = self.load_scan_checkpoint(journal)
+        first_point = 0
+
+        if checkpoint is not None:
+            first_point = checkpoint.path_index
+            self.measurement = checkpoint.extra["measurement"]
+            print(f"Resuming scan from point {first_point} of {len(self.path)}")
+        elif self.scan_type_btn.text() in (
                 ScanType.ScalarAnalyzer.value,
                 ScanType.VectorAnalyzer.value,
         ):
@@ -628,69 +642,86 @@ class MainWindow(QMainWindow):
         self.update_plots()
         self.printer.startup_procedure()
         print("Measurement loop ")
-        self.run_outline()
-        time.sleep(4)
+        if checkpoint is None:
+            self.run_outline()
+            time.sleep(4)
+        else:
+            self.return_to_checkpoint(checkpoint)
+        # measure as soon as the head arrives, instead of after predicted time
+        self.printer.motion_sync = MotionSync.M400
 
-        total_path_length = len([x for x, _, _ in self.path])
+        total_path_length = len(self.path)
         elapsed_time = time.time()
+        print(f"Predicted motion time: {round(self.printer.predict_time_of_path(self.path) / 60, 2)}min")
 
-        for id, point in enumerate(self.path):
-            start_time = time.time()
-            x, y, z = point
+        log = self.printer.traffic_log
+        checkpoint = Checkpoint(job=json.dumps(self.get_config_dict(), sort_keys=True))
+        completed = False
+        try:
+            for id, point in enumerate(self.path.round(3)[first_point:], start=first_point):
+                start_time = time.time()
+                x, y, z = point
 
-            print("Moving...")
-            x = round(x, 3)
-            y = round(y, 3)
-            z = round(z, 3)
+                self.printer.send_and_await(f"G1 X{x} Y{y} Z{z}")
 
-            self.printer.send_and_await(f"G1 X{x} Y{y} Z{z}")
-
-            print(f"\tx:{x}\ty:{y}\tz:{z}")
-
-            if self.check_for_stop():
-                return
+                log.event("point %d: x:%s y:%s z:%s", id, x, y, z)
 
-            print("Scanning...")
+                if self.check_for_stop():
+                    return
 
-            scan_val = self.perform_scan()
+                scan_val = self.perform_scan()
 
-            print(f"\tmeasurement:{scan_val}")
+                log.event("measurement: %s", scan_val)
 
-            if self.scan_type_btn.text() in (
-                    ScanType.ScalarAnalyzer.value,
-                    ScanType.VectorAnalyzer.value,
-            ):
-                self.measurement["x"].append(self.antenna_path[id][0])
-                self.measurement["y"].append(self.antenna_path[id][1])
-                self.measurement["z"].append(self.antenna_path[id][2])
-                self.measurement["m"].append(scan_val)
+                if self.scan_type_btn.text() in (
+                        ScanType.ScalarAnalyzer.value,
+                        ScanType.VectorAnalyzer.value,
+                ):
+                    self.measurement["x"].append(self.antenna_path[id][0])
+                    self.measurement["y"].append(self.antenna_path[id][1])
+                    self.measurement["z"].append(self.antenna_path[id][2])
+                    self.measurement["m"].append(scan_val)
 
-            elif self.scan_type_btn.text() in (
-                    ScanType.ScalarAnalyzerBackground.value,
-                    ScanType.VectorAnalyzerBackground.value,
-            ):
-                self.measurement["m"][id] -= scan_val
+                elif self.scan_type_btn.text() in (
+                        ScanType.ScalarAnalyzerBackground.value,
+                        ScanType.VectorAnalyzerBackground.value,
+                ):
+                    self.measurement["m"][id] -= scan_val
 
-            else:
-                print(f"Scan type: {self.scan_type_btn.state} is not supported")
-
-            if self.check_for_stop():
-                return
-
-            print("Updating plots...")
-
-            self.update_plots(highlight=(x, y, z), draw_all_plots=False)
-
-            if self.check_for_stop():
-                return
+                else:
+                    print(f"Scan type: {self.scan_type_btn.state} is not supported")
+
+                checkpoint.path_index = id + 1
+                checkpoint.position = (x, y, z)
+                checkpoint.extra["measurement"] = self.measurement
+                journal.record(checkpoint)
+
+                if self.check_for_stop():
+                    return
+
+                self.update_plots(highlight=(x, y, z), draw_all_plots=False)
+
+                if self.check_for_stop():
+                    return
+
+                point_time = time.time() - start_time
+                left_time = point_time * (total_path_length - id - 1)
+                log.event(
+                    "time of measurement: %.2fs, elapsed time: %.2fmin, left time: %dh %dmin %ds",
+                    point_time,
+                    (time.time() - elapsed_time) / 60,
+                    left_time // 60 ** 2,
+                    left_time % 60 ** 2 // 60,
+                    left_time % 60,
+                )
 
-            print(
-                f"Time of measurement: {round(time.time() - start_time, 2)}s, "
-                f"elapsed time: {round((time.time() - elapsed_time) / 60, 2)}min, "
-                f"left time: {int(round(((time.time() - start_time) * (total_path_length - id - 1)) / (60 ** 2), 2))}h "
-                f"{int(round(((time.time() - start_time) * (total_path_length - id - 1)) / 60, 2))}min "
-                f"{int(round(((time.time() - start_time) * (total_path_length - id - 1)) % 60, 2))}s"
-            )
+            completed = True
+        finally:
+            if completed:
+                journal.clear()
+            elif "measurement" in checkpoint.extra:
+                # stopped or failed, periodic checkpoint may be behind the last measured point
+                journal.record(checkpoint, force=True)
 
         self.close_thread()
 
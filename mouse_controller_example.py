@@ -1,6 +1,6 @@
-import copy
 import enum
 import threading
+from printer_device_connector.jog import ContinuousJog
 from printer_device_connector.marlin_device import MarlinDevice
 from printer_device_connector.prusa_device import PrusaDevice
 import time
@@ -84,34 +84,25 @@ if __name__ == "__main__":
     variables = [ExtruderMovement.STAY, 0, 0]
     height = 0
 
-    previous_vars = None
-    previous_height = None
-
     thread = threading.Thread(
         target=window_loop,
         args=(variables,),
     )
     thread.start()
 
-    while thread.is_alive():
-        if previous_vars != variables or height != previous_height:
-            previous_vars = copy.deepcopy(variables)
-            previous_height = copy.copy(height)
-            x = round(variables[1], 2)
-            y = round(variables[2], 2)
-            z = height
-            # print(
-            #     f"direction: {str(vars[0])} position x: {x} position y: {y} height: {height}     \r",
-            #     end="",
-            # )
-            printer.send_and_await(f"G1 X{x} Y{y} Z{z}")
-
-        if variables[0] == ExtruderMovement.UP:
-            height += 1
+    # pointer position is sampled often, head follows it with short queued segments
+    with ContinuousJog(printer, feedrate=6000, queue_depth=3) as jog:
+        while thread.is_alive():
+            if variables[0] == ExtruderMovement.UP:
+                height += 0.2
 
-        if variables[0] == ExtruderMovement.DOWN and height > 0:
-            height -= 1
+            if variables[0] == ExtruderMovement.DOWN and height > 0:
+                height -= 0.2
 
-        time.sleep(0.1)
+            jog.follow(variables[1] * printer.x_size, variables[2] * printer.y_size, height)
+            time.sleep(0.02)
 
-    print("")
+        print(
+            f"segments sent: {jog.segments_sent}, targets dropped: {jog.targets_dropped}, "
+            f"latency: {jog.latency}s, segment length: {jog.segment_length}mm"
+        )
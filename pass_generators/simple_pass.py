@@ -1,5 +1,9 @@
 from typing import Tuple, List
 
+import numpy as np
+
+from printer_device_connector.trajectory import Trajectory
+
 
 def f_range(
     start: float = 0,
@@ -114,48 +118,37 @@ def simple_pass_3d_for_gui(
     antenna_offset: Tuple[float, float],
     antenna_measurement_radius: float,
     pass_height: float,
-) -> Tuple[List[Tuple[float, float, float]], List[Tuple[float, float, float]]]:
+) -> Tuple[Trajectory, Trajectory]:
     sample_size_x = sample_size[0]
     sample_size_y = sample_size[1]
 
-    x_measurements_coords = [
-        x
-        for x in f_range(
+    x_measurements_coords = np.array(
+        f_range(
             antenna_measurement_radius / 2,
             sample_size_x,
             antenna_measurement_radius,
             include_end=True,
         )
-    ]
-    y_measurements_coords = [
-        y
-        for y in f_range(
+    )
+    y_measurements_coords = np.array(
+        f_range(
             antenna_measurement_radius / 2,
             sample_size_y,
             antenna_measurement_radius,
             include_end=True,
         )
-    ]
-
-    path = []
-    flip = False
-    for x in x_measurements_coords:
-        flip = not flip
-        if flip:
-            for id in range(0, len(y_measurements_coords), 1):
-                path.append((x, y_measurements_coords[id]))
-        else:
-            for id in range(len(y_measurements_coords) - 1, -1, -1):
-                path.append((x, y_measurements_coords[id]))
-
-    antenna_path = [
-        (x + sample_shift_from_0_0[0], y + sample_shift_from_0_0[1], pass_height)
-        for x, y in path
-    ]
-
-    path = [
-        (x + antenna_offset[0], y + antenna_offset[1], pass_height)
-        for x, y, z in antenna_path
-    ]
+    )
+
+    # snake pattern, every second column is passed in reverse
+    y_columns = np.tile(y_measurements_coords, (len(x_measurements_coords), 1))
+    y_columns[1::2] = y_columns[1::2, ::-1]
+
+    antenna_path = Trajectory.from_xy(
+        np.repeat(x_measurements_coords, len(y_measurements_coords)),
+        y_columns.ravel(),
+        pass_height,
+    ).offset(sample_shift_from_0_0[0], sample_shift_from_0_0[1])
+
+    path = antenna_path.offset(antenna_offset[0], antenna_offset[1])
 
     return path, antenna_path
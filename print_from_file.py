@@ -1,27 +1,358 @@
-from g_code_file_handler.g_code_file import GCodeFile
-from configs.exceptions import EndofFile
-from printer_device_connector.marlin_device import MarlinDevice
+import queue
+import threading
 import time
+from collections import deque
+from typing import Callable, Deque, Iterator, Optional, Tuple
+
 from serial import SerialException
 
+from g_code_file_handler.g_code_file import GCodeFile
+from printer_device_connector.checkpoint import Checkpoint, CheckpointJournal
+from printer_device_connector.marlin_device import MarlinDevice
+
 from printer_device_connector.device import Device
-from printer_device_connector.prusa_device import PrusaDevice
+from printer_device_connector.serial_device import SerialDevice
 
 
-def print_from_file(printer: Device, file: GCodeFile) -> None:
-    print("Commencing Printing.")
-    while True:
+class PrintStatistics:
+    """
+    **Live statistics of file print.**
+
+    Attributes
+    ----------
+    **lines_sent : int**
+        Lines written to device
+
+    **lines_per_second : float**
+        Throughput during last report interval
+
+    **underruns : int**
+        Number of times sender had to wait for reader of file, firmware buffer may have drained meanwhile
+
+    **underrun_time : float**
+        Total time spent waiting for reader of file, in seconds
+    """
+
+    def __init__(self) -> None:
+        self.started: float = time.monotonic()
+        self.finished: Optional[float] = None
+        self.lines_sent: int = 0
+        self.lines_per_second: float = 0
+        self.underruns: int = 0
+        self.underrun_time: float = 0
+
+    @property
+    def elapsed(self) -> float:
+        return (time.monotonic() if self.finished is None else self.finished) - self.started
+
+    @property
+    def average_lines_per_second(self) -> float:
+        return self.lines_sent / self.elapsed if self.elapsed > 0 else 0
+
+    def __repr__(self) -> str:
+        return (
+            f"PrintStatistics(lines_sent={self.lines_sent}, elapsed={self.elapsed:.2f}s, "
+            f"lines_per_second={self.lines_per_second:.1f}, underruns={self.underruns}, "
+            f"underrun_time={self.underrun_time:.3f}s)"
+        )
+
+
+_END_OF_FILE = None
+
+
+class PrintEngine:
+    """
+    **Pipelined print of G-code file.**
+    Producer thread reads file ahead of sender: comments are stripped and lines are queued,
+    up to `lookahead` lines. Queued lines are streamed with `MarlinDevice.stream_lines`, which numbers and
+    check sums them as it writes them, keeping up to `window` of them unacknowledged, so firmware buffer stays full.
+    Devices without numbered lines get commands through `Device.stream`.
+    Either way lines go through supervisor of device and bounds checks, and stream tracks state of printer.
+
+    Parameters
+    ----------
+    **printer : Device**
+        Connected printer
+
+    **file : GCodeFile**
+        Printed file, read from its current position
+
+    **lookahead : int, optional**
+        Maximum number of prepared lines waiting for sender, **by default 256**
+
+    **window : int, optional**
+        Maximum number of unacknowledged lines, **by default stream window of printer**
+        (command buffer size reported by firmware, 4 for Marlin)
+
+    **report_interval : float, optional**
+        Time between progress reports, in seconds, **by default 1**
+
+    **on_progress : Callable[[PrintStatistics], None], optional**
+        Called with statistics every `report_interval`, by default statistics are logged in printer traffic log
+
+    **journal : CheckpointJournal, optional**
+        Journal of confirmed progress, lets print be continued with `resume_print`, **by default None**
+        File has to support `tell` and `seek`
+
+    **job : str, optional**
+        Name of job in checkpoints, by default file name
+    """
+
+    def __init__(
+            self,
+            printer: Device,
+            file: GCodeFile,
+            lookahead: int = 256,
+            window: Optional[int] = None,
+            report_interval: float = 1,
+            on_progress: Optional[Callable[[PrintStatistics], None]] = None,
+            journal: Optional[CheckpointJournal] = None,
+            job: Optional[str] = None,
+    ) -> None:
+        self.printer = printer
+        self.file = file
+        if window is None:
+            window = printer.stream_window if isinstance(printer, SerialDevice) else 1
+        self.window = window
+        self.report_interval = report_interval
+        self.on_progress = on_progress or self._log_progress
+        self.statistics = PrintStatistics()
+        self.journal = journal
+        self.job = getattr(file, "file_name", "") if job is None else job
+
+        self._lines: "queue.Queue[Optional[Tuple[str, Optional[int]]]]" = queue.Queue(maxsize=lookahead)
+        # state after each of the last `window` + 1 sent lines, the oldest one is acknowledged
+        self._sent_states: Deque[tuple] = deque(maxlen=window + 1)
+        self._stopped = threading.Event()
+        self._stopped_early = False
+        self._producer_error: Optional[Exception] = None
+
+    def run(self) -> PrintStatistics:
+        """
+        **Print file, block until all lines are acknowledged.**
+
+        Raises
+        ------
+        **SerialException**
+            Device stopped answering
+
+        Returns
+        -------
+        **PrintStatistics**
+            Final statistics
+        """
+        self.statistics = PrintStatistics()
+        producer = threading.Thread(target=self._produce, name="PrintEngine.producer", daemon=True)
+        producer.start()
+
+        numbered = isinstance(self.printer, MarlinDevice)
+        first_line_number = self.printer.line_counter if numbered else 0
         try:
-            command = file.next_gcode_command()
-            print(command)
-            # printer.send_and_await(command)
+            if numbered:
+                # lines are coalesced into writes within byte budget of firmware RX buffer
+                self.printer.stream_lines(self._queued_lines(), self.window, self.printer.rx_buffer_size)
+            else:
+                self.printer.stream(self._queued_lines(), self.window)
+        except SerialException:
+            self._record_checkpoint(force=True)
+            raise
+        finally:
+            self._stopped.set()
+            if numbered:
+                # line numbered by sender may be dropped before it was written, next line continues after written ones
+                written = self.printer.resend_buffer.last_line_number
+                self.printer.line_counter = (
+                    first_line_number if written is None or written < first_line_number else written + 1
+                )
+            # unblock producer waiting for free space
+            while producer.is_alive():
+                try:
+                    self._lines.get(timeout=0.01)
+                except queue.Empty:
+                    pass
+            self.statistics.finished = time.monotonic()
+
+        if self._producer_error is not None:
+            raise self._producer_error
+
+        if self.journal is not None:
+            if self._stopped_early:
+                # every sent line is acknowledged now
+                self._sent_states = deque(list(self._sent_states)[-1:], maxlen=1)
+                self._record_checkpoint(force=True)
+            else:
+                self.journal.clear()
+
+        self.on_progress(self.statistics)
+        return self.statistics
+
+    def stop(self) -> None:
+        """
+        Stop reading file, lines already sent are still acknowledged.
+        """
+        self._stopped_early = True
+        self._stopped.set()
+
+    def _produce(self) -> None:
+        journaled = self.journal is not None
+        try:
+            for command in self.file.commands():
+                offset = self.file.tell() if journaled else None
+                if self._stopped.is_set():
+                    break
+
+                command = command.partition(";")[0].strip()
+                if command == "":
+                    continue
+
+                self._put((command, offset))
+        except Exception as ex:
+            self._producer_error = ex
+        finally:
+            self._put(_END_OF_FILE)
+
+    def _put(self, item: Optional[Tuple[str, Optional[int]]]) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._lines.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _queued_lines(self) -> Iterator[str]:
+        statistics = self.statistics
+        last_report = time.monotonic()
+        lines_at_report = 0
+        state = self.printer.state
+        journal = self.journal
+
+        while True:
+            # lines waiting in queue are dropped at once, not sent
+            if self._stopped.is_set():
+                return
+
+            try:
+                item = self._lines.get_nowait()
+            except queue.Empty:
+                waiting_since = time.monotonic()
+                item = self._wait_for_line()
+                # waiting for the first line is start of print, not underrun
+                if statistics.lines_sent > 0:
+                    statistics.underruns += 1
+                    statistics.underrun_time += time.monotonic() - waiting_since
+
+            if item is _END_OF_FILE:
+                return
+
+            line, offset = item
+            # resumed once line is written, state of printer was already updated by stream
+            yield line
+            statistics.lines_sent += 1
+
+            if journal is not None:
+                self._sent_states.append((
+                    offset,
+                    state.position.as_tuple(),
+                    state.e,
+                    state.relative,
+                    state.relative_extrusion,
+                    state.inches,
+                    state.feedrate,
+                    state.temperatures,
+                ))
+                self._record_checkpoint()
+
+            now = time.monotonic()
+            if now - last_report >= self.report_interval:
+                statistics.lines_per_second = (statistics.lines_sent - lines_at_report) / (now - last_report)
+                last_report, lines_at_report = now, statistics.lines_sent
+                self.on_progress(statistics)
+
+    def _record_checkpoint(self, force: bool = False) -> None:
+        """
+        Journal state after the newest acknowledged line.
+        """
+        if self.journal is None or len(self._sent_states) < self._sent_states.maxlen:
+            return
+
+        checkpoint = Checkpoint(self.job)
+        (
+            checkpoint.offset,
+            checkpoint.position,
+            checkpoint.e,
+            checkpoint.relative,
+            checkpoint.relative_extrusion,
+            checkpoint.inches,
+            checkpoint.feedrate,
+            checkpoint.temperatures,
+        ) = self._sent_states[0]
+        self.journal.record(checkpoint, force)
+
+    def _wait_for_line(self) -> Optional[Tuple[str, Optional[int]]]:
+        while True:
+            try:
+                return self._lines.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return _END_OF_FILE
+
+    def _log_progress(self, statistics: PrintStatistics) -> None:
+        self.printer.traffic_log.event("%r", statistics)
+
+
+def print_from_file(printer: Device, file: GCodeFile) -> PrintStatistics:
+    print("Commencing Printing.")
+    statistics = PrintEngine(printer, file, on_progress=print).run()
+    print("Printing completed.")
+    return statistics
+
+
+def resume_print(printer: Device, file: GCodeFile, journal: CheckpointJournal, lift: float = 5) -> PrintStatistics:
+    """
+    **Continue print interrupted after last checkpoint in journal.**
+    Heaters are brought back to temperature, head is lifted and X, Y are rehomed
+    (Z is not, nozzle would hit printed part), then file is printed from the first not acknowledged line.
+
+    Parameters
+    ----------
+    **printer : Device**
+        Connected printer
+
+    **file : GCodeFile**
+        File that was printed
+
+    **journal : CheckpointJournal**
+        Journal written by interrupted print
+
+    **lift : float, optional**
+        Height above the last confirmed position, at which head travels, in mm, **by default 5**
+
+    Raises
+    ------
+    **ValueError**
+        Journal has no checkpoint of file print
+
+    Returns
+    -------
+    **PrintStatistics**
+        Statistics of resumed part of print
+    """
+    checkpoint = journal.load()
+    if checkpoint is None or checkpoint.offset is None:
+        raise ValueError(f"No print checkpoint in '{journal.path}'")
+
+    print(f"Resuming print of '{checkpoint.job}' from {checkpoint.position}.")
+    if isinstance(printer, MarlinDevice):
+        printer.set_line_number(0)
+    printer.stream(checkpoint.resume_commands(lift=lift))
 
-        except EndofFile as ex:
-            print("Printing completed.")
-            return None
+    file.seek(checkpoint.offset)
+    statistics = PrintEngine(printer, file, on_progress=print, journal=journal, job=checkpoint.job).run()
+    print("Printing completed.")
+    return statistics
 
 
 if __name__ == "__main__":
     printer = MarlinDevice.connect_on_port("COM8")
-    file = GCodeFile(file_name="C:\D\desk-spacer v6_0.15mm_PLA_MK3S_16m.gcode")
+    file = GCodeFile(file_name=r"C:\D\desk-spacer v6_0.15mm_PLA_MK3S_16m.gcode")
     print_from_file(printer=printer, file=file)
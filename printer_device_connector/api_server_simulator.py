@@ -0,0 +1,508 @@
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.motion_planner import PrinterProfile, estimate_move_time
+from printer_device_connector.rpc_device import MESSAGE_TERMINATOR, Status, parse_address
+
+# 'G1 X10', 'M104 S200', anything else is extended command, like 'FIRMWARE_RESTART'
+_GCODE = re.compile(r"^[GMT]\d")
+# accepted without any effect on simulated printer
+_IGNORED_COMMANDS = ("M18", "M84", "M106", "M107", "M204", "M220", "M221")
+
+_Block = Tuple[Tuple[float, float, float], Tuple[float, float, float], float]
+
+
+class ScriptError(Exception):
+    """
+    Command of script failed, request is answered with error.
+    """
+
+
+class _Client:
+    def __init__(self, connection: socket.socket) -> None:
+        self.connection = connection
+        self.write_lock = threading.Lock()
+        # objects/subscribe: subscribed objects, response template and last sent values
+        self.objects: Optional[Dict[str, Optional[List[str]]]] = None
+        self.status_template: Dict[str, Any] = {}
+        self.sent_status: Status = {}
+        # gcode/subscribe_output
+        self.output_template: Optional[Dict[str, Any]] = None
+
+
+class ApiServerSimulator:
+    """
+    **Local stand-in for Klipper API server, JSON-RPC over Unix socket or TCP.**
+    Serves simulated printer, so `RpcDevice` can be tested and benchmarked without Klipper:
+    `RpcDevice.connect_on_port(server.address)`.
+
+    Emulated behaviour:
+        - messages are JSON objects terminated with ETX (0x03),
+        - endpoints: info, emergency_stop, gcode/script, gcode/subscribe_output, objects/list, objects/query,
+          objects/subscribe (one subscription per connection, every call replaces it),
+        - scripts are executed one at a time, request is answered once all commands are processed,
+          moves are queued in planner and take time of trapezoidal motion profile of `PrinterProfile` limits,
+        - G0, G1, G4, G20, G21, G28, G90, G91, G92, M82, M83, M104, M109, M112, M114, M140, M190, M400,
+          FIRMWARE_RESTART, moves of not homed axes fail with 'Must home axis first',
+        - objects: toolhead (position, homed_axes), motion_report (live_position), idle_timeout (state),
+          webhooks (state, state_message), subscribers are notified on every change,
+          so every completed move is reported.
+
+    Parameters
+    ----------
+    **address : str, optional**
+        Path of Unix socket or 'host:port' of TCP server (port 0 picks free one),
+        **by default Unix socket in new temporary directory**
+
+    **time_scale : float, optional**
+        Multiplier of all simulated durations, values below 1 make simulation faster than real printer
+
+    **profile : PrinterProfile, optional**
+        Motion limits, **by default Prusa MK3S limits**
+    """
+
+    def __init__(
+            self,
+            address: Optional[str] = None,
+            time_scale: float = 1,
+            profile: Optional[PrinterProfile] = None,
+    ) -> None:
+        self.time_scale = time_scale
+        self.profile = PrinterProfile() if profile is None else profile
+
+        self._directory: Optional[str] = None
+        if address is None:
+            self._directory = tempfile.mkdtemp(prefix="api_server_simulator")
+            address = os.path.join(self._directory, "klippy_uds")
+
+        family, socket_address = parse_address(address)
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(socket_address)
+        self._listener.listen()
+        # accept is polled, so stop does not depend on closing socket waking it up
+        self._listener.settimeout(0.05)
+
+        if family == socket.AF_INET:
+            host, port = self._listener.getsockname()[:2]
+            address = f"{host}:{port}"
+        self.address: str = address
+        self._unix_path: Optional[str] = socket_address if family != socket.AF_INET else None
+
+        self._running = threading.Event()
+        self._clients: List[_Client] = []
+        self._clients_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        # scripts are executed one at a time, in order of arrival
+        self._gcode_lock = threading.Lock()
+        self._planner: Deque[_Block] = deque()
+        self._planner_condition = threading.Condition()
+
+        self._methods: Dict[str, Callable[[_Client, Dict[str, Any]], Any]] = {
+            "info": self._info,
+            "emergency_stop": self._emergency_stop,
+            "gcode/script": self._script,
+            "gcode/subscribe_output": self._subscribe_output,
+            "objects/list": self._list_objects,
+            "objects/query": self._query,
+            "objects/subscribe": self._subscribe,
+        }
+
+        self._reset_state()
+
+        # statistics
+        self.requests: int = 0
+        self.scripts: List[str] = []
+        self.moves_executed: int = 0
+
+    def __enter__(self) -> "ApiServerSimulator":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> "ApiServerSimulator":
+        self._running.set()
+        for target in (self._accept, self._stepper):
+            thread = threading.Thread(target=target, name=f"ApiServerSimulator.{target.__name__}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+    def stop(self) -> None:
+        self._running.clear()
+        with self._planner_condition:
+            self._planner_condition.notify_all()
+
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._listener.close()
+
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        elif self._unix_path is not None and os.path.exists(self._unix_path):
+            os.remove(self._unix_path)
+
+    def disconnect_clients(self) -> None:
+        """
+        Simulate server restart: every connection is closed, printer state is kept.
+        """
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @property
+    def position(self) -> Tuple[float, float, float]:
+        """
+        Position where all queued moves end.
+        """
+        return self._state.position.as_tuple()
+
+    @property
+    def live_position(self) -> Tuple[float, float, float]:
+        """
+        Position of the head at this moment.
+        """
+        with self._planner_condition:
+            if len(self._planner) == 0 or self._block_started is None:
+                return self._live_position
+
+            start, end, duration = self._planner[0]
+            progress = min((time.monotonic() - self._block_started) / max(duration, 1e-9), 1)
+            return tuple(s + (e - s) * progress for s, e in zip(start, end))
+
+    @property
+    def shutdown(self) -> bool:
+        return self._shutdown_message is not None
+
+    def _reset_state(self) -> None:
+        self._state = MachineState()
+        self._homed_axes: str = ""
+        self._live_position: Tuple[float, float, float] = (0, 0, 0)
+        self._block_started: Optional[float] = None
+        self._shutdown_message: Optional[str] = None
+
+    # connections
+
+    def _accept(self) -> None:
+        while self._running.is_set():
+            try:
+                connection, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            connection.settimeout(0.05)
+            client = _Client(connection)
+            with self._clients_lock:
+                self._clients.append(client)
+
+            thread = threading.Thread(target=self._serve, args=(client,), name="ApiServerSimulator.serve", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _serve(self, client: _Client) -> None:
+        buffer = bytearray()
+        try:
+            while self._running.is_set():
+                try:
+                    data = client.connection.recv(4096)
+                except socket.timeout:
+                    continue
+                if len(data) == 0:
+                    return
+                buffer += data
+
+                while MESSAGE_TERMINATOR in buffer:
+                    message, _, rest = bytes(buffer).partition(MESSAGE_TERMINATOR)
+                    buffer = bytearray(rest)
+                    self._handle(client, json.loads(message))
+        except OSError:
+            pass
+        finally:
+            with self._clients_lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            client.connection.close()
+
+    def _handle(self, client: _Client, message: Dict[str, Any]) -> None:
+        self.requests += 1
+        method = message.get("method", "")
+        handler = self._methods.get(method)
+
+        def respond() -> None:
+            response: Dict[str, Any] = {"id": message.get("id")}
+            try:
+                if handler is None:
+                    raise ScriptError(f"No registered endpoint '{method}'")
+                response["result"] = handler(client, message.get("params", {}))
+            except ScriptError as ex:
+                response["error"] = {"error": "WebRequestError", "message": str(ex)}
+            self._send(client, response)
+
+        if method == "gcode/script":
+            # script may wait for moves, other requests of the client (emergency_stop) are handled meanwhile
+            thread = threading.Thread(target=respond, name="ApiServerSimulator.script", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        else:
+            respond()
+
+    def _send(self, client: _Client, message: Dict[str, Any]) -> None:
+        with client.write_lock:
+            try:
+                client.connection.sendall(json.dumps(message).encode("utf-8") + MESSAGE_TERMINATOR)
+            except OSError:
+                pass
+
+    # endpoints
+
+    def _info(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "state": "shutdown" if self.shutdown else "ready",
+            "state_message": self._shutdown_message or "Printer is ready",
+            "software_version": "v0.12.0 (simulator)",
+            "hostname": "simulator",
+        }
+
+    def _emergency_stop(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._halt("Shutdown due to webhooks request")
+        return {}
+
+    def _script(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        script = params.get("script", "")
+        with self._gcode_lock:
+            self.scripts.append(script)
+            try:
+                for line in script.splitlines():
+                    self._execute(line.strip())
+            finally:
+                self._publish()
+
+        return {}
+
+    def _subscribe_output(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        client.output_template = params.get("response_template", {})
+        return {}
+
+    def _list_objects(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"objects": list(self._status().keys())}
+
+    def _query(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"eventtime": time.monotonic(), "status": self._select(params.get("objects", {}))}
+
+    def _subscribe(self, client: _Client, params: Dict[str, Any]) -> Dict[str, Any]:
+        status = self._select(params.get("objects", {}))
+        client.objects = params.get("objects", {})
+        client.status_template = params.get("response_template", {})
+        client.sent_status = status
+        return {"eventtime": time.monotonic(), "status": status}
+
+    # printer
+
+    def _status(self) -> Status:
+        x, y, z = self.position
+        live_x, live_y, live_z = self.live_position
+        with self._planner_condition:
+            printing = len(self._planner) > 0
+
+        return {
+            "toolhead": {"position": [x, y, z, self._state.e or 0], "homed_axes": self._homed_axes},
+            "motion_report": {"live_position": [live_x, live_y, live_z, self._state.e or 0]},
+            "idle_timeout": {"state": "Printing" if printing else "Ready"},
+            "webhooks": {
+                "state": "shutdown" if self.shutdown else "ready",
+                "state_message": self._shutdown_message or "Printer is ready",
+            },
+        }
+
+    def _select(self, objects: Dict[str, Optional[List[str]]], status: Optional[Status] = None) -> Status:
+        status = self._status() if status is None else status
+        selected: Status = {}
+        for name, fields in objects.items():
+            values = status.get(name, {})
+            selected[name] = dict(values) if fields is None else {
+                field: values[field] for field in fields if field in values
+            }
+        return selected
+
+    def _publish(self) -> None:
+        """
+        Send changed fields to subscribers.
+        """
+        with self._clients_lock:
+            clients = list(self._clients)
+
+        status = self._status()
+        for client in clients:
+            if client.objects is None:
+                continue
+
+            changed: Status = {}
+            for name, fields in self._select(client.objects, status).items():
+                sent = client.sent_status.setdefault(name, {})
+                diff = {field: value for field, value in fields.items() if sent.get(field) != value}
+                if len(diff) > 0:
+                    changed[name] = diff
+                    sent.update(diff)
+
+            if len(changed) > 0:
+                self._send(client, dict(client.status_template, params={"eventtime": time.monotonic(), "status": changed}))
+
+    def _respond(self, line: str) -> None:
+        with self._clients_lock:
+            clients = [client for client in self._clients if client.output_template is not None]
+        for client in clients:
+            self._send(client, dict(client.output_template, params={"response": line}))
+
+    def _execute(self, line: str) -> None:
+        if line == "" or line.startswith(";"):
+            return
+
+        if _GCODE.match(line.upper()) is None:
+            name = line.split()[0].upper()
+            if name == "FIRMWARE_RESTART":
+                self._restart()
+                return
+            self._check_ready()
+            self._respond(f'// Unknown command:"{name}"')
+            return
+
+        self._check_ready()
+        command = parse_line(line)
+        code = command.code
+
+        if command.is_move:
+            moved = "".join(axis for axis in "xyz" if command.get(axis.upper()) is not None)
+            if any(axis not in self._homed_axes for axis in moved):
+                raise ScriptError(f"Must home axis first: {line}")
+
+            start = self.position
+            feedrate = self._state.feedrate_of(command, default=1500)
+            self._state.apply(command)
+            duration = estimate_move_time(self.profile, start, self.position, feedrate) * self.time_scale
+            with self._planner_condition:
+                self._planner.append((start, self.position, duration))
+                self._planner_condition.notify_all()
+
+        elif code == "G28":
+            self._wait_for_moves()
+            self._state.apply(command)
+            axes = "".join(axis for axis in "xyz" if axis.upper() in command.params) or "xyz"
+            self._homed_axes = "".join(axis for axis in "xyz" if axis in self._homed_axes + axes)
+            self._live_position = self.position
+
+        elif code == "M400":
+            self._wait_for_moves()
+
+        elif code == "G4":
+            time.sleep((command.get("P") or 0) / 1000 * self.time_scale)
+
+        elif code == "M114":
+            x, y, z = self.position
+            self._respond(f"X:{x:.3f} Y:{y:.3f} Z:{z:.3f} E:{self._state.e or 0:.3f}")
+
+        elif code == "M112":
+            self._halt("Shutdown due to M112 command")
+            self._check_ready()
+
+        elif not self._state.apply(command) and code not in _IGNORED_COMMANDS:
+            self._respond(f'// Unknown command:"{code}"')
+
+    def _check_ready(self) -> None:
+        if self.shutdown:
+            raise ScriptError(f"Printer is shutdown: {self._shutdown_message}")
+
+    def _wait_for_moves(self) -> None:
+        with self._planner_condition:
+            while self._running.is_set() and len(self._planner) > 0:
+                self._planner_condition.wait()
+        self._check_ready()
+
+    def _halt(self, message: str) -> None:
+        # planned moves are dropped, head stays where it is, axes have to be homed again
+        with self._planner_condition:
+            self._live_position = self.live_position
+            self._planner.clear()
+            self._block_started = None
+            self._shutdown_message = message
+            self._homed_axes = ""
+            self._planner_condition.notify_all()
+        self._state.position.from_tuple(self._live_position)
+        self._publish()
+
+    def _restart(self) -> None:
+        with self._planner_condition:
+            self._planner.clear()
+            self._reset_state()
+            self._planner_condition.notify_all()
+
+    def _stepper(self) -> None:
+        while self._running.is_set():
+            with self._planner_condition:
+                while self._running.is_set() and len(self._planner) == 0:
+                    self._planner_condition.wait()
+                if not self._running.is_set():
+                    return
+                block = self._planner[0]
+                self._block_started = time.monotonic()
+            self._publish()
+
+            time.sleep(block[2])
+
+            with self._planner_condition:
+                if len(self._planner) > 0 and self._planner[0] is block:
+                    self._planner.popleft()
+                    self._live_position = block[1]
+                    self.moves_executed += 1
+                self._block_started = None
+                self._planner_condition.notify_all()
+            self._publish()
+
+
+if __name__ == "__main__":
+    from printer_device_connector.rpc_device import RpcDevice
+    from printer_device_connector.trajectory import Trajectory
+
+    path = Trajectory.from_xy([10 + x // 10 for x in range(100)], [10 + x % 10 for x in range(100)], 5)
+
+    with ApiServerSimulator(time_scale=0.1) as server:
+        printer = RpcDevice.connect_on_port(server.address)
+        printer.run_script(["G28", "G1 X10 Y10 Z5", "M400"])
+
+        start = time.monotonic()
+        for x, y, z in path[:20]:
+            printer.send_and_await(f"G1 X{x} Y{y} Z{z}")
+        print(f"send_and_await: 20 points in {time.monotonic() - start:.2f}s")
+
+        start = time.monotonic()
+        for row in path.rows():
+            printer.send_batch([f"G1 X{x} Y{y} Z{z}" for x, y, z in row] + ["M400"])
+        print(f"send_batch: {len(path)} points in {len(path.rows())} scripts, {time.monotonic() - start:.2f}s")
+        printer.close()
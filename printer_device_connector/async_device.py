@@ -0,0 +1,376 @@
+import asyncio
+import os
+from abc import abstractmethod
+from typing import Iterable, List, Optional
+
+from serial import Serial
+from serial import SerialException
+
+from printer_device_connector.device import Point3D
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.line_protocol import LineProtocol, Reply
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.resend_buffer import ResendBuffer
+from printer_device_connector.supervisor import DeviceResetError
+
+
+class AsyncSerialPort:
+    """
+    **Non-blocking serial port bound to asyncio event loop.**
+    Port is read only when data is available (`loop.add_reader`), received lines are queued for `readline`.
+    Writes that do not fit in OS buffer continue once port is writable again (`loop.add_writer`).
+    On event loops without file descriptor readers (Windows proactor) blocking reads and writes run in executor.
+    Once reading fails, `readline` raises the error after lines received before it.
+    """
+
+    def __init__(self, device: Serial) -> None:
+        self._device = device
+        self._loop = asyncio.get_running_loop()
+        self._lines: asyncio.Queue = asyncio.Queue()
+        self._buffer = bytearray()
+        self._executor_reader: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        # error that ended reading, queued lines are followed by None
+        self._error: Optional[Exception] = None
+
+        try:
+            self._loop.add_reader(self._device.fileno(), self._on_readable)
+            os.set_blocking(self._device.fileno(), False)
+        except (NotImplementedError, AttributeError):
+            self._device.timeout = 0.1
+            self._executor_reader = self._loop.create_task(self._read_in_executor())
+
+    @staticmethod
+    async def open(port: str, baudrate: int) -> "AsyncSerialPort":
+        return AsyncSerialPort(Serial(port=port, baudrate=baudrate, timeout=0))
+
+    async def readline(self, timeout: Optional[float] = None) -> bytes:
+        """
+        Next received line, empty line if none arrived within `timeout` seconds.
+
+        Raises
+        ------
+        **SerialException**
+            Reading port failed, all lines received before were already returned
+        """
+        try:
+            line = await asyncio.wait_for(self._lines.get(), timeout)
+        except asyncio.TimeoutError:
+            return bytes()
+
+        if line is None:
+            # every next call fails as well
+            self._lines.put_nowait(None)
+            raise SerialException(f"Reading port failed: {self._error}")
+        return line
+
+    async def write(self, data: bytes) -> None:
+        """
+        Write whole `data`, event loop keeps running while OS buffer is full.
+        """
+        if self._executor_reader is not None:
+            await self._loop.run_in_executor(None, self._device.write, data)
+            return
+
+        # concurrent writes are not interleaved
+        async with self._write_lock:
+            pending = memoryview(data)
+            while len(pending) > 0:
+                pending = pending[self._write_available(pending):]
+                if len(pending) > 0:
+                    await self._writable()
+
+    def _write_available(self, data: memoryview) -> int:
+        try:
+            return os.write(self._device.fileno(), data)
+        except BlockingIOError:
+            return 0
+        except OSError as ex:
+            raise SerialException(f"write failed: {ex}")
+
+    async def _writable(self) -> None:
+        writable = self._loop.create_future()
+        fd = self._device.fileno()
+        self._loop.add_writer(fd, writable.set_result, None)
+        try:
+            await writable
+        finally:
+            self._loop.remove_writer(fd)
+
+    def close(self) -> None:
+        if self._executor_reader is not None:
+            self._executor_reader.cancel()
+        else:
+            self._loop.remove_reader(self._device.fileno())
+        self._device.close()
+
+    def _on_readable(self) -> None:
+        try:
+            data = self._device.read(self._device.in_waiting or 1)
+        except (SerialException, OSError) as ex:
+            self._loop.remove_reader(self._device.fileno())
+            self._fail(ex)
+            return
+
+        self._split_lines(data)
+
+    async def _read_in_executor(self) -> None:
+        while True:
+            try:
+                data = await self._loop.run_in_executor(None, self._device.readline)
+            except (SerialException, OSError) as ex:
+                self._fail(ex)
+                return
+
+            self._split_lines(data)
+
+    def _fail(self, error: Exception) -> None:
+        self._error = error
+        self._lines.put_nowait(None)
+
+    def _split_lines(self, data: bytes) -> None:
+        self._buffer += data
+        while b"\n" in self._buffer:
+            end = self._buffer.index(b"\n") + 1
+            self._lines.put_nowait(bytes(self._buffer[:end]))
+            del self._buffer[:end]
+
+
+class AsyncDevice:
+    """
+    **Base class for printer devices driven from asyncio event loop.**
+    Counterpart of `Device`, commands are awaited instead of blocking the thread,
+    so printer motion can overlap with other I/O (analyzer readout, saving data) in one event loop.
+    Line numbering, resend and acknowledgement bookkeeping is shared with blocking devices (`LineProtocol`).
+    """
+
+    _NUMBERED_LINES = False
+    _STREAM_WINDOW = 1
+
+    def __init__(self, port: Optional[AsyncSerialPort] = None, timeout: float = 5) -> None:
+        self._port = port
+        self.timeout = timeout
+        self.state: MachineState = MachineState()
+        self.speed: float = 900
+        self._protocol = LineProtocol(numbered=self._NUMBERED_LINES)
+
+    @property
+    def current_position(self) -> Point3D:
+        return self.state.position
+
+    @property
+    def resend_buffer(self) -> ResendBuffer:
+        return self._protocol.resend_buffer
+
+    @staticmethod
+    @abstractmethod
+    async def connect(port: str, baudrate: int, timeout: float = 5) -> "AsyncDevice":
+        """
+        **Connects to device on specified port.**
+
+        Parameters
+        ----------
+        **port : str**
+            Port on witch Printer device is connected
+
+        **baudrate : int**
+            Information transfer speed (in bits per second)
+
+        **timeout : float, optional**
+            Await for response time in seconds, **by default 5**
+
+        Returns
+        -------
+        **AsyncDevice**
+           Correctly set up connector to printer device
+        """
+        pass
+
+    async def close(self) -> None:
+        if self._port is not None:
+            self._port.close()
+            self._port = None
+
+    async def send(self, command: str) -> str:
+        """
+        **Send command and await acknowledgement.**
+
+        Parameters
+        ----------
+        **command : str**
+            Command send to device
+
+        Raises
+        ------
+        **SerialException**
+            No acknowledgement within timeout
+
+        Returns
+        -------
+        **str**
+            Acknowledgement received from device
+        """
+        command = self._prepare_command(command)
+        in_flight = [await self._write_line(command)]
+        self._update_position(command)
+
+        return await self._await_acknowledgement(in_flight)
+
+    async def send_many(self, commands: Iterable[str], window: Optional[int] = None) -> int:
+        """
+        **Send commands keeping up to `window` of them awaiting acknowledgement.**
+
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            Commands send to device, in order
+
+        **window : int, optional**
+            Maximum number of unacknowledged commands, by default device specific
+
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        window = self._STREAM_WINDOW if window is None else window
+        if window < 1:
+            raise ValueError(f"Expected window of at least 1 line, got {window}")
+
+        in_flight: List[int] = []
+        sent = 0
+
+        for command in commands:
+            command = self._prepare_command(command)
+
+            while len(in_flight) >= window:
+                await self._await_acknowledgement(in_flight)
+
+            in_flight.append(await self._write_line(command))
+            self._update_position(command)
+            sent += 1
+
+        while len(in_flight) > 0:
+            await self._await_acknowledgement(in_flight)
+
+        return sent
+
+    def get_current_position(self):
+        return self.current_position.as_tuple()
+
+    def _prepare_command(self, command: str) -> str:
+        return self._protocol.prepare(command, self.speed)
+
+    def _update_position(self, command: str) -> None:
+        self.state.apply(parse_line(command))
+
+    async def _write_line(self, line: str) -> int:
+        """
+        Write line to port, returns line number (sequence number for not numbered lines).
+        """
+        line_number = self._protocol.sent(line)
+        await self._port.write(bytes(line, "ascii"))
+        return line_number
+
+    async def _await_acknowledgement(self, in_flight: List[int]) -> str:
+        while True:
+            resp = (await self._port.readline(self.timeout)).decode("ascii", errors="replace").strip()
+
+            if resp == "":
+                raise SerialException(f"No acknowledgement received for line: {in_flight[0]}")
+
+            reply, lines = self._protocol.receive(resp, in_flight)
+            if reply == Reply.RESET:
+                raise DeviceResetError("Device was reset, 'start' received mid-session")
+
+            for line in lines:
+                await self._port.write(bytes(line, "ascii"))
+
+            if reply == Reply.ACKNOWLEDGEMENT:
+                in_flight.pop(0)
+                return resp
+
+    async def _read_startup_messages(self, quiet_time: float) -> List[str]:
+        """
+        Read messages printed by device after connection, until it stays quiet for `quiet_time` seconds.
+        """
+        messages = []
+        resp = await self._port.readline(quiet_time)
+
+        while resp != bytes():
+            messages.append(resp.decode("ascii", errors="replace").strip())
+            resp = await self._port.readline(quiet_time)
+
+        return messages
+
+
+class AsyncMarlinDevice(AsyncDevice):
+    """
+    **Asynchronous Marlin Device Connector**
+    Lines are numbered and check summed, up to 4 of them (Marlin BUFSIZE) are streamed at once.
+    """
+
+    _NUMBERED_LINES = True
+    _STREAM_WINDOW = MarlinDevice._STREAM_WINDOW
+
+    @property
+    def line_counter(self) -> int:
+        """
+        Number of next sent line.
+        """
+        return self._protocol.line_counter
+
+    @staticmethod
+    async def connect(port: str, baudrate: int = 250000, timeout: float = 5) -> "AsyncMarlinDevice":
+        device = AsyncMarlinDevice(await AsyncSerialPort.open(port, baudrate), timeout)
+        await device._read_startup_messages(quiet_time=timeout)
+        return device
+
+
+class AsyncPrusaDevice(AsyncDevice):
+    """
+    **Asynchronous Prusa Device Connector**
+    Prusa answers every command with 'ok' once it is processed, long moves are reported with 'busy: processing'.
+    """
+
+    @staticmethod
+    async def connect(port: str, baudrate: int = 115200, timeout: float = 2) -> "AsyncPrusaDevice":
+        device = AsyncPrusaDevice(await AsyncSerialPort.open(port, baudrate), timeout)
+        await device._read_startup_messages(quiet_time=timeout)
+        return device
+
+
+class AsyncPrinterDeviceMock(AsyncDevice):
+    """
+    **Asynchronous mock of printer device**, moves take fixed time and never touch serial port.
+    """
+
+    def __init__(self, move_time: float = 0.5, home_time: float = 1) -> None:
+        super().__init__()
+        self.move_time = move_time
+        self.home_time = home_time
+
+    @staticmethod
+    async def connect(port: str = "mock", baudrate: int = 0, timeout: float = 5) -> "AsyncPrinterDeviceMock":
+        return AsyncPrinterDeviceMock()
+
+    async def send(self, command: str) -> str:
+        command = self._prepare_command(command)
+
+        if "G1" in command:
+            await asyncio.sleep(self.move_time)
+
+        elif "G28" in command:
+            await asyncio.sleep(self.home_time)
+
+        self._update_position(command)
+        return "ok"
+
+    async def send_many(self, commands: Iterable[str], window: Optional[int] = None) -> int:
+        sent = 0
+        for command in commands:
+            await self.send(command)
+            sent += 1
+
+        return sent
@@ -0,0 +1,235 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from printer_device_connector.machine_state import MachineState
+
+
+def _to_json(value: Any) -> Any:
+    # numpy scalars and arrays, pandas series
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} can not be written to checkpoint")
+
+
+class Checkpoint:
+    """
+    **Progress of job, from which it can be continued.**
+
+    Attributes
+    ----------
+    **job : str**
+        Job identifier, like printed file name
+
+    **offset : Optional[int]**
+        Position in printed file of the first command that was not confirmed (`GCodeFile.tell`)
+
+    **path_index : Optional[int]**
+        Index of the first scan path point that was not measured
+
+    **position : Optional[Tuple[float, float, float]]**
+        Last head position confirmed by device
+
+    **e : Optional[float]**
+        Extruder position after last confirmed command, in mm
+
+    **relative : bool**
+        Relative positioning (G91) is active
+
+    **relative_extrusion : bool**
+        Relative extruder positioning (M83) is active
+
+    **inches : bool**
+        Units are inches (G20), all values of checkpoint are in mm
+
+    **feedrate : Optional[float]**
+        Last used feedrate, in mm/min
+
+    **temperatures : Dict[str, float]**
+        Target temperatures of heaters ('hotend', 'bed')
+
+    **extra : Dict[str, Any]**
+        Job specific data, like measurements done so far
+    """
+
+    def __init__(
+            self,
+            job: str,
+            offset: Optional[int] = None,
+            path_index: Optional[int] = None,
+            position: Optional[Tuple[float, float, float]] = None,
+            e: Optional[float] = None,
+            relative: bool = False,
+            relative_extrusion: bool = False,
+            inches: bool = False,
+            feedrate: Optional[float] = None,
+            temperatures: Optional[Dict[str, float]] = None,
+            extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.job = job
+        self.offset = offset
+        self.path_index = path_index
+        self.position = position
+        self.e = e
+        self.relative = relative
+        self.relative_extrusion = relative_extrusion
+        self.inches = inches
+        self.feedrate = feedrate
+        self.temperatures: Dict[str, float] = {} if temperatures is None else temperatures
+        self.extra: Dict[str, Any] = {} if extra is None else extra
+        self.timestamp: float = time.time()
+
+    @staticmethod
+    def from_state(job: str, state: MachineState, **kwargs) -> "Checkpoint":
+        """
+        Checkpoint with modal state (position, extruder position, positioning modes, units, feedrate,
+        temperatures) of `state`.
+        """
+        return Checkpoint(
+            job,
+            position=None if state.position.is_none() else state.position.as_tuple(),
+            e=state.e,
+            relative=state.relative,
+            relative_extrusion=state.relative_extrusion,
+            inches=state.inches,
+            feedrate=state.feedrate,
+            temperatures=state.temperatures,
+            **kwargs,
+        )
+
+    def resume_commands(self, lift: float = 5, home_z: bool = False) -> List[str]:
+        """
+        **Commands that bring printer back to state of checkpoint, after restart.**
+        Heaters are brought back to temperature first, head is lifted by `lift` mm and X, Y are homed.
+        Z is homed only with `home_z` or when its position was not confirmed (homing Z over printed part would
+        crash into it), otherwise last confirmed Z is trusted. Head returns to last confirmed position from above.
+
+        Parameters
+        ----------
+        **lift : float, optional**
+            Height of safe move above last confirmed position, in mm, **by default 5**
+
+        **home_z : bool, optional**
+            Home all axes, **by default False**
+
+        Returns
+        -------
+        **List[str]**
+            G-code commands, in order
+        """
+        commands = []
+        if "bed" in self.temperatures:
+            commands += [f"M140 S{self.temperatures['bed']}", f"M190 S{self.temperatures['bed']}"]
+        if "hotend" in self.temperatures:
+            commands += [f"M104 S{self.temperatures['hotend']}", f"M109 S{self.temperatures['hotend']}"]
+
+        x, y, z = self.position if self.position is not None else (None, None, None)
+        # without confirmed height, Z has to be homed
+        z_known = z is not None
+        safe_z = (z if z_known else 0) + lift
+
+        if home_z or not z_known:
+            commands += ["G90", "G28", f"G1 Z{safe_z}"]
+        else:
+            commands += ["G91", f"G1 Z{lift} F300", "G28 X Y", f"G92 Z{safe_z}", "G90"]
+
+        if x is not None and y is not None:
+            commands.append(f"G1 X{x} Y{y} Z{safe_z}")
+        if z_known:
+            commands.append(f"G1 Z{z} F300")
+
+        return commands + self.mode_commands()
+
+    def mode_commands(self) -> List[str]:
+        """
+        Commands restoring extruder mode and position, feedrate, positioning mode and units of checkpoint,
+        on printer in absolute mm mode.
+        """
+        commands = ["M83" if self.relative_extrusion else "M82"]
+        if self.e is not None:
+            commands.append(f"G92 E{self.e}")
+        if self.feedrate is not None:
+            commands.append(f"G1 F{self.feedrate}")
+        if self.relative:
+            commands.append("G91")
+        if self.inches:
+            commands.append("G20")
+
+        return commands
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+    @staticmethod
+    def from_dict(values: Dict[str, Any]) -> "Checkpoint":
+        values = dict(values)
+        timestamp = values.pop("timestamp", time.time())
+        if values.get("position") is not None:
+            values["position"] = tuple(values["position"])
+
+        checkpoint = Checkpoint(**values)
+        checkpoint.timestamp = timestamp
+        return checkpoint
+
+
+class CheckpointJournal:
+    """
+    **Checkpoint kept on disk.**
+    Checkpoint is written to temporary file and renamed over journal, so journal always holds complete checkpoint,
+    even when process dies while writing it.
+
+    Parameters
+    ----------
+    **path : str**
+        Journal file
+
+    **interval : float, optional**
+        Minimal time between written checkpoints, in seconds, **by default 5**
+    """
+
+    def __init__(self, path: str, interval: float = 5) -> None:
+        self.path = path
+        self.interval = interval
+        self._last_write: float = 0
+
+    def record(self, checkpoint: Checkpoint, force: bool = False) -> bool:
+        """
+        **Write checkpoint, unless previous one was written less than `interval` ago.**
+
+        Returns
+        -------
+        **bool**
+            True if checkpoint was written
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < self.interval:
+            return False
+
+        checkpoint.timestamp = time.time()
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(checkpoint.to_dict(), file, default=_to_json)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.path)
+
+        self._last_write = now
+        return True
+
+    def load(self) -> Optional[Checkpoint]:
+        """
+        Last written checkpoint, None if there is none.
+        """
+        try:
+            with open(self.path) as file:
+                return Checkpoint.from_dict(json.load(file))
+        except (OSError, ValueError):
+            return None
+
+    def clear(self) -> None:
+        """
+        Remove journal, once job is completed.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
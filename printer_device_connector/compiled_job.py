@@ -0,0 +1,129 @@
+import json
+from functools import reduce
+from operator import xor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.trajectory import Point3D
+
+_HEADER_PREFIX = b";compiled-job "
+
+
+class CompiledJob:
+    """
+    **G-code job prepared for streaming.**
+    Comments are stripped, default feedrate is applied, every line is numbered, check summed and encoded
+    ahead of time, so nothing is computed while the device waits for the next line.
+    Lines are numbered from `first_line_number`, device line counter is set accordingly (M110) before streaming.
+    `final_state` is state after the job (position, positioning modes, G92 offsets, feedrate, extruder),
+    tracked from unknown starting position.
+    """
+
+    def __init__(
+            self,
+            lines: List[bytes],
+            first_line_number: int = 1,
+            final_state: Optional[MachineState] = None,
+    ) -> None:
+        self.lines = lines
+        self.first_line_number = first_line_number
+        self.final_state = final_state
+
+    @property
+    def final_position(self) -> Optional[Tuple[float, float, float]]:
+        if self.final_state is None or self.final_state.position.is_none():
+            return None
+        return self.final_state.position.as_tuple()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.lines)
+
+    @staticmethod
+    def compile(commands: Iterable[str], speed: float = 900, first_line_number: int = 1) -> "CompiledJob":
+        """
+        **Compile G-code commands.**
+
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            G-code commands, like `GCodeFile.commands()` or generated scan path moves
+
+        **speed : float, optional**
+            Feedrate applied to commands without one, in mm/min, **by default 900**
+
+        **first_line_number : int, optional**
+            Number of first line, **by default 1**
+
+        Returns
+        -------
+        **CompiledJob**
+            Ready to stream job
+        """
+        lines = []
+        state = MachineState(Point3D(None, None, None))
+        line_number = first_line_number
+
+        for command in commands:
+            command = command.partition(";")[0].strip()
+            if len(command) == 0:
+                continue
+
+            if "F" not in command:
+                command += f" F {speed}"
+
+            state.apply(parse_line(command))
+
+            payload = bytes(MarlinDevice.no_line(command, line_number), "ascii")
+            lines.append(payload + b"*" + bytes(str(reduce(xor, payload, 0)), "ascii") + b"\n")
+            line_number += 1
+
+        return CompiledJob(lines, first_line_number, state)
+
+    def save(self, file_name: str) -> None:
+        """
+        Save job, lines are stored exactly as they are sent, after single header line.
+        """
+        header = {
+            "first_line_number": self.first_line_number,
+            "lines": len(self.lines),
+            "final_position": self.final_position,
+            "final_state": None if self.final_state is None else self.final_state.to_dict(),
+        }
+        with open(file_name, "wb") as file:
+            file.write(_HEADER_PREFIX + bytes(json.dumps(header), "ascii") + b"\n")
+            file.writelines(self.lines)
+
+    @staticmethod
+    def load(file_name: str) -> "CompiledJob":
+        """
+        Load job saved with `save`.
+
+        Raises
+        ------
+        **ValueError**
+            File is not a compiled job or it is truncated
+        """
+        with open(file_name, "rb") as file:
+            header = file.readline()
+            if not header.startswith(_HEADER_PREFIX):
+                raise ValueError(f"'{file_name}' is not a compiled job")
+
+            header = json.loads(header[len(_HEADER_PREFIX):])
+            lines = file.read().splitlines(keepends=True)
+
+        if len(lines) != header["lines"]:
+            raise ValueError(f"Expected {header['lines']} lines in '{file_name}', got {len(lines)}")
+
+        final_state = header.get("final_state")
+        if final_state is not None:
+            final_state = MachineState.from_dict(final_state)
+        elif header["final_position"] is not None:
+            # saved before modal state was stored
+            final_state = MachineState(Point3D(*header["final_position"]))
+
+        return CompiledJob(lines, header["first_line_number"], final_state)
@@ -1,9 +1,15 @@
-import math
+import copy
+import enum
 import time
 from abc import abstractmethod
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple, Union
 
-import serial.tools.list_ports
+from printer_device_connector.gcode_parser import GCodeCommand, parse_line
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.port_discovery import enumerate_ports
+from printer_device_connector.traffic_log import TrafficLog
+from printer_device_connector.motion_planner import PrinterProfile, estimate_move_time, estimate_path_time
+from printer_device_connector.trajectory import Point3D
 
 
 def static_vars(**kwargs) -> callable:
@@ -16,27 +22,18 @@ def static_vars(**kwargs) -> callable:
 
 
 def list_available_serial_ports():
-    ports = serial.tools.list_ports.comports()
-    for port, desc, hwid in sorted(ports):
+    for port, desc, hwid in enumerate_ports():
         print("{}: {} [{}]".format(port, desc, hwid))
 
 
-class Point3D:
-    def __init__(self, x=0, y=0, z=0):
-        self.x: Optional[float] = x
-        self.y: Optional[float] = y
-        self.z: Optional[float] = z
-
-    def is_none(self):
-        return self.x is None or self.y is None or self.z is None
-
-    def from_tuple(self, position: Tuple[float, float, float]):
-        self.x = position[0]
-        self.y = position[1]
-        self.z = position[2]
+class MotionSync(enum.Enum):
+    """
+    **How sender learns that move is completed.**
+    """
 
-    def as_tuple(self) -> Optional[Tuple[float, float, float]]:
-        return self.x, self.y, self.z
+    PREDICTED = "predicted"  # sleep predicted time of execution
+    M400 = "M400"  # wait for acknowledgement of M400, sent once planner buffer is empty
+    M114 = "M114"  # poll M114 until stepper position reaches target
 
 
 class Device:
@@ -45,35 +42,137 @@ class Device:
     """
 
     def __init__(self):
-        self.current_position: Point3D = Point3D()
+        self.state: MachineState = MachineState()
         self.x_size: float = 220
         self.y_size: float = 220
         self.z_size: float = 200
         self.speed: float = 900
         self.printer_home_time: int = 20
+        self.profile: PrinterProfile = PrinterProfile()
 
-    def predict_time_of_execution(self, command):
-        constant_connection_time = 0.2
+        # devices without feedback from firmware always use predicted time
+        self.motion_sync: MotionSync = MotionSync.PREDICTED
+        # time saved by motion sync compared to predicted time of execution, negative when prediction was too short
+        self.last_time_saved: float = 0
+        self.time_saved: float = 0
 
-        if "G28" in command:
-            return self.printer_home_time
+        self.traffic_log: TrafficLog = TrafficLog()
+
+    @property
+    def current_position(self) -> Point3D:
+        """
+        Logical head position, tracked by `self.state`.
+        """
+        return self.state.position
 
-        if "G1" in command:
-            dest = self.parse_move_command_to_position(command)
+    def predict_time_of_execution(self, command: Union[str, GCodeCommand]) -> float:
+        """
+        **Predict how long device will take to execute command, in seconds.**
+        Moves are estimated with trapezoidal motion profile of `self.profile` limits
+        (acceleration, jerk, per axis max feedrate), plus constant time of command transmission.
+        Target of move is resolved with current modal state (positioning mode, units, feedrate),
+        arcs are split into chords.
+
+        Parameters
+        ----------
+        **command : Union[str, GCodeCommand]**
+            Command that is about to be sent
+
+        Returns
+        -------
+        **float**
+            Predicted execution time
+        """
+        if isinstance(command, str):
+            command = parse_line(command)
 
+        if command.code == "G28":
+            return self.printer_home_time
+
+        if command.is_move or command.is_arc:
             if self.current_position.is_none():
                 return 10
-            else:
-                dist_2_dest = math.sqrt(
-                    pow(self.current_position.x - dest[0], 2)
-                    + pow(self.current_position.y - dest[1], 2)
-                    + pow(self.current_position.z - dest[2], 2)
-                )
 
-                return (dist_2_dest / self.speed) * 60 + constant_connection_time
+            start = self.current_position.as_tuple()
+            feedrate = self.state.feedrate_of(command, default=self.speed)
+
+            if command.is_arc:
+                try:
+                    arc = self.state.arc_path(command)
+                except ValueError:
+                    return 10
+                return estimate_path_time(self.profile, start, arc, feedrate) + self.profile.command_overhead
+
+            dest = self.state.target(command)
+            return estimate_move_time(self.profile, start, dest, feedrate) + self.profile.command_overhead
 
         return 0
 
+    def is_within_bounds(self, command: Union[str, GCodeCommand], state: Optional[MachineState] = None) -> bool:
+        """
+        **Check if move ends inside printer work area (`profile.work_area`).**
+        Target is resolved in machine coordinates, so G91 and G92 are taken into account.
+        Commands other than moves, and moves from unknown position, are always within bounds.
+        Move is resolved from `state`, by default tracked state of device.
+        """
+        if isinstance(command, str):
+            command = parse_line(command)
+
+        if not (command.is_move or command.is_arc):
+            return True
+
+        state = self.state if state is None else state
+        target = state.target(command)
+        work_area = self.profile.work_area
+        for axis, value, offset in zip("XYZ", target, state.offset):
+            low, high = work_area[axis]
+            if value is not None and not low <= value - offset <= high:
+                return False
+        return True
+
+    def _check_bounds(self, command: Union[str, GCodeCommand], state: Optional[MachineState] = None) -> None:
+        """
+        Raise ValueError for move that ends outside of printer work area, before it is sent.
+        """
+        if not self.is_within_bounds(command, state):
+            area = ", ".join(f"{axis} {low}..{high}" for axis, (low, high) in self.profile.work_area.items())
+            raise ValueError(f"Move '{command}' ends outside of work area {area} mm")
+
+    def _check_path_bounds(self, commands: Iterable[Union[str, GCodeCommand]]) -> MachineState:
+        """
+        Check every move of `commands` from state left by previous ones, before any of them is sent.
+        Returns state after all of them, tracked state of device is not changed.
+        """
+        state = copy.deepcopy(self.state)
+        for command in commands:
+            if isinstance(command, str):
+                command = parse_line(command)
+            self._check_bounds(command, state)
+            state.apply(command)
+
+        return state
+
+    def predict_time_of_path(self, points: Iterable[Tuple[float, float, float]], stop_at_every_point: bool = True) -> float:
+        """
+        **Predict how long moving through points will take, in seconds.**
+        Used for ETA of whole scan before it is started.
+
+        Parameters
+        ----------
+        **points : Iterable[Tuple[float, float, float]]**
+            Consecutive head positions
+
+        **stop_at_every_point : bool, optional**
+            Every point is sent as separate awaited command, **by default True**
+
+        Returns
+        -------
+        **float**
+            Predicted motion time, without time spent at points
+        """
+        start = (0, 0, 0) if self.current_position.is_none() else self.current_position.as_tuple()
+        return estimate_path_time(self.profile, start, points, self.speed, stop_at_every_point)
+
     def get_current_position(self) -> Optional[Tuple[float, float, float]]:
         return self.current_position.as_tuple()
 
@@ -81,55 +180,73 @@ class Device:
         self.current_position.from_tuple((x, y, z))
 
     def set_current_position_from_string(self, position: str):
-        x, y, z = Device.parse_move_command_to_position(position)
-        self.current_position.from_tuple((x, y, z))
+        """
+        Set axes given in `position` ('X10 Y20'), other axes keep their position.
+        """
+        for axis, value in zip("xyz", Device.parse_move_command_to_position(position)):
+            if value is not None:
+                setattr(self.current_position, axis, value)
+
+    def _update_state(self, command: Union[str, GCodeCommand]) -> None:
+        """
+        Track effects of sent command: modal state (`self.state`) and motion limits (M201, M203, M204, M205).
+        """
+        if isinstance(command, str):
+            command = parse_line(command)
+
+        if not self.state.apply(command):
+            self.profile.apply_command(command)
 
     @staticmethod
     def parse_move_command_to_position(
             command: str,
     ) -> Optional[Tuple[float, float, float]]:
-        # Fuck me, get uot with this weak ass shit
-        command = command.casefold() + " "
+        return parse_line(command).position
 
-        if "x" in command:
-            x_val_begin = command.find("x")
-            if command[x_val_begin + 1] != " ":
-                command = command[:x_val_begin] + " " + command[x_val_begin:]
-
-            x_val_begin += 2
-
-            x_val_end = command[x_val_begin:].find(" ")
-            x = float(command[x_val_begin: x_val_end + x_val_begin])
-
-        else:
-            x = None
+    def stream(self, commands: Iterable[str], window: int = 1) -> int:
+        """
+        **Send sequence of commands.**
+        Devices that support acknowledgement based flow control keep up to `window` commands in flight,
+        default implementation sends commands one by one with `send_and_await`.
 
-        if "y" in command:
-            y_val_begin = command.find("y")
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            Commands send to device, in order
 
-            if command[y_val_begin + 1] != " ":
-                command = command[:y_val_begin] + " " + command[y_val_begin:]
+        **window : int, optional**
+            Maximum number of commands awaiting acknowledgement, **by default 1**
 
-            y_val_begin += 2
-            y_val_end = command[y_val_begin:].find(" ")
-            y = float(command[y_val_begin: y_val_end + y_val_begin])
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        sent = 0
+        for command in commands:
+            self.send_and_await(command)
+            sent += 1
 
-        else:
-            y = None
+        return sent
 
-        if "z" in command:
-            z_val_begin = command.find("z")
-            if command[z_val_begin + 1] != " ":
-                command = command[:z_val_begin] + " " + command[z_val_begin:]
+    def send_batch(self, commands: Iterable[str]) -> int:
+        """
+        **Send sequence of commands in as few writes as possible.**
+        Devices with serial connection pack lines that fit in firmware RX buffer into single write,
+        default implementation streams commands.
 
-            z_val_begin += 2
-            z_val_end = command[z_val_begin:].find(" ")
-            z = float(command[z_val_begin: z_val_end + z_val_begin])
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            Commands send to device, in order
 
-        else:
-            z = None
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        return self.stream(commands)
 
-        return x, y, z
     @abstractmethod
     def send_and_await(self, command: str) -> str:
         """
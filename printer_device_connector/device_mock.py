@@ -6,6 +6,8 @@ from printer_device_connector.device import Device, static_vars
 class PrinterDeviceMock(Device):
 
     def send_and_await(self, command: str) -> str:
+        self._check_bounds(command)
+
         if "F" not in command:
             command += f" F {self.speed}"
 
@@ -13,11 +15,11 @@ class PrinterDeviceMock(Device):
             command += "\n"
 
         if "G1" in command:
-            self.set_current_position_from_string(command)
+            self._update_state(command)
             time.sleep(0.5)
 
         elif "G28" in command:
-            self.current_position.from_tuple((0, 0, 0))
+            self._update_state(command)
             time.sleep(1)
 
         return "this is mock"
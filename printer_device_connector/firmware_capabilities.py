@@ -0,0 +1,156 @@
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# 'FIRMWARE_NAME:Marlin 2.0.9.3 (...) SOURCE_CODE_URL:github.com/... PROTOCOL_VERSION:1.0 ...' (M115)
+_INFO_KEY = re.compile(r"(?:^|\s)([A-Z][A-Z_]+):")
+# 'Cap:AUTOREPORT_TEMP:1'
+_CAPABILITY = re.compile(r"Cap:\s*([A-Z0-9_]+)\s*:\s*([01])")
+# 'ok N10 P15 B3', free planner blocks and free command buffer slots (ADVANCED_OK)
+_ADVANCED_OK = re.compile(r"^ok\b.*\bP(\d+)\s+B(\d+)")
+# 'echo:M113 S2', host keepalive interval in seconds
+_KEEPALIVE = re.compile(r"M113\s+S\s*([\d.]+)")
+_VERSION = re.compile(r"\d+(?:\.\d+)+")
+
+
+class FirmwareCapabilities:
+    """
+    **Features reported by firmware in reply to M115.**
+    Used to tune the transport to the connected machine, instead of assuming what Marlin or Prusa firmware supports:
+    size of streaming window, how long device may stay silent, and how emergency stop reaches the board.
+
+    Parameters
+    ----------
+    **info : Dict[str, str]**
+        Fields of firmware info line ('FIRMWARE_NAME', 'PROTOCOL_VERSION', 'MACHINE_TYPE', ...)
+
+    **capabilities : Dict[str, bool]**
+        Reported 'Cap:' flags
+
+    **command_buffer_size : int, optional**
+        Number of commands firmware buffers (BUFSIZE), known when firmware sends ADVANCED_OK acknowledgements,
+        **by default None**
+
+    **planner_buffer_size : int, optional**
+        Number of free planner blocks of idle firmware, known from ADVANCED_OK as well, **by default None**
+
+    **keepalive_interval : float, optional**
+        Interval of 'busy:' messages in seconds (M113), **by default None** (not reported)
+    """
+
+    def __init__(
+            self,
+            info: Optional[Dict[str, str]] = None,
+            capabilities: Optional[Dict[str, bool]] = None,
+            command_buffer_size: Optional[int] = None,
+            planner_buffer_size: Optional[int] = None,
+            keepalive_interval: Optional[float] = None,
+    ) -> None:
+        self.info: Dict[str, str] = {} if info is None else info
+        self.capabilities: Dict[str, bool] = {} if capabilities is None else capabilities
+        self.command_buffer_size = command_buffer_size
+        self.planner_buffer_size = planner_buffer_size
+        self.keepalive_interval = keepalive_interval
+
+    @staticmethod
+    def parse(lines: Iterable[str]) -> "FirmwareCapabilities":
+        """
+        **Read capabilities from device output.**
+        `lines` is everything received in reply to M115 (and M113), including acknowledgements,
+        unrelated messages are ignored.
+        """
+        capabilities = FirmwareCapabilities()
+
+        for line in lines:
+            line = line.strip()
+
+            if "FIRMWARE_NAME:" in line:
+                keys = list(_INFO_KEY.finditer(line))
+                for key, following in zip(keys, keys[1:] + [None]):
+                    end = len(line) if following is None else following.start()
+                    capabilities.info[key.group(1)] = line[key.end():end].strip()
+                continue
+
+            capability = _CAPABILITY.search(line)
+            if capability is not None:
+                capabilities.capabilities[capability.group(1)] = capability.group(2) == "1"
+                continue
+
+            keepalive = _KEEPALIVE.search(line)
+            if keepalive is not None:
+                capabilities.keepalive_interval = float(keepalive.group(1))
+                continue
+
+            advanced_ok = _ADVANCED_OK.match(line)
+            if advanced_ok is not None:
+                # idle firmware, the only used slot holds the command being acknowledged
+                capabilities.planner_buffer_size = int(advanced_ok.group(1))
+                capabilities.command_buffer_size = int(advanced_ok.group(2)) + 1
+
+        return capabilities
+
+    def supports(self, capability: str) -> bool:
+        return self.capabilities.get(capability, False)
+
+    @property
+    def firmware_name(self) -> str:
+        """
+        Name of firmware without version, like 'Marlin' or 'Prusa-Firmware'.
+        """
+        name = self.info.get("FIRMWARE_NAME", "")
+        return name.split(" ")[0] if name != "" else ""
+
+    @property
+    def firmware_version(self) -> Optional[Tuple[int, ...]]:
+        version = _VERSION.search(self.info.get("FIRMWARE_NAME", ""))
+        return None if version is None else tuple(int(part) for part in version.group(0).split("."))
+
+    @property
+    def advanced_ok(self) -> bool:
+        return self.supports("ADVANCED_OK") or self.command_buffer_size is not None
+
+    @property
+    def autoreport_temp(self) -> bool:
+        return self.supports("AUTOREPORT_TEMP")
+
+    @property
+    def emergency_parser(self) -> bool:
+        """
+        M112 is executed as soon as it is received, even if command buffer is full.
+        """
+        return self.supports("EMERGENCY_PARSER")
+
+    @property
+    def host_keepalive(self) -> bool:
+        """
+        Firmware sends 'busy:' messages while it works, so silence means lost connection.
+        """
+        return self.supports("HOST_KEEPALIVE") or self.keepalive_interval is not None
+
+    def stream_window(self, default: int) -> int:
+        """
+        **Number of lines that can be kept unacknowledged.**
+        Command buffer size when firmware reports it, otherwise `default` of the connector.
+        """
+        if self.command_buffer_size is not None and self.command_buffer_size > 0:
+            return self.command_buffer_size
+        return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "info": self.info,
+            "capabilities": self.capabilities,
+            "command_buffer_size": self.command_buffer_size,
+            "planner_buffer_size": self.planner_buffer_size,
+            "keepalive_interval": self.keepalive_interval,
+        }
+
+    @staticmethod
+    def from_dict(values: Dict[str, Any]) -> "FirmwareCapabilities":
+        return FirmwareCapabilities(**values)
+
+    def __repr__(self) -> str:
+        enabled = [name for name, value in self.capabilities.items() if value]
+        return (
+            f"FirmwareCapabilities({self.info.get('FIRMWARE_NAME', '?')!r}, capabilities={enabled}, "
+            f"command_buffer_size={self.command_buffer_size}, keepalive_interval={self.keepalive_interval})"
+        )
@@ -0,0 +1,520 @@
+import enum
+import os
+import re
+import select
+import threading
+import time
+import tty
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from printer_device_connector.motion_planner import PrinterProfile, estimate_move_time
+
+_WORD = re.compile(r"([A-Z])\s*([-+]?\d*\.?\d*)")
+
+
+class FirmwareDialect(enum.Enum):
+    MARLIN = "Marlin"
+    PRUSA = "Prusa"
+
+
+_BANNERS = {
+    FirmwareDialect.MARLIN: [
+        "start",
+        "echo:Marlin 2.0.9.3",
+        "echo: Last Updated: 2022-02-14 | Author: (simulator)",
+        "echo:Compiled: Feb 14 2022",
+        "echo: Free Memory: 4096  PlannerBufferBytes: 1232",
+    ],
+    FirmwareDialect.PRUSA: [
+        "start",
+        "echo: 3.13.2-7080",
+        "echo: Last Updated: Oct 26 2023 | Author: (simulator)",
+        "echo: Free Memory: 2072  PlannerBufferBytes: 1392",
+        "echo:SD card ok",
+    ],
+}
+
+_FIRMWARE_INFO = {
+    FirmwareDialect.MARLIN: "FIRMWARE_NAME:Marlin 2.0.9.3 (simulator) SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin"
+                            " PROTOCOL_VERSION:1.0 MACHINE_TYPE:Simulated Marlin EXTRUDER_COUNT:1"
+                            " UUID:cede2a2f-41a2-4748-9b12-c55c62f367ff",
+    FirmwareDialect.PRUSA: "FIRMWARE_NAME:Prusa-Firmware 3.13.2 based on Marlin FIRMWARE_URL:https://github.com/prusa3d/Prusa-Firmware"
+                           " PROTOCOL_VERSION:1.0 MACHINE_TYPE:Prusa i3 MK3S EXTRUDER_COUNT:1"
+                           " UUID:00000000-0000-0000-0000-000000000000",
+}
+
+# commands that wait for all queued moves to finish before they are executed
+# M114 waits for planned moves as well (planner.synchronize in Marlin), so reported position is where head is
+_SYNCHRONIZING_COMMANDS = ("G4", "G28", "M400", "M84", "M109", "M114", "M190")
+# 'Count' part of M114 is reported in steps, default steps per mm of Prusa MK3S
+_STEPS_PER_MM = (100, 100, 400)
+
+
+class _Block:
+    """
+    Single move queued in planner.
+    """
+
+    __slots__ = ("start", "end", "duration")
+
+    def __init__(self, start: Tuple[float, float, float], end: Tuple[float, float, float], duration: float):
+        self.start = start
+        self.end = end
+        self.duration = duration
+
+
+class FirmwareSimulator:
+    """
+    **Virtual Marlin / Prusa printer on pseudo-terminal.**
+    Opens Linux pty and emulates firmware serial protocol on it, so printer connectors can be tested
+    and benchmarked without hardware: `MarlinDevice.connect_on_port(simulator.port)`.
+
+    Emulated behaviour:
+        - board reset when port is opened, 'start' banner after `boot_time` (and after `reset`),
+        - line numbers and checksums validation with 'Error:...' / 'Resend: N' replies,
+        - serial RX buffer of limited size (overflowing bytes are lost) and command buffer of BUFSIZE lines,
+        - planner buffer, moves take time of trapezoidal motion profile of `PrinterProfile` limits,
+        - 'ok' sent once command is processed, optionally in ADVANCED_OK format,
+        - host keepalive 'busy: processing' while firmware waits,
+        - M105, M110, M112, M113, M114, M115, M201, M203, M204, M205, M400, M410, G4, G28, G90, G91, G92,
+        - emergency parser, M112 and M410 are executed on receipt.
+
+    Parameters
+    ----------
+    **dialect : FirmwareDialect, optional**
+        Emulated firmware, **by default Marlin**
+
+    **time_scale : float, optional**
+        Multiplier of all simulated durations, values below 1 make simulation faster than real printer
+
+    **profile : PrinterProfile, optional**
+        Motion limits, changed by M201, M203, M204 and M205, **by default Prusa MK3S limits**
+    """
+
+    def __init__(
+            self,
+            dialect: FirmwareDialect = FirmwareDialect.MARLIN,
+            time_scale: float = 1,
+            planner_buffer_size: int = 16,
+            command_buffer_size: int = 4,
+            rx_buffer_size: int = 128,
+            profile: Optional[PrinterProfile] = None,
+            keepalive_interval: float = 2,
+            advanced_ok: Optional[bool] = None,
+            emergency_parser: Optional[bool] = None,
+            corrupt_every: int = 0,
+            boot_time: float = 0.1,
+    ) -> None:
+        self.dialect = dialect
+        self.time_scale = time_scale
+        self.planner_buffer_size = planner_buffer_size
+        self.command_buffer_size = command_buffer_size
+        self.rx_buffer_size = rx_buffer_size
+        self.profile = PrinterProfile() if profile is None else profile
+        self.keepalive_interval = keepalive_interval
+        self.advanced_ok = dialect == FirmwareDialect.MARLIN if advanced_ok is None else advanced_ok
+        self.emergency_parser = dialect == FirmwareDialect.MARLIN if emergency_parser is None else emergency_parser
+        self.corrupt_every = corrupt_every
+        self.boot_time = boot_time
+
+        self._master, slave = os.openpty()
+        # raw mode, so nothing written to device is echoed back
+        tty.setraw(slave)
+        self.port: str = os.ttyname(slave)
+        # pty stays available while master is open, closed slave lets simulator notice when port is opened
+        os.close(slave)
+
+        self._running = threading.Event()
+        self._write_lock = threading.Lock()
+        self._rx = bytearray()
+        self._rx_condition = threading.Condition()
+        self._planner: Deque[_Block] = deque()
+        self._planner_condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+        self._reset_state()
+
+        # statistics
+        self.received_lines: List[str] = []
+        self.rx_overflows: int = 0
+        self.checksum_errors: int = 0
+        self.moves_executed: int = 0
+        self.quickstops: int = 0
+
+    def __enter__(self) -> "FirmwareSimulator":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> "FirmwareSimulator":
+        self._running.set()
+        for target in (self._receive, self._main_loop, self._stepper):
+            thread = threading.Thread(target=target, name=f"{self.dialect.value}Simulator.{target.__name__}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+    def stop(self) -> None:
+        self._running.clear()
+        with self._rx_condition:
+            self._rx_condition.notify_all()
+        with self._planner_condition:
+            self._planner_condition.notify_all()
+
+        os.close(self._master)
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+    def reset(self) -> None:
+        """
+        Simulate board reset: queued commands and moves are lost, position becomes unknown, banner is printed.
+        """
+        with self._rx_condition:
+            self._rx.clear()
+        with self._planner_condition:
+            self._planner.clear()
+            self._planner_condition.notify_all()
+        self._reset_state()
+        self._print_banner()
+
+    @property
+    def position(self) -> Tuple[float, float, float]:
+        """
+        Position where all queued moves end.
+        """
+        return self._position
+
+    @property
+    def stepper_position(self) -> Tuple[float, float, float]:
+        """
+        Position of the head at this moment.
+        """
+        with self._planner_condition:
+            if len(self._planner) == 0 or self._block_started is None:
+                return self._stepper_position
+
+            block = self._planner[0]
+            progress = min((time.monotonic() - self._block_started) / max(block.duration, 1e-9), 1)
+            return tuple(s + (e - s) * progress for s, e in zip(block.start, block.end))
+
+    def _reset_state(self) -> None:
+        self._last_line: int = 0
+        self._lines_received: int = 0
+        self._commands: Deque[str] = deque()
+        self._position: Tuple[float, float, float] = (0, 0, 0)
+        self._stepper_position: Tuple[float, float, float] = (0, 0, 0)
+        self._block_started: Optional[float] = None
+        self._feedrate: float = 1500
+        self._relative: bool = False
+        self._halted: bool = False
+
+    # "serial interrupt", moves incoming bytes to RX buffer of limited size
+    def _receive(self) -> None:
+        poller = select.poll()
+        poller.register(self._master, select.POLLIN)
+        connected = False
+
+        while self._running.is_set():
+            events = dict(poller.poll(10))
+            # master reports hang up while no one has the port open
+            if events.get(self._master, 0) & select.POLLHUP:
+                connected = False
+                time.sleep(0.01)
+                continue
+
+            if not connected:
+                connected = True
+                # opening port resets board (DTR), banner is printed once bootloader is done
+                time.sleep(self.boot_time)
+                self.reset()
+                continue
+
+            if self._master not in events:
+                continue
+
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                continue
+
+            with self._rx_condition:
+                free = self.rx_buffer_size - len(self._rx)
+                if len(data) > free:
+                    self.rx_overflows += 1
+                    data = data[:max(free, 0)]
+
+                self._rx += data
+                self._rx_condition.notify_all()
+
+            if self.emergency_parser and b"M112" in data:
+                self._halt()
+            elif self.emergency_parser and b"M410" in data:
+                self._quickstop()
+
+    def _main_loop(self) -> None:
+        while self._running.is_set():
+            with self._rx_condition:
+                while self._running.is_set() and b"\n" not in self._rx and len(self._commands) == 0:
+                    self._rx_condition.wait()
+
+                while b"\n" in self._rx and len(self._commands) < self.command_buffer_size:
+                    line, _, rest = bytes(self._rx).partition(b"\n")
+                    self._rx = bytearray(rest)
+                    self._commands.append(line.decode("ascii", errors="replace").strip())
+
+            if len(self._commands) > 0 and self._running.is_set():
+                self._process_line(self._commands.popleft())
+
+    def _stepper(self) -> None:
+        while self._running.is_set():
+            with self._planner_condition:
+                while self._running.is_set() and len(self._planner) == 0:
+                    self._planner_condition.wait()
+                if not self._running.is_set():
+                    return
+                block = self._planner[0]
+                self._block_started = time.monotonic()
+
+            time.sleep(block.duration)
+
+            with self._planner_condition:
+                if len(self._planner) > 0 and self._planner[0] is block:
+                    self._planner.popleft()
+                    self._stepper_position = block.end
+                    self.moves_executed += 1
+                self._block_started = None
+                self._planner_condition.notify_all()
+
+    def _process_line(self, line: str) -> None:
+        if len(line) == 0 or self._halted:
+            return
+
+        self.received_lines.append(line)
+
+        command = line
+        if line.startswith("N"):
+            number, _, command = line.partition(" ")
+            command, star, checksum = command.rpartition("*")
+            line_number = int(number[1:]) if number[1:].isdigit() else -1
+            self._lines_received += 1
+
+            if star == "" or not self._checksum_matches(line, checksum):
+                self.checksum_errors += 1
+                return self._request_resend("checksum mismatch")
+
+            if "M110" not in command and line_number != self._last_line + 1:
+                return self._request_resend("Line Number is not Last Line Number+1")
+
+            self._last_line = line_number
+
+        command = command.split(";")[0].strip().upper()
+        if len(command) == 0:
+            return self._ok()
+
+        self._execute(command)
+
+    def _checksum_matches(self, line: str, checksum: str) -> bool:
+        if self.corrupt_every > 0 and self._lines_received % self.corrupt_every == 0:
+            return False
+
+        payload = line[: line.rindex("*")]
+        expected = 0
+        for character in payload:
+            expected ^= ord(character) & 0xFF
+
+        return checksum.strip().isdigit() and int(checksum) == expected
+
+    def _request_resend(self, error: str) -> None:
+        self._write(f"Error:{error}, Last Line: {self._last_line}")
+        self._write(f"Resend: {self._last_line + 1}")
+        self._ok()
+
+    def _execute(self, command: str) -> None:
+        words: Dict[str, float] = {}
+        for letter, value in _WORD.findall(command):
+            if letter not in words:
+                words[letter] = float(value) if value not in ("", "-", "+", ".") else 0
+
+        # 'G01' and 'G1' are the same command
+        code = re.match(r"([GMT])0*(\d+)", command)
+        code = code.group(1) + code.group(2) if code is not None else command
+
+        if code in _SYNCHRONIZING_COMMANDS:
+            self._synchronize()
+
+        if code in ("G0", "G1"):
+            self._queue_move(words)
+
+        elif code == "G4":
+            self._wait((words.get("P", 0) / 1000 + words.get("S", 0)) * self.time_scale)
+
+        elif code == "G28":
+            homing_time = max(self._position) / 50 + 1
+            self._wait(homing_time * self.time_scale)
+            self._position = (0, 0, 0)
+            self._stepper_position = (0, 0, 0)
+
+        elif code == "G90":
+            self._relative = False
+
+        elif code == "G91":
+            self._relative = True
+
+        elif code == "G92":
+            self._position = self._target(words, relative=False)
+            self._stepper_position = self._position
+
+        elif code == "M105":
+            return self._write("ok T:21.0 /0.0 B:21.0 /0.0 @:0 B@:0")
+
+        elif code == "M110":
+            self._last_line = int(words.get("N", 0))
+
+        elif code == "M112":
+            return self._halt()
+
+        elif code == "M410":
+            # with emergency parser it was executed on receipt
+            if not self.emergency_parser:
+                self._quickstop()
+
+        elif code == "M113":
+            if "S" in words:
+                self.keepalive_interval = words["S"]
+            else:
+                self._write(f"echo:M113 S{self.keepalive_interval:g}")
+
+        elif code == "M114":
+            x, y, z = self._position
+            cx, cy, cz = (round(value * steps) for value, steps in zip(self.stepper_position, _STEPS_PER_MM))
+            self._write(f"X:{x:.2f} Y:{y:.2f} Z:{z:.2f} E:0.00 Count X:{cx} Y:{cy} Z:{cz}")
+
+        elif code == "M115":
+            self._write(_FIRMWARE_INFO[self.dialect])
+            for capability, enabled in self.capabilities().items():
+                self._write(f"Cap:{capability}:{int(enabled)}")
+
+        elif code in ("M201", "M203", "M204", "M205"):
+            self.profile.apply_command(command)
+
+        self._ok()
+
+    def capabilities(self) -> Dict[str, bool]:
+        return {
+            "SERIAL_XON_XOFF": False,
+            "EEPROM": True,
+            "AUTOREPORT_TEMP": True,
+            "AUTOREPORT_POS": False,
+            "HOST_KEEPALIVE": True,
+            "EMERGENCY_PARSER": self.emergency_parser,
+            "ADVANCED_OK": self.advanced_ok,
+            "PROMPT_SUPPORT": False,
+        }
+
+    def _target(self, words: Dict[str, float], relative: bool) -> Tuple[float, float, float]:
+        position = list(self._position)
+        for axis, letter in enumerate("XYZ"):
+            if letter in words:
+                position[axis] = position[axis] + words[letter] if relative else words[letter]
+        return tuple(position)
+
+    def _queue_move(self, words: Dict[str, float]) -> None:
+        if "F" in words and words["F"] > 0:
+            self._feedrate = words["F"]
+
+        start = self._position
+        end = self._target(words, relative=self._relative)
+        duration = self._move_time(start, end)
+        self._position = end
+
+        with self._planner_condition:
+            last_keepalive = time.monotonic()
+            while self._running.is_set() and len(self._planner) >= self.planner_buffer_size:
+                self._planner_condition.wait(timeout=self.keepalive_interval * self.time_scale)
+                if time.monotonic() - last_keepalive >= self.keepalive_interval * self.time_scale:
+                    self._busy()
+                    last_keepalive = time.monotonic()
+
+            if duration > 0:
+                self._planner.append(_Block(start, end, duration))
+                self._planner_condition.notify_all()
+
+    def _move_time(self, start: Tuple[float, float, float], end: Tuple[float, float, float]) -> float:
+        return estimate_move_time(self.profile, start, end, self._feedrate) * self.time_scale
+
+    def _synchronize(self) -> None:
+        with self._planner_condition:
+            last_keepalive = time.monotonic()
+            while self._running.is_set() and len(self._planner) > 0:
+                self._planner_condition.wait(timeout=self.keepalive_interval * self.time_scale)
+                if time.monotonic() - last_keepalive >= self.keepalive_interval * self.time_scale:
+                    self._busy()
+                    last_keepalive = time.monotonic()
+
+    def _wait(self, duration: float) -> None:
+        end = time.monotonic() + duration
+        while self._running.is_set() and time.monotonic() < end:
+            time.sleep(min(self.keepalive_interval * self.time_scale, end - time.monotonic(), 0.5))
+            if time.monotonic() < end:
+                self._busy()
+
+    def _halt(self) -> None:
+        self._halted = True
+        with self._planner_condition:
+            self._planner.clear()
+            self._planner_condition.notify_all()
+        self._write("Error:Printer halted. kill() called!")
+
+    def _quickstop(self) -> None:
+        # planned moves are dropped, head stays where it is
+        with self._planner_condition:
+            self._stepper_position = self.stepper_position
+            self._position = self._stepper_position
+            self._planner.clear()
+            self._block_started = None
+            self._planner_condition.notify_all()
+        self.quickstops += 1
+
+    def _busy(self) -> None:
+        self._write("echo:busy: processing")
+
+    def _ok(self) -> None:
+        if self.advanced_ok:
+            planner_free = self.planner_buffer_size - len(self._planner)
+            buffer_free = self.command_buffer_size - len(self._commands) - 1
+            self._write(f"ok N{self._last_line} P{planner_free} B{max(buffer_free, 0)}")
+        else:
+            self._write("ok")
+
+    def _print_banner(self) -> None:
+        for line in _BANNERS[self.dialect]:
+            self._write(line)
+
+    def _write(self, line: str) -> None:
+        with self._write_lock:
+            try:
+                os.write(self._master, bytes(line + "\n", "ascii"))
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    from printer_device_connector.marlin_device import MarlinDevice
+
+    moves = [f"G1 X{10 + x % 2 * 20} Y{10 + x // 2} Z5" for x in range(100)]
+
+    with FirmwareSimulator(FirmwareDialect.MARLIN, time_scale=0.1) as simulator:
+        printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.5)
+
+        start = time.monotonic()
+        printer.stream(moves)
+        print(f"stream: {len(moves)} moves in {time.monotonic() - start:.2f}s")
+
+        start = time.monotonic()
+        for move in moves[:10]:
+            printer.send_and_await(move)
+        print(f"send_and_await: 10 moves in {time.monotonic() - start:.2f}s")
@@ -0,0 +1,248 @@
+import enum
+import queue
+import threading
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from printer_device_connector.device import Device
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.serial_device import SerialDevice
+
+
+class PrinterState(enum.Enum):
+    IDLE = "idle"
+    BUSY = "busy"
+    FAILED = "failed"
+
+
+class PrinterStatus:
+    """
+    **Snapshot of single fleet printer.**
+    """
+
+    def __init__(
+            self,
+            name: str,
+            state: PrinterState,
+            queued_jobs: int,
+            completed_jobs: int,
+            position: Optional[Tuple[float, float, float]],
+            error: Optional[Exception],
+    ) -> None:
+        self.name = name
+        self.state = state
+        self.queued_jobs = queued_jobs
+        self.completed_jobs = completed_jobs
+        self.position = position
+        self.error = error
+
+    def __repr__(self) -> str:
+        return (
+            f"PrinterStatus(name={self.name!r}, state={self.state.value}, queued_jobs={self.queued_jobs}, "
+            f"completed_jobs={self.completed_jobs}, position={self.position}, error={self.error!r})"
+        )
+
+
+class _FleetPrinter(threading.Thread):
+    """
+    Worker thread owning one device, executes jobs from its queue in order.
+    """
+
+    def __init__(self, name: str, device: Device) -> None:
+        super().__init__(name=f"PrinterFleet({name})", daemon=True)
+        self.device = device
+        self.jobs: "queue.Queue[Optional[Tuple[Callable[[Device], object], Future]]]" = queue.Queue()
+        self.state: PrinterState = PrinterState.IDLE
+        self.completed_jobs: int = 0
+        self.error: Optional[Exception] = None
+
+    def run(self) -> None:
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+
+            task, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self.state = PrinterState.BUSY
+            try:
+                result = task(self.device)
+            except Exception as ex:
+                self.error = ex
+                self.state = PrinterState.FAILED
+                future.set_exception(ex)
+                # jobs queued after failed one expect it to be done, none of them is started
+                self._fail_queued(ex)
+                continue
+
+            self.completed_jobs += 1
+            future.set_result(result)
+            if self.jobs.empty():
+                self.state = PrinterState.IDLE
+
+    def _fail_queued(self, error: Exception) -> None:
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+
+            if job is None:
+                # keep stop request for run loop
+                self.jobs.put(None)
+                return
+
+            if job[1].set_running_or_notify_cancel():
+                job[1].set_exception(error)
+
+
+class PrinterFleet:
+    """
+    **Several printer devices driven concurrently from one process.**
+    Every printer gets its own worker thread and job queue, jobs of one printer are executed in order,
+    jobs of different printers run at the same time. Marlin printers get their line numbering reset (M110)
+    and every serial printer gets its own background reader when added.
+    """
+
+    def __init__(self) -> None:
+        self._printers: Dict[str, _FleetPrinter] = {}
+        self._pending: List[Future] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "PrinterFleet":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._printers)
+
+    def __getitem__(self, name: str) -> Device:
+        return self._printers[name].device
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._printers)
+
+    def add(self, name: str, device: Device) -> None:
+        """
+        **Take ownership of device.**
+
+        Parameters
+        ----------
+        **name : str**
+            Unique name of printer in fleet
+
+        **device : Device**
+            Connected printer device
+        """
+        if name in self._printers:
+            raise ValueError(f"Printer '{name}' is already in fleet")
+
+        if isinstance(device, SerialDevice):
+            device.start_reader()
+
+        if isinstance(device, MarlinDevice):
+            device.set_line_number(0)
+
+        printer = _FleetPrinter(name, device)
+        self._printers[name] = printer
+        printer.start()
+
+    def submit(self, name: str, task: Callable[[Device], object]) -> Future:
+        """
+        **Queue job for printer.**
+
+        Parameters
+        ----------
+        **name : str**
+            Printer name
+
+        **task : Callable[[Device], object]**
+            Job, called with printer device in printer worker thread
+
+        Returns
+        -------
+        **Future**
+            Result of job
+        """
+        future = Future()
+        self._printers[name].jobs.put((task, future))
+
+        with self._lock:
+            self._pending = [pending for pending in self._pending if not pending.done()]
+            self._pending.append(future)
+
+        return future
+
+    def send(self, name: str, command: str) -> Future:
+        """
+        Queue single command for printer, future is resolved with response from device.
+        """
+        return self.submit(name, lambda device: device.send_and_await(command))
+
+    def stream(self, name: str, commands: Iterable[str]) -> Future:
+        """
+        Queue sequence of commands for printer, future is resolved with number of sent commands.
+        """
+        commands = list(commands)
+        return self.submit(name, lambda device: device.stream(commands))
+
+    def broadcast(self, commands: Iterable[str]) -> Dict[str, Future]:
+        """
+        Queue the same sequence of commands for every printer.
+        """
+        commands = list(commands)
+        return {name: self.stream(name, commands) for name in self._printers}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        **Block until all queued jobs are done.**
+
+        Returns
+        -------
+        **bool**
+            False if some jobs were still running after `timeout` seconds
+        """
+        with self._lock:
+            pending = list(self._pending)
+
+        _, not_done = wait(pending, timeout=timeout)
+        return len(not_done) == 0
+
+    @property
+    def busy(self) -> bool:
+        return any(printer.state == PrinterState.BUSY for printer in self._printers.values())
+
+    def status(self) -> Dict[str, PrinterStatus]:
+        """
+        **Status of every printer in fleet.**
+        """
+        return {
+            name: PrinterStatus(
+                name=name,
+                state=printer.state,
+                queued_jobs=printer.jobs.qsize(),
+                completed_jobs=printer.completed_jobs,
+                position=printer.device.get_current_position(),
+                error=printer.error,
+            )
+            for name, printer in self._printers.items()
+        }
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Finish queued jobs and stop worker threads, readers of serial printers are stopped.
+        """
+        for printer in self._printers.values():
+            printer.jobs.put(None)
+
+        for printer in self._printers.values():
+            printer.join(timeout)
+            if isinstance(printer.device, SerialDevice):
+                printer.device.stop_reader()
+
+        self._printers.clear()
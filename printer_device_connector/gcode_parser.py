@@ -0,0 +1,239 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# letter and its optional value, value may be separated from letter by spaces ('X 32')
+_WORD = re.compile(r"([A-Z])[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))?")
+
+# quoted strings ('M862.3 P "MK3S"') and parenthesized comments, letters inside are not words
+_NOT_WORDS = re.compile(r'"[^"]*"|\(([^)]*)\)')
+
+_CODE_LETTERS = "GMT"
+
+# plain moves, most lines of sliced file ('G1 X10.5 Y3 E0.2'), are split without tokenizer
+_PLAIN_MOVE_CODES = {"G0": "G0", "G1": "G1", "G00": "G0", "G01": "G1"}
+_PLAIN_MOVE_CHARACTERS = frozenset("0123456789.-+ \t\r\nXYZEF")
+
+
+class GCodeCommand:
+    """
+    **Single G-code line split into words.**
+
+    Attributes
+    ----------
+    **code : str**
+        Command code, like 'G1' or 'M104', empty for line without command
+
+    **params : Dict[str, Optional[float]]**
+        Parameter words (axis words, feedrate, arc offsets...), None for words without value ('G28 X')
+
+    **comment : Optional[str]**
+        Comment text, without ';'
+
+    **line_number : Optional[int]**
+        Line number ('N' word)
+    """
+
+    __slots__ = ("code", "params", "comment", "line_number")
+
+    def __init__(
+            self,
+            code: str = "",
+            params: Optional[Dict[str, Optional[float]]] = None,
+            comment: Optional[str] = None,
+            line_number: Optional[int] = None,
+    ) -> None:
+        self.code = code
+        self.params: Dict[str, Optional[float]] = {} if params is None else params
+        self.comment = comment
+        self.line_number = line_number
+
+    def get(self, letter: str, default: Optional[float] = None) -> Optional[float]:
+        return self.params.get(letter, default)
+
+    @property
+    def position(self) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        return self.params.get("X"), self.params.get("Y"), self.params.get("Z")
+
+    @property
+    def feedrate(self) -> Optional[float]:
+        return self.params.get("F")
+
+    @property
+    def is_move(self) -> bool:
+        return self.code in ("G0", "G1")
+
+    @property
+    def is_arc(self) -> bool:
+        return self.code in ("G2", "G3")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GCodeCommand):
+            return False
+        return (self.code, self.params, self.comment, self.line_number) == (
+            other.code, other.params, other.comment, other.line_number,
+        )
+
+    def __repr__(self) -> str:
+        return f"GCodeCommand(code={self.code!r}, params={self.params!r}, comment={self.comment!r})"
+
+
+# cache of normalized command codes, there are only few distinct ones in any file
+_codes: Dict[str, str] = {}
+
+
+def _code(letter: str, value: str) -> str:
+    code = _codes.get(letter + value)
+    if code is None:
+        number = float(value)
+        # 'G01' and 'G1' is the same command, 'M862.3' keeps its sub code
+        code = f"{letter}{int(number)}" if number.is_integer() else f"{letter}{number}"
+        _codes[letter + value] = code
+
+    return code
+
+
+def parse_line(line: str) -> GCodeCommand:
+    """
+    **Parse G-code line in single pass.**
+    Letters are case-insensitive, value may be separated from its letter by spaces ('X 32'),
+    ';' and '(...)' comments, quoted strings and '*' checksum are recognized,
+    so letters inside them are never taken for words.
+    Only the first G/M/T word is taken as command code, and the first 'N' word before it as line number.
+    Plain G0/G1 lines skip the tokenizer, they are split on spaces.
+
+    Parameters
+    ----------
+    **line : str**
+        G-code line
+
+    Returns
+    -------
+    **GCodeCommand**
+        Parsed command
+    """
+    command = _parse_plain_move(line)
+    if command is not None:
+        return command
+
+    line, semicolon, comment = line.partition(";")
+    line = line.partition("*")[0]
+    comment = comment.strip() if semicolon else None
+
+    if '"' in line or "(" in line:
+        for inline_comment in _NOT_WORDS.findall(line):
+            if inline_comment != "" and comment is None:
+                comment = inline_comment.strip()
+        line = _NOT_WORDS.sub(" ", line)
+
+    line = line.upper()
+
+    code = ""
+    line_number = None
+    params = {}
+    for letter, value in _WORD.findall(line):
+        if letter in params:
+            continue
+
+        if value == "":
+            if code == "" and letter in _CODE_LETTERS:
+                code = letter
+            elif letter != "N":
+                params[letter] = None
+
+        elif code == "" and letter in _CODE_LETTERS:
+            code = _code(letter, value)
+
+        elif letter == "N":
+            if code == "":
+                line_number = int(float(value))
+
+        else:
+            params[letter] = float(value)
+
+    return GCodeCommand(code, params, comment, line_number)
+
+
+def _parse_plain_move(line: str) -> Optional[GCodeCommand]:
+    """
+    Fast path of `parse_line` for G0/G1 with uppercase, space separated 'X10.5' words,
+    returns None for any other line (comments, checksum, duplicate or detached values...).
+    """
+    code, _, words = line.partition(" ")
+    code = _PLAIN_MOVE_CODES.get(code)
+    if code is None or not _PLAIN_MOVE_CHARACTERS.issuperset(words):
+        return None
+
+    params = {}
+    try:
+        for word in words.split():
+            letter = word[0]
+            value = word[1:]
+            # 'X1E5' is two words for tokenizer, but float would take it as exponent
+            if letter not in "XYZEF" or letter in params or "E" in value:
+                return None
+            params[letter] = float(value)
+    except ValueError:
+        # value detached from its letter ('X 32'), or malformed
+        return None
+
+    return GCodeCommand(code, params)
+
+
+def parse_lines(lines: Iterable[str]) -> List[GCodeCommand]:
+    """
+    **Parse many G-code lines, like whole file.**
+    Empty lines are skipped.
+
+    Parameters
+    ----------
+    **lines : Iterable[str]**
+        G-code lines, for example open file handle
+
+    Returns
+    -------
+    **List[GCodeCommand]**
+        Parsed commands, in order
+    """
+    return [parse_line(line) for line in lines if not line.isspace() and len(line) > 0]
+
+
+if __name__ == "__main__":
+    import timeit
+
+    def legacy_parse_move_command_to_position(command: str):
+        # parser used by Device before tokenizer, kept here as benchmark baseline
+        command = command.casefold() + " "
+        position = []
+        for axis in "xyz":
+            if axis not in command:
+                position.append(None)
+                continue
+
+            begin = command.find(axis)
+            if command[begin + 1] != " ":
+                command = command[:begin] + " " + command[begin:]
+            begin += 2
+            end = command[begin:].find(" ")
+            position.append(float(command[begin: end + begin]))
+
+        return tuple(position)
+
+    with open("assets/testing_block_0.1mm_PLA_MK3S_9m.gcode") as file:
+        moves = [line.strip() for line in file if line.startswith("G1 ") and ";" not in line]
+
+    repeats = 5
+    legacy_time = min(timeit.repeat(
+        lambda: [legacy_parse_move_command_to_position(move) for move in moves], number=1, repeat=repeats
+    ))
+    line_time = min(timeit.repeat(lambda: [parse_line(move).position for move in moves], number=1, repeat=repeats))
+    batch_time = min(timeit.repeat(lambda: parse_lines(moves), number=1, repeat=repeats))
+    moves_with_comment = [move + " ; move" for move in moves]
+    tokenizer_time = min(timeit.repeat(
+        lambda: [parse_line(move).position for move in moves_with_comment], number=1, repeat=repeats
+    ))
+
+    print(f"{len(moves)} move lines")
+    print(f"legacy parse_move_command_to_position: {legacy_time * 1e6 / len(moves):.2f}us per line")
+    print(f"parse_line:                            {line_time * 1e6 / len(moves):.2f}us per line")
+    print(f"parse_lines:                           {batch_time * 1e6 / len(moves):.2f}us per line")
+    print(f"parse_line, tokenizer (with comment):  {tokenizer_time * 1e6 / len(moves):.2f}us per line")
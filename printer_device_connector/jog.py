@@ -0,0 +1,391 @@
+import math
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+from printer_device_connector.device import Device
+from printer_device_connector.motion_planner import Position
+
+_UNKNOWN_POSITION = "Head position is unknown (axes not homed, or quickstop), home axes before jogging"
+
+
+def _clamp(printer: Device, target: Position) -> Position:
+    # same work area as Device.is_within_bounds, shifted by G92 offset of logical coordinates
+    work_area = printer.profile.work_area
+    return tuple(
+        min(max(value, offset + work_area[axis][0]), offset + work_area[axis][1])
+        for axis, value, offset in zip("XYZ", target, printer.state.offset)
+    )
+
+
+class JogWorker:
+    """
+    **Moves head on request, without blocking caller.**
+    Requests only change pending target, worker thread sends one move to it once previous move is completed.
+    Increments requested meanwhile are merged, so many button presses become a single move,
+    and absolute targets replace older ones (latest wins). Targets are clamped to printer work area.
+    Increments are refused while head position is unknown, before homing or after quickstop.
+
+    Parameters
+    ----------
+    **printer : Device**
+        Connected printer, not used by anything else while jogging
+
+    **on_position : Callable[[Position], None], optional**
+        Called from worker thread with head position after every completed move, **by default None**
+
+    **on_error : Callable[[Exception], None], optional**
+        Called from worker thread when move fails, **by default None** (error is logged in traffic log)
+    """
+
+    def __init__(
+            self,
+            printer: Device,
+            on_position: Optional[Callable[[Position], None]] = None,
+            on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        self.printer = printer
+        self.on_position = on_position
+        self.on_error = on_error
+        self.moves_sent: int = 0
+        self.requests: int = 0
+
+        # reentrant, `target` is read while holding it
+        self._condition = threading.Condition(threading.RLock())
+        self._target: Optional[Position] = None
+        # commands (homing) replace pending target, they are not merged with anything
+        self._commands: List[str] = []
+        # the latest target sent or pending, new increments are added to it
+        self._requested: Optional[Position] = None
+        # increments requested before commands completed, added to position printer has after them
+        self._deferred: Optional[List[float]] = None
+        self._running_commands = False
+        self._busy = False
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="JogWorker", daemon=True)
+        self._thread.start()
+
+    @property
+    def target(self) -> Optional[Position]:
+        """
+        The latest requested target, or printer position when nothing was requested since last command.
+        None while printer position is unknown, older target is not trusted after quickstop.
+        """
+        with self._condition:
+            position = self.printer.get_current_position()
+            if position is None or None in position:
+                return None
+            return position if self._requested is None else self._requested
+
+    def jog(self, x: float = 0, y: float = 0, z: float = 0) -> None:
+        """
+        **Move head by (x, y, z) mm from the latest requested target.**
+        Increments requested while commands (homing) are running start from position printer has after them,
+        when it's still unknown then, they are dropped and reported to `on_error`.
+
+        Raises
+        ------
+        **ValueError**
+            Head position is unknown, axes have to be homed first
+        """
+        with self._condition:
+            if len(self._commands) > 0 or self._running_commands:
+                self.requests += 1
+                deferred = self._deferred or [0, 0, 0]
+                self._deferred = [deferred[0] + x, deferred[1] + y, deferred[2] + z]
+                return
+
+            base = self.target
+            if base is None:
+                raise ValueError(_UNKNOWN_POSITION)
+            self._request(self._clamp((base[0] + x, base[1] + y, base[2] + z)))
+
+    def move_to(self, x: float, y: float, z: float) -> None:
+        """
+        Move head to (x, y, z), replacing pending target.
+        """
+        with self._condition:
+            self._deferred = None
+            self._request(self._clamp((x, y, z)))
+
+    def send(self, *commands: str) -> None:
+        """
+        Send `commands` (like 'G28') instead of pending target, position is taken from printer afterwards.
+        """
+        with self._condition:
+            self.requests += 1
+            self._target = None
+            self._requested = None
+            self._deferred = None
+            self._commands = list(commands)
+            self._condition.notify()
+
+    def home(self) -> None:
+        self.send("G28")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        **Block until all requested moves are completed.**
+
+        Returns
+        -------
+        **bool**
+            False if moves were not completed within `timeout` seconds
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._busy and self._target is None and self._deferred is None and len(self._commands) == 0,
+                timeout,
+            )
+
+    def close(self) -> None:
+        """
+        Stop worker, move that is being executed is completed, pending target is dropped.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "JogWorker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _request(self, target: Position) -> None:
+        self.requests += 1
+        self._target = target
+        self._requested = target
+        self._condition.notify()
+
+    def _clamp(self, target: Position) -> Position:
+        return _clamp(self.printer, target)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                self._condition.wait_for(
+                    lambda: self._closed or self._target is not None or len(self._commands) > 0
+                )
+                if self._closed:
+                    return
+
+                self._running_commands = len(self._commands) > 0
+                if self._running_commands:
+                    commands, self._commands = self._commands, []
+                else:
+                    x, y, z = self._target
+                    commands = [f"G1 X{round(x, 3)} Y{round(y, 3)} Z{round(z, 3)}"]
+                    self._target = None
+                self._busy = True
+
+            error = None
+            try:
+                for command in commands:
+                    self.printer.send_and_await(command)
+                    self.moves_sent += 1
+            except Exception as ex:
+                error = ex
+
+            with self._condition:
+                if error is not None:
+                    # position is unknown, next increment starts from what printer reports
+                    self._requested = None
+                if self._running_commands:
+                    unresolved = self._resolve_deferred()
+                    error = unresolved if error is None else error
+
+            if error is not None:
+                if self.on_error is not None:
+                    self.on_error(error)
+                else:
+                    self.printer.traffic_log.event("jog failed: %r", error)
+            elif self.on_position is not None:
+                self.on_position(self.printer.get_current_position())
+
+    def _resolve_deferred(self) -> Optional[Exception]:
+        # increments requested while commands were running start from position printer has after them
+        self._running_commands = False
+        if self._deferred is not None:
+            x, y, z = self._deferred
+            self._deferred = None
+            base = self.target
+            if base is None:
+                return ValueError(_UNKNOWN_POSITION)
+            self._target = self._requested = self._clamp((base[0] + x, base[1] + y, base[2] + z))
+
+
+class ContinuousJog:
+    """
+    **Head follows continuously updated target, like mouse pointer.**
+    Path to target is streamed as short segments, with up to `queue_depth` of them queued in firmware,
+    so head moves smoothly instead of stopping after every target update.
+    Every segment is planned towards the latest target, older targets are dropped without being reached.
+    Segment length is adapted to measured command latency: a segment lasts about as long as it takes to get
+    acknowledgement, so queue never drains, but head does not lag far behind target either.
+
+    Parameters
+    ----------
+    **printer : Device**
+        Connected printer, not used by anything else while jogging
+
+    **feedrate : float, optional**
+        Speed of head, in mm/min, **by default 3000**
+
+    **queue_depth : int, optional**
+        Maximum number of unacknowledged segments, **by default 2**
+
+    **min_segment : float, optional**
+        Shortest segment, in mm, **by default 0.5**
+
+    **max_segment : float, optional**
+        Longest segment, in mm, **by default 10**
+
+    **tolerance : float, optional**
+        Distance from target at which it is reached, in mm, **by default 0.05**
+    """
+
+    # weight of the newest latency sample in its moving average
+    _LATENCY_SMOOTHING = 0.3
+
+    def __init__(
+            self,
+            printer: Device,
+            feedrate: float = 3000,
+            queue_depth: int = 2,
+            min_segment: float = 0.5,
+            max_segment: float = 10,
+            tolerance: float = 0.05,
+    ) -> None:
+        self.printer = printer
+        self.feedrate = feedrate
+        self.queue_depth = queue_depth
+        self.min_segment = min_segment
+        self.max_segment = max_segment
+        self.tolerance = tolerance
+
+        self.latency: Optional[float] = None
+        self.segments_sent: int = 0
+        self.targets_dropped: int = 0
+        self.error: Optional[Exception] = None
+
+        self._condition = threading.Condition()
+        self._target: Optional[Position] = None
+        # target was not used for any segment yet
+        self._fresh = False
+        self._planned: Optional[Position] = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="ContinuousJog", daemon=True)
+        self._thread.start()
+
+    @property
+    def segment_length(self) -> float:
+        """
+        Length of next segment, in mm.
+        """
+        if self.latency is None:
+            return self.min_segment
+        return min(max(self.feedrate / 60 * self.latency, self.min_segment), self.max_segment)
+
+    def follow(self, x: float, y: float, z: float) -> None:
+        """
+        Set new target, clamped to printer work area. Returns immediately.
+        """
+        target = _clamp(self.printer, (x, y, z))
+        with self._condition:
+            if target == self._target:
+                return
+            if self._fresh:
+                self.targets_dropped += 1
+            self._target = target
+            self._fresh = True
+            self._condition.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        **Block until segments up to the latest target are sent.**
+
+        Returns
+        -------
+        **bool**
+            False if target was not reached within `timeout` seconds
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._closed or self._reached(), timeout)
+
+    def close(self) -> None:
+        """
+        Stop following, queued segments are still executed.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "ContinuousJog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _reached(self) -> bool:
+        return self._target is None or (
+                self._planned is not None and math.dist(self._planned, self._target) <= self.tolerance
+        )
+
+    def _run(self) -> None:
+        try:
+            self.printer.stream(self._segments(), window=self.queue_depth)
+        except Exception as ex:
+            self.error = ex
+            self.printer.traffic_log.event("continuous jog failed: %r", ex)
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+
+    def _segments(self) -> Iterator[str]:
+        position = self.printer.get_current_position()
+        self._planned = None if position is None or None in position else position
+        # segments sent since head was idle, latency is measured once queue is full
+        streak = 0
+
+        while True:
+            with self._condition:
+                if not self._closed and self._reached():
+                    streak = 0
+                    self._condition.notify_all()
+                    self._condition.wait_for(lambda: self._closed or not self._reached())
+                if self._closed:
+                    return
+
+                target = self._target
+                self._fresh = False
+                planned = self._planned
+
+            if planned is None:
+                point = target
+            else:
+                distance = math.dist(planned, target)
+                step = min(distance, self.segment_length) / distance
+                point = tuple(start + (end - start) * step for start, end in zip(planned, target))
+
+            with self._condition:
+                self._planned = point
+
+            sent_at = time.monotonic()
+            yield f"G1 X{point[0]:.3f} Y{point[1]:.3f} Z{point[2]:.3f} F{self.feedrate}"
+            self.segments_sent += 1
+            streak += 1
+
+            if streak > self.queue_depth:
+                sample = time.monotonic() - sent_at
+                if self.latency is None:
+                    self.latency = sample
+                else:
+                    self.latency += self._LATENCY_SMOOTHING * (sample - self.latency)
@@ -0,0 +1,146 @@
+import enum
+from typing import List, MutableSequence, Optional, Tuple, Union
+
+from printer_device_connector.resend_buffer import ResendBuffer
+
+
+def checksum(line: str) -> int:
+    """
+    Marlin line checksum, xor of all characters.
+    """
+    cs = 0
+    for character in line:
+        cs ^= ord(character) & 0xFF
+    return cs & 0xFF
+
+
+def cs_line(line: str) -> str:
+    return line + "*" + str(checksum(line))
+
+
+def no_line(line: str, line_number: int) -> str:
+    return f"N{line_number} " + line + f" N{line_number}"
+
+
+class Reply(enum.Enum):
+    """
+    **What received line means for sender.**
+    """
+
+    ACKNOWLEDGEMENT = "acknowledgement"  # the oldest line in flight is processed
+    SKIPPED = "skipped"  # transmission error, or 'ok' that acknowledges no line
+    RESEND = "resend"  # requested lines have to be written again
+    RESET = "reset"  # 'start' banner, board was reset mid-session
+    MESSAGE = "message"  # anything else: echo, busy keepalive, reports
+
+
+class LineProtocol:
+    """
+    **Host side of firmware serial protocol, without any I/O.**
+    Shared by blocking devices (`MarlinDevice`, `PrusaDevice`) and asyncio devices (`AsyncDevice`),
+    which only write lines and read replies:
+        - commands get default feedrate, numbered ones also line number and checksum,
+        - sent lines are counted, numbered ones are kept in `resend_buffer`,
+        - lines requested again ('Resend: N') are handed back for retransmission, and numbers of lines in flight
+          are updated, as firmware dropped requested line and everything after it,
+        - 'ok' that follows resend request, and replies to real-time commands, acknowledge no line and are skipped.
+
+    Parameters
+    ----------
+    **numbered : bool, optional**
+        Lines are numbered and check summed, and firmware may request them again, **by default True**
+    """
+
+    def __init__(self, numbered: bool = True) -> None:
+        self.numbered = numbered
+        self.line_counter: int = 1
+        self.resend_buffer: ResendBuffer = ResendBuffer()
+        # 'ok' replies that do not acknowledge any regular line
+        self.skip_acknowledgements: int = 0
+
+    def prepare(self, command: str, speed: float) -> str:
+        """
+        Line written for `command`: default feedrate `speed` is applied, numbered and check summed if protocol is.
+        """
+        if "F" not in command:
+            command += f" F {speed}"
+
+        if self.numbered:
+            command = cs_line(self.number(command))
+
+        if command[-1] != "\n":
+            command += "\n"
+
+        return command
+
+    def number(self, line: str) -> str:
+        """
+        Number line with next number of line counter.
+        """
+        line = no_line(line, self.line_counter)
+        self.line_counter += 1
+
+        return line
+
+    def sent(self, line: Union[str, bytes]) -> int:
+        """
+        Account written line, returns its number (sequence number of not numbered lines).
+        """
+        if self.numbered:
+            return self.resend_buffer.store(line)
+
+        self.resend_buffer.lines_sent += 1
+        return self.resend_buffer.lines_sent
+
+    def receive(
+            self, response: str, in_flight: Optional[MutableSequence[int]] = None
+    ) -> Tuple[Reply, List[Union[str, bytes]]]:
+        """
+        **Classify line received from firmware and update bookkeeping.**
+
+        Parameters
+        ----------
+        **response : str**
+            Decoded line
+
+        **in_flight : MutableSequence[int], optional**
+            Numbers of lines awaiting acknowledgement, updated on resend request, **by default None**
+
+        Returns
+        -------
+        **Tuple[Reply, List[Union[str, bytes]]]**
+            Meaning of line, and lines to write again, as they were stored
+        """
+        text = response.strip()
+
+        if ResendBuffer.is_transmission_error(text):
+            return Reply.SKIPPED, []
+
+        if text == "start":
+            return Reply.RESET, []
+
+        line_number = ResendBuffer.parse_resend_request(text) if self.numbered else None
+        if line_number is not None:
+            # request is followed by its own 'ok'
+            self.skip_acknowledgements += 1
+            return Reply.RESEND, self._resend(line_number, in_flight)
+
+        if text.startswith("ok"):
+            if self.skip_acknowledgements > 0:
+                self.skip_acknowledgements -= 1
+                return Reply.SKIPPED, []
+            return Reply.ACKNOWLEDGEMENT, []
+
+        return Reply.MESSAGE, []
+
+    def _resend(self, line_number: int, in_flight: Optional[MutableSequence[int]]) -> List[Union[str, bytes]]:
+        lines = self.resend_buffer.request(line_number)
+        if len(lines) == 0 or in_flight is None:
+            return lines
+
+        # device dropped requested line and everything after it
+        while len(in_flight) > 0 and in_flight[-1] >= line_number:
+            in_flight.pop()
+        in_flight.extend(ResendBuffer.line_number(line) for line in lines)
+
+        return lines
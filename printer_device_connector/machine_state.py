@@ -0,0 +1,306 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from printer_device_connector.gcode_parser import GCodeCommand
+from printer_device_connector.motion_planner import Position
+from printer_device_connector.trajectory import Point3D
+
+_MM_PER_INCH = 25.4
+
+# commands setting target temperature, and heater they set
+_HEATERS = {"M104": "hotend", "M109": "hotend", "M140": "bed", "M190": "bed"}
+
+
+def _moved(current: Optional[float], value: Optional[float], relative: bool, scale: float) -> Optional[float]:
+    if value is None:
+        return current
+    if relative:
+        return None if current is None else current + value * scale
+    return value * scale
+
+
+class MachineState:
+    """
+    **Modal state of firmware, tracked from sent G-code.**
+    Follows Marlin semantics: axes missing from move keep their position, G91 makes every axis relative
+    (extruder also with M83), G20 switches values and feedrate to inches, G92 shifts logical coordinates.
+    All values are kept in millimeters, axis is None while its position is unknown.
+
+    Attributes
+    ----------
+    **position : Point3D**
+        Logical head position, as used in G-code and reported by M114
+
+    **e : Optional[float]**
+        Extruder position
+
+    **offset : List[float]**
+        Shift of logical coordinates from machine coordinates (G92), per axis X, Y, Z
+
+    **relative : bool**
+        Relative positioning (G91)
+
+    **relative_extrusion : bool**
+        Relative extruder positioning (M83), independent of G90
+
+    **inches : bool**
+        Values are in inches (G20)
+
+    **feedrate : Optional[float]**
+        Modal feedrate, in mm/min
+
+    **temperatures : Dict[str, float]**
+        Target temperatures of heaters ('hotend', 'bed'), replaced on every change, so it can be shared with snapshots
+    """
+
+    __slots__ = ("position", "e", "offset", "relative", "relative_extrusion", "inches", "feedrate", "temperatures")
+
+    def __init__(self, position: Optional[Point3D] = None) -> None:
+        self.position: Point3D = Point3D() if position is None else position
+        self.e: Optional[float] = 0
+        self.offset: List[float] = [0, 0, 0]
+        self.relative: bool = False
+        self.relative_extrusion: bool = False
+        self.inches: bool = False
+        self.feedrate: Optional[float] = None
+        self.temperatures: Dict[str, float] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "position": self.position.as_tuple(),
+            "e": self.e,
+            "offset": self.offset,
+            "relative": self.relative,
+            "relative_extrusion": self.relative_extrusion,
+            "inches": self.inches,
+            "feedrate": self.feedrate,
+            "temperatures": self.temperatures,
+        }
+
+    @staticmethod
+    def from_dict(values: Dict[str, Any]) -> "MachineState":
+        state = MachineState(Point3D(*values["position"]))
+        state.e = values["e"]
+        state.offset = list(values["offset"])
+        state.relative = values["relative"]
+        state.relative_extrusion = values["relative_extrusion"]
+        state.inches = values["inches"]
+        state.feedrate = values["feedrate"]
+        state.temperatures = dict(values["temperatures"])
+        return state
+
+    @property
+    def machine_position(self) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        Position in machine coordinates (without G92 shift), used for bounds checks.
+        """
+        return tuple(
+            None if value is None else value - offset
+            for value, offset in zip(self.position.as_tuple(), self.offset)
+        )
+
+    def target(self, command: GCodeCommand) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        **Position after move `command`, state is not changed.**
+
+        Parameters
+        ----------
+        **command : GCodeCommand**
+            G0, G1, G2 or G3 move
+
+        Returns
+        -------
+        **Tuple[Optional[float], Optional[float], Optional[float]]**
+            Logical position, unknown axes are None
+        """
+        params = command.params
+        scale = _MM_PER_INCH if self.inches else 1
+        relative = self.relative
+        position = self.position
+        return (
+            _moved(position.x, params.get("X"), relative, scale),
+            _moved(position.y, params.get("Y"), relative, scale),
+            _moved(position.z, params.get("Z"), relative, scale),
+        )
+
+    def feedrate_of(self, command: GCodeCommand, default: float) -> float:
+        """
+        Feedrate of move `command` in mm/min: its own F word, modal feedrate, or `default` when none was set yet.
+        """
+        feedrate = command.feedrate
+        if feedrate is not None:
+            return feedrate * _MM_PER_INCH if self.inches else feedrate
+        return default if self.feedrate is None else self.feedrate
+
+    def apply(self, command: GCodeCommand) -> bool:
+        """
+        **Update state with sent command.**
+
+        Returns
+        -------
+        **bool**
+            True if command changes tracked state
+        """
+        code = command.code
+        if code == "G1" or code == "G0" or code == "G2" or code == "G3":
+            self._move(command.params)
+            return True
+
+        handler = _HANDLERS.get(code)
+        if handler is None:
+            return False
+
+        handler(self, command)
+        return True
+
+    def arc_path(self, command: GCodeCommand, segment_length: float = 1) -> List[Position]:
+        """
+        **Points of arc move (G2, G3) in XY plane, split into chords, like firmware does.**
+        Center is given with I, J offsets from start, or with radius R (negative R for arc longer than half circle).
+        Z moves linearly along arc (helix).
+
+        Parameters
+        ----------
+        **command : GCodeCommand**
+            G2 (clockwise) or G3 (counterclockwise) move
+
+        **segment_length : float, optional**
+            Length of single chord, in mm, **by default 1** (Marlin MM_PER_ARC_SEGMENT)
+
+        Raises
+        ------
+        **ValueError**
+            Arc starts at unknown position, or has no center
+
+        Returns
+        -------
+        **List[Position]**
+            Consecutive points, the last one is the arc end
+        """
+        if self.position.is_none():
+            raise ValueError("Arc starts at unknown position")
+
+        start_x, start_y, start_z = self.position.as_tuple()
+        end_x, end_y, end_z = self.target(command)
+        scale = _MM_PER_INCH if self.inches else 1
+        clockwise = command.code == "G2"
+
+        radius = command.get("R")
+        if radius is not None:
+            radius *= scale
+            dx, dy = end_x - start_x, end_y - start_y
+            distance = math.hypot(dx, dy)
+            if distance == 0:
+                raise ValueError("Arc with radius can not be a full circle")
+            side = -1 if clockwise ^ (radius < 0) else 1
+            height = math.sqrt(max(0.0, radius * radius - distance * distance / 4))
+            center_x = (start_x + end_x) / 2 - side * height * dy / distance
+            center_y = (start_y + end_y) / 2 + side * height * dx / distance
+        elif command.get("I") is not None or command.get("J") is not None:
+            center_x = start_x + (command.get("I") or 0) * scale
+            center_y = start_y + (command.get("J") or 0) * scale
+        else:
+            raise ValueError(f"Arc without center: {command!r}")
+
+        radius = math.hypot(start_x - center_x, start_y - center_y)
+        start_angle = math.atan2(start_y - center_y, start_x - center_x)
+        travel = math.atan2(end_y - center_y, end_x - center_x) - start_angle
+        # the same start and end is a full circle
+        if clockwise and travel >= 0:
+            travel -= 2 * math.pi
+        elif not clockwise and travel <= 0:
+            travel += 2 * math.pi
+
+        segments = max(1, math.ceil(abs(travel) * radius / segment_length))
+        points = [
+            (
+                center_x + radius * math.cos(start_angle + travel * i / segments),
+                center_y + radius * math.sin(start_angle + travel * i / segments),
+                start_z + (end_z - start_z) * i / segments,
+            )
+            for i in range(1, segments)
+        ]
+        points.append((end_x, end_y, end_z))
+        return points
+
+    def _move(self, params: Dict[str, Optional[float]]) -> None:
+        scale = _MM_PER_INCH if self.inches else 1
+        relative = self.relative
+        position = self.position
+
+        feedrate = params.get("F")
+        if feedrate is not None:
+            self.feedrate = feedrate * scale
+
+        position.x = _moved(position.x, params.get("X"), relative, scale)
+        position.y = _moved(position.y, params.get("Y"), relative, scale)
+        position.z = _moved(position.z, params.get("Z"), relative, scale)
+        self.e = _moved(self.e, params.get("E"), relative or self.relative_extrusion, scale)
+
+    def _home(self, command: GCodeCommand) -> None:
+        params = command.params
+        axes = [axis for axis in "XYZ" if axis in params] or ["X", "Y", "Z"]
+        for axis in axes:
+            index = "XYZ".index(axis)
+            self.offset[index] = 0
+            setattr(self.position, axis.lower(), 0)
+
+    def _set_position(self, command: GCodeCommand) -> None:
+        scale = _MM_PER_INCH if self.inches else 1
+        for index, axis in enumerate("XYZ"):
+            value = command.get(axis)
+            if value is None:
+                continue
+
+            current = getattr(self.position, axis.lower())
+            if current is not None:
+                self.offset[index] += value * scale - current
+            setattr(self.position, axis.lower(), value * scale)
+
+        if command.get("E") is not None:
+            self.e = command.get("E") * scale
+
+    def _set_temperature(self, command: GCodeCommand) -> None:
+        temperature = command.get("S")
+        if temperature is not None:
+            self.temperatures = {**self.temperatures, _HEATERS[command.code]: temperature}
+
+    def _set_flag(self, command: GCodeCommand) -> None:
+        attribute, value = _FLAGS[command.code]
+        setattr(self, attribute, value)
+
+
+_FLAGS = {
+    "G90": ("relative", False),
+    "G91": ("relative", True),
+    "M82": ("relative_extrusion", False),
+    "M83": ("relative_extrusion", True),
+    "G20": ("inches", True),
+    "G21": ("inches", False),
+}
+
+_HANDLERS = {
+    "G28": MachineState._home,
+    "G92": MachineState._set_position,
+    **{code: MachineState._set_temperature for code in _HEATERS},
+    **{code: MachineState._set_flag for code in _FLAGS},
+}
+
+
+if __name__ == "__main__":
+    import timeit
+
+    from printer_device_connector.gcode_parser import parse_lines
+
+    with open("assets/testing_block_0.1mm_PLA_MK3S_9m.gcode") as file:
+        commands = parse_lines(file)
+
+    def track():
+        state = MachineState()
+        for command in commands:
+            state.apply(command)
+
+    repeats = 5
+    state_time = min(timeit.repeat(track, number=1, repeat=repeats))
+    print(f"{len(commands)} commands")
+    print(f"MachineState.apply: {state_time * 1e6 / len(commands):.2f}us per line")
@@ -1,16 +1,25 @@
 import time
-from typing import Tuple
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Iterable, Iterator, List, Tuple
 from typing import Optional
 from serial import Serial
 from serial import SerialException
-from printer_device_connector.device import Device, static_vars
 from printer_device_connector.exceptions import Err, ResultWithErr
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector import line_protocol
+from printer_device_connector.line_protocol import Reply
+from printer_device_connector.port_discovery import PortCache, discover_port, enumerate_ports, hardware_id
+from printer_device_connector.resend_buffer import ResendBuffer
+from printer_device_connector.serial_device import SerialDevice
+from printer_device_connector.supervisor import DeviceResetError, supervised_command, supervised_stream
 
-import serial.tools.list_ports
 import logging
 
+if TYPE_CHECKING:
+    from printer_device_connector.compiled_job import CompiledJob
 
-class MarlinDevice(Device):
+
+class MarlinDevice(SerialDevice):
     """
     **Marlin Device Connector**
     Specification of Connector class for printers running marlin os.
@@ -21,20 +30,35 @@ class MarlinDevice(Device):
     """
 
     _SUCCESSFUL_CONNECTION_MESSAGE = bytes("start\n", "utf-8")
+    _STREAM_WINDOW = 4  # number of commands Marlin buffers by default (BUFSIZE), unless firmware reports its own
+    _NUMBERED_LINES = True
+
+    @property
+    def resend_buffer(self) -> ResendBuffer:
+        return self._protocol.resend_buffer
 
-    _device: Serial  # pyserial connector device
+    @property
+    def line_counter(self) -> int:
+        """
+        Number of next sent line, every device keeps its own sequence.
+        """
+        return self._protocol.line_counter
 
-    def __init__(self, device: Serial) -> None:
-        super().__init__()
-        self._device = device
+    @line_counter.setter
+    def line_counter(self, line_counter: int) -> None:
+        self._protocol.line_counter = line_counter
 
     def __del__(self) -> None:
+        self.stop_reader()
         self._device.close()
 
     @staticmethod
-    def connect_on_port(port: str, baudrate: int = 250000, timeout=5) -> "MarlinDevice":
+    def connect_on_port(
+            port: str, baudrate: int = 250000, timeout=5, cache: Optional[PortCache] = None
+    ) -> "MarlinDevice":
         """
         **Connects to device on specified port.**
+        Transport is tuned to capabilities reported by firmware (`probe_capabilities`).
 
         Parameters
         ----------
@@ -47,6 +71,9 @@ class MarlinDevice(Device):
         **timeout : int, optional**
             Await for response time in seconds, **by default 5**
 
+        **cache : PortCache, optional**
+            Cache of firmware capabilities, **by default None** (firmware is always probed)
+
         Returns
         -------
         **MarlinDevice**
@@ -62,7 +89,9 @@ class MarlinDevice(Device):
                 resp = device.readline()
                 print(resp.strip())
 
-        return MarlinDevice(device=device)
+        printer = MarlinDevice(device=device)
+        printer.probe_capabilities(hardware_id(port), cache)
+        return printer
 
     @staticmethod
     def connect() -> "MarlinDevice":
@@ -70,60 +99,37 @@ class MarlinDevice(Device):
         **Search for port on which printed device is connected to pc.**
         If none is found, error is raised.
 
-        Marlin device runs on: **baudrate set to 250000**
+        Marlin device runs on: **baudrate set to 250000**, 115200 is tried as well.
+        All ports are probed concurrently, port remembered for device hardware id is tried first.
 
         Raises
         ------
+        **SerialException**
+            No device found
 
         Returns
         -------
         **MarlinDevice**
             Correctly set up connector to printer device.
         """
-        baudrate: int = 250000
-        timeout: int = 1
-        device: Optional[Serial] = None
-        available_ports = serial.tools.list_ports.comports()
-
         print("List all available ports:")
-        for port, desc, hwid in sorted(available_ports):
+        for port, desc, hwid in enumerate_ports():
             print(f"\t port: '{port}', desc: '{desc}', hwid: '{hwid}")
 
-        for port, desc, hwid in sorted(available_ports):
-            print(
-                f"Connected connecting to:\n\t port: '{port}', desc: '{desc}', hwid: '{hwid}"
-            )
-            try:
-                device: Serial = Serial(
-                    port=str(port), baudrate=baudrate, timeout=timeout
-                )
-                print(f"Serial port is Open'")
-                resp: bytes = device.readline()
-                print(f"Answer: '{resp}'")
-
-                if resp != MarlinDevice._SUCCESSFUL_CONNECTION_MESSAGE:
-                    raise SerialException()
-
-                print(f"Connected on port: '{port}', desc: '{desc}', hwid: '{hwid}")
-                logging.info(
-                    f"Connected on port: '{port}', desc: '{desc}', hwid: '{hwid}"
-                )
-                break
-
-            except SerialException:
-                device = None
-                continue
+        cache = PortCache()
+        device, (port, desc, hwid) = discover_port(baudrates=[250000, 115200], timeout=1, cache=cache)
+        logging.info(f"Connected on port: '{port}', desc: '{desc}', hwid: '{hwid}")
 
-        if device is None:
-            raise SerialException("Device not found")
-
-        while resp != "":
-            if resp is not None:
-                resp = device.readline().decode("utf-8")
-                print(resp.strip())
+        resp = device.readline()
+        while resp != bytes():
+            print(resp.strip())
+            resp = device.readline()
 
-        return MarlinDevice(device=device)
+        printer = MarlinDevice(device=device)
+        printer.probe_capabilities(hwid, cache)
+        return printer
 
+    @supervised_command
     def send_and_await(self, command: str) -> Tuple[str, str]:
         """
         send command to Anycubic S device, then await response
@@ -134,56 +140,367 @@ class MarlinDevice(Device):
         Returns:
             str: response from device
         """
+        self._check_bounds(command)
 
-        if "F" not in command:
-            command += f" F {self.speed}"
-
-        command = MarlinDevice.no_line(command)
-        command = MarlinDevice.cs_line(command)
+        command = self._prepare_command(command)
+        parsed_command = parse_line(command)
 
-        if command[-1] != "\n":
-            command += "\n"
+        predicted_time_of_execution = self.predict_time_of_execution(parsed_command)
 
-        print(f"req:  {command}")
-        print(f"predicted_time_of_execution: {self.predict_time_of_execution(command)}")
+        self.traffic_log.event("predicted time of execution: %.3fs", predicted_time_of_execution)
 
-        self._device.write(bytearray(command, "ascii"))
-        time.sleep(self.predict_time_of_execution(command))
+        self._stopped.clear()
+        sent_at = time.monotonic()
+        line_number = self._write_line(command)
+        if not self._synchronizes(parsed_command):
+            self._sleep_predicted(predicted_time_of_execution)
 
-        resp = str(self._device.readline())
-        print(f"resp: {resp}")
+        resp = str(self._read_response(deque([line_number])))
 
-        if "G1" in command:
-            self.set_current_position_from_string(command)
+        if self._synchronizes(parsed_command):
+            self._await_motion(parsed_command, predicted_time_of_execution, sent_at)
 
-        elif "G28" in command:
-            self.current_position.from_tuple((0, 0, 0))
+        self._update_state(parsed_command)
 
         return (resp, resp[2:-3])
 
+    @supervised_stream
+    def stream(self, commands: Iterable[str], window: Optional[int] = None) -> int:
+        """
+        **Stream commands using firmware acknowledgements as flow control.**
+        Up to `window` numbered lines are kept in flight, every 'ok' received from the device
+        frees a slot for the next line, so the planner buffer stays full and no time is spent
+        sleeping on predicted execution times.
+        Lines requested again by the device ('Resend: N') are retransmitted from resend buffer.
+
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            G-code commands, sent in order
+
+        **window : int, optional**
+            Maximum number of unacknowledged lines, **by default `stream_window`**
+            (command buffer size reported by firmware, or 4, Marlin BUFSIZE)
+
+        Raises
+        ------
+        **ValueError**
+            Move ends outside of work area, lines before it are still sent
+
+        **SerialException**
+            Device stopped answering before all lines were acknowledged
+
+        Returns
+        -------
+        **int**
+            Number of sent lines
+        """
+        window = self.stream_window if window is None else window
+        if window < 1:
+            raise ValueError(f"Expected window of at least 1 line, got {window}")
+
+        return self._stream_lines(self._prepared_lines(commands), window)
+
+    @supervised_stream
+    def send_batch(self, commands: Iterable[str], rx_buffer_size: Optional[int] = None) -> int:
+        """
+        **Stream commands, packing as many lines as fit in firmware RX buffer into single write.**
+        Grbl-style character counting: size of every unacknowledged line is tracked, and lines are written
+        only while all of them fit in RX buffer, so buffer never overflows and dense short moves take
+        a few USB transfers instead of one per line. Lines are written once budget is used up
+        or `commands` run out, so commands should be readily available (like list of moves).
+
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            G-code commands, sent in order
+
+        **rx_buffer_size : int, optional**
+            Byte budget of unacknowledged lines, **by default `rx_buffer_size`** (Marlin RX_BUFFER_SIZE)
+
+        Raises
+        ------
+        **ValueError**
+            Single line does not fit in RX buffer, or move ends outside of work area
+
+        **SerialException**
+            Device stopped answering before all lines were acknowledged
+
+        Returns
+        -------
+        **int**
+            Number of sent lines
+        """
+        rx_buffer_size = self.rx_buffer_size if rx_buffer_size is None else rx_buffer_size
+        return self._stream_lines(self._prepared_lines(commands), None, rx_buffer_size)
+
+    @supervised_stream
+    def stream_lines(
+            self, lines: Iterable[str], window: Optional[int] = None, rx_buffer_size: Optional[int] = None
+    ) -> int:
+        """
+        **Stream G-code lines as they are, like lines of printed file.**
+        Unlike `stream`, feedrate is not added. Every line is checked against work area, numbered
+        and check summed just before it's written, so lines still waiting in lookahead of caller
+        never take line numbers, and lines sent again after reconnect continue numbering set by supervisor.
+        Lines are coalesced into writes within `rx_buffer_size`.
+
+        Parameters
+        ----------
+        **lines : Iterable[str]**
+            G-code lines without line numbers, checksums and comments, sent in order
+
+        **window : int, optional**
+            Maximum number of unacknowledged lines, **by default `stream_window`**
+
+        **rx_buffer_size : int, optional**
+            Byte budget of unacknowledged lines, **by default `rx_buffer_size`**
+
+        Raises
+        ------
+        **ValueError**
+            Single line does not fit in RX buffer, or move ends outside of work area
+
+        **SerialException**
+            Device stopped answering before all lines were acknowledged
+
+        Returns
+        -------
+        **int**
+            Number of sent lines
+        """
+        window = self.stream_window if window is None else window
+        rx_buffer_size = self.rx_buffer_size if rx_buffer_size is None else rx_buffer_size
+        return self._stream_lines(self._numbered_lines(lines), window, rx_buffer_size)
+
+    def _numbered_lines(self, lines: Iterable[str]) -> Iterator[bytes]:
+        for line in lines:
+            command = parse_line(line)
+            self._check_bounds(command)
+            self._update_state(command)
+            yield bytes(MarlinDevice.cs_line(self._number_line(line)) + "\n", "ascii")
+
+    def _prepared_lines(self, commands: Iterable[str]) -> Iterator[bytes]:
+        for command in commands:
+            self._check_bounds(command)
+            command = self._prepare_command(command)
+            self._update_state(command)
+            yield bytes(command, "ascii")
+
+    def stream_job(self, job: "CompiledJob", window: Optional[int] = None) -> int:
+        """
+        **Stream precompiled job.**
+        Device line counter is set to match job numbering first, lines are sent exactly as compiled.
+        Afterwards device state is the final state of job (position, positioning modes, G92 offsets, feedrate,
+        extruder), as if its lines were sent one by one.
+
+        Parameters
+        ----------
+        **job : CompiledJob**
+            Numbered and check summed lines
+
+        **window : int, optional**
+            Maximum number of unacknowledged lines, **by default `stream_window`**
+
+        Raises
+        ------
+        **ValueError**
+            Move of job ends outside of work area, nothing is sent
+
+        Returns
+        -------
+        **int**
+            Number of sent lines
+        """
+        # checked ahead of streaming, compiled lines are written as they are
+        final_state = self._check_path_bounds(line.decode("ascii") for line in job)
+
+        self.set_line_number(job.first_line_number - 1)
+
+        sent = self._stream_lines(job, self.stream_window if window is None else window)
+
+        self.line_counter = job.first_line_number + len(job)
+        # `job.final_state` resolved from state before the job, so relative moves keep known position
+        self.state = final_state
+
+        return sent
+
+    def replace_port(self, device: Serial, reset: bool) -> None:
+        super().replace_port(device, reset)
+        # line numbering restarts on new port
+        self.set_line_number(0)
+
+    def set_line_number(self, line_number: int) -> None:
+        """
+        Set number of last received line in device (M110), next sent line gets `line_number` + 1.
+        """
+        command = MarlinDevice.cs_line(MarlinDevice.no_line(f"M110 N{line_number}", line_number)) + "\n"
+
+        # numbers of lines sent before reset will be used again
+        self.resend_buffer.clear()
+        in_flight = deque([self._write_line(command)])
+        self._await_acknowledgement(in_flight)
+
+        self.line_counter = line_number + 1
+
+    def _stream_lines(self, lines: Iterable[bytes], window: Optional[int], rx_buffer_size: Optional[int] = None) -> int:
+        """
+        Keep up to `window` lines in flight (no limit if None). With `rx_buffer_size` their total size is limited as well,
+        and lines are coalesced into single writes, otherwise every line is written as soon as it's allowed.
+        Lines are written as given, callers check them against work area first.
+        """
+        if window is not None and window < 1:
+            raise ValueError(f"Expected window of at least 1 line, got {window}")
+
+        in_flight: Deque[int] = deque()
+        # size of lines by their number, resent lines keep their numbers
+        sizes: Dict[int, int] = {}
+        batch: List[bytes] = []
+        sent = 0
+
+        try:
+            for line in lines:
+                if rx_buffer_size is not None and len(line) > rx_buffer_size:
+                    raise ValueError(f"Line of {len(line)} bytes does not fit in RX buffer of {rx_buffer_size} bytes")
+
+                while not self._fits(line, in_flight, sizes, batch, window, rx_buffer_size):
+                    if len(batch) > 0:
+                        self._flush_batch(batch, in_flight, sizes)
+                    else:
+                        self._await_acknowledgement(in_flight)
+                        # acknowledgements that arrived meanwhile free more space, so next write carries more lines
+                        while rx_buffer_size is not None and len(in_flight) > 0 and self._input_waiting():
+                            self._await_acknowledgement(in_flight)
+                        sizes = {number: sizes[number] for number in in_flight if number in sizes}
+
+                batch.append(line)
+                sent += 1
+                if rx_buffer_size is None:
+                    self._flush_batch(batch, in_flight, sizes)
+        except ValueError:
+            # rejected line ends stream, lines queued before it are sent and acknowledged
+            if len(batch) > 0:
+                self._flush_batch(batch, in_flight, sizes)
+            while len(in_flight) > 0:
+                self._await_acknowledgement(in_flight)
+            raise
+
+        if len(batch) > 0:
+            self._flush_batch(batch, in_flight, sizes)
+
+        while len(in_flight) > 0:
+            self._await_acknowledgement(in_flight)
+
+        return sent
+
+    @staticmethod
+    def _fits(
+            line: bytes,
+            in_flight: Deque[int],
+            sizes: Dict[int, int],
+            batch: List[bytes],
+            window: Optional[int],
+            rx_buffer_size: Optional[int],
+    ) -> bool:
+        if window is not None and len(in_flight) + len(batch) >= window:
+            return False
+        if rx_buffer_size is None:
+            return True
+
+        used = sum(sizes.get(number, 0) for number in in_flight) + sum(len(queued) for queued in batch)
+        return used + len(line) <= rx_buffer_size
+
+    def _flush_batch(self, batch: List[bytes], in_flight: Deque[int], sizes: Dict[int, int]) -> None:
+        for line in batch:
+            line_number = self._protocol.sent(line)
+            in_flight.append(line_number)
+            sizes[line_number] = len(line)
+
+        self._write(b"".join(batch))
+        batch.clear()
+
+    def _write_line(self, line: str) -> int:
+        return self._write_bytes(bytes(line, "ascii"))
+
+    def _write_bytes(self, line: bytes) -> int:
+        line_number = self._protocol.sent(line)
+        self._write(line)
+        return line_number
+
+    def _send_sync_command(self, command: str) -> List[str]:
+        line = MarlinDevice.cs_line(self._number_line(command)) + "\n"
+
+        messages: List[str] = []
+        messages.append(self._await_acknowledgement(deque([self._write_line(line)]), messages))
+        return messages
+
+    def _await_acknowledgement(self, in_flight: Deque[int], messages: Optional[List[str]] = None) -> str:
+        """
+        Read device output until the oldest in-flight line is acknowledged.
+        Any other messages (echo, temperature reports, busy keepalive) are skipped, or collected in `messages`.
+        Silence is tolerated for `silence_timeout`, chosen from keepalive support of firmware.
+        """
+        silent_since: Optional[float] = None
+        while True:
+            resp = self._read_response(in_flight).decode("ascii", errors="replace").strip()
+
+            if resp == "":
+                if silent_since is None:
+                    silent_since = time.monotonic()
+                if time.monotonic() - silent_since >= self.silence_timeout:
+                    raise SerialException(
+                        f"No acknowledgement received for line: N{in_flight[0]}"
+                    )
+                continue
+            silent_since = None
+
+            if resp.startswith("ok"):
+                in_flight.popleft()
+                self.acknowledged_lines += 1
+                return resp
+
+            if messages is not None:
+                messages.append(resp)
+
+    def _read_response(self, in_flight: Deque[int]) -> bytes:
+        """
+        Read next response, transmission errors and resend requests are handled here and never returned.
+        Every resend request is followed by its own 'ok', which does not acknowledge any line, so it's skipped,
+        same as 'ok' replies to real-time commands.
+        """
+        while True:
+            resp: bytes = self._readline()
+            reply, lines = self._protocol.receive(resp.decode("ascii", errors="replace"), in_flight)
+
+            if reply == Reply.RESET:
+                raise DeviceResetError("Device was reset, 'start' received mid-session")
+
+            for line in lines:
+                self._write(line)
+
+            if reply in (Reply.ACKNOWLEDGEMENT, Reply.MESSAGE):
+                return resp
+
+    def _prepare_command(self, command: str) -> str:
+        return self._protocol.prepare(command, self.speed)
+
     @staticmethod
     def checksum(line: str) -> int:
-        cs = 0
-        for i in range(0, len(line)):
-            cs ^= ord(line[i]) & 0xFF
-        cs &= 0xFF
-        return cs
+        return line_protocol.checksum(line)
 
     @staticmethod
     def cs_line(line: str) -> str:
-        return line + "*" + str(MarlinDevice.checksum(line))
+        return line_protocol.cs_line(line)
 
     @staticmethod
-    @static_vars(line_counter=1)
-    def no_line(line: str) -> str:
-        line = (
-            f"N{MarlinDevice.no_line.line_counter} "
-            + line
-            + f" N{MarlinDevice.no_line.line_counter}"
-        )
-        MarlinDevice.no_line.line_counter += 1
-
-        return line
+    def no_line(line: str, line_number: int) -> str:
+        return line_protocol.no_line(line, line_number)
+
+    def _number_line(self, line: str) -> str:
+        """
+        Number line with next number of device line counter.
+        """
+        return self._protocol.number(line)
 
     def startup_procedure(self):
         self.send_and_await("G28")
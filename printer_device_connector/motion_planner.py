@@ -0,0 +1,259 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from printer_device_connector.gcode_parser import GCodeCommand, parse_line
+
+Position = Tuple[float, float, float]
+
+_AXES = ("X", "Y", "Z")
+
+
+class PrinterProfile:
+    """
+    **Motion limits of printer.**
+    Defaults are values sent by `PrusaDevice.startup_procedure`, they are updated by
+    M201 (max acceleration), M203 (max feedrate), M204 (acceleration) and M205 (jerk) commands.
+    All values are in mm/s and mm/s^2.
+    Work area is the lowest and highest machine coordinate of every axis, in mm, moves outside of it are rejected.
+    """
+
+    def __init__(
+            self,
+            max_feedrate: Optional[Dict[str, float]] = None,
+            max_acceleration: Optional[Dict[str, float]] = None,
+            jerk: Optional[Dict[str, float]] = None,
+            work_area: Optional[Dict[str, Tuple[float, float]]] = None,
+            print_acceleration: float = 1250,
+            travel_acceleration: float = 1250,
+            command_overhead: float = 0.2,
+    ) -> None:
+        self.max_feedrate: Dict[str, float] = {"X": 200, "Y": 200, "Z": 12, "E": 120}
+        self.max_acceleration: Dict[str, float] = {"X": 1000, "Y": 1000, "Z": 200, "E": 5000}
+        self.jerk: Dict[str, float] = {"X": 8, "Y": 8, "Z": 0.4, "E": 4.5}
+        self.work_area: Dict[str, Tuple[float, float]] = {"X": (0, 220), "Y": (0, 220), "Z": (0, 200)}
+
+        self.max_feedrate.update(max_feedrate or {})
+        self.max_acceleration.update(max_acceleration or {})
+        self.jerk.update(jerk or {})
+        self.work_area.update(work_area or {})
+
+        self.print_acceleration = print_acceleration
+        self.travel_acceleration = travel_acceleration
+        # time of sending command and receiving acknowledgement, in seconds
+        self.command_overhead = command_overhead
+
+    def apply_command(self, command: Union[str, GCodeCommand]) -> bool:
+        """
+        **Update limits from motion settings command.**
+
+        Parameters
+        ----------
+        **command : Union[str, GCodeCommand]**
+            Any G-code command, only M201, M203, M204 and M205 change profile
+
+        Returns
+        -------
+        **bool**
+            True if profile was changed
+        """
+        if isinstance(command, str):
+            command = parse_line(command)
+
+        limits = {"M201": self.max_acceleration, "M203": self.max_feedrate, "M205": self.jerk}.get(command.code)
+
+        if limits is not None:
+            for axis in limits:
+                if command.get(axis) is not None:
+                    limits[axis] = command.get(axis)
+            return True
+
+        if command.code == "M204":
+            if command.get("S") is not None:
+                self.print_acceleration = self.travel_acceleration = command.get("S")
+            if command.get("P") is not None:
+                self.print_acceleration = command.get("P")
+            if command.get("T") is not None:
+                self.travel_acceleration = command.get("T")
+            return True
+
+        return False
+
+
+class _Block:
+    __slots__ = ("distance", "direction", "nominal_speed", "acceleration", "max_entry_speed", "entry_speed")
+
+    def __init__(self, distance: float, direction: Position, nominal_speed: float, acceleration: float) -> None:
+        self.distance = distance
+        self.direction = direction
+        self.nominal_speed = nominal_speed
+        self.acceleration = acceleration
+        self.max_entry_speed = 0.0
+        self.entry_speed = 0.0
+
+
+def _axis_limit(limits: Dict[str, float], direction: Position, value: float) -> float:
+    # limit of move speed or acceleration, so no axis exceeds its own limit
+    for axis, component in zip(_AXES, direction):
+        if component != 0:
+            value = min(value, limits[axis] / abs(component))
+    return value
+
+
+def _block(profile: PrinterProfile, start: Position, end: Position, feedrate: float, extruding: bool) -> Optional[_Block]:
+    delta = [e - s for s, e in zip(start, end)]
+    distance = math.sqrt(sum(d * d for d in delta))
+    if distance == 0:
+        return None
+
+    direction = tuple(d / distance for d in delta)
+    acceleration = profile.print_acceleration if extruding else profile.travel_acceleration
+
+    return _Block(
+        distance=distance,
+        direction=direction,
+        nominal_speed=_axis_limit(profile.max_feedrate, direction, feedrate / 60),
+        acceleration=_axis_limit(profile.max_acceleration, direction, acceleration),
+    )
+
+
+def _standstill_speed(profile: PrinterProfile, block: _Block) -> float:
+    # speed that can be reached instantly from standstill (classic jerk)
+    return min(block.nominal_speed, _axis_limit(profile.jerk, block.direction, math.inf))
+
+
+def _junction_speed(profile: PrinterProfile, previous: _Block, block: _Block) -> float:
+    # highest speed at which velocity change between blocks stays within jerk of every axis
+    speed = min(previous.nominal_speed, block.nominal_speed)
+    for axis, a, b in zip(_AXES, previous.direction, block.direction):
+        change = abs(a - b)
+        if change > 0:
+            speed = min(speed, profile.jerk[axis] / change)
+    return speed
+
+
+def _trapezoid_time(block: _Block, entry_speed: float, exit_speed: float) -> float:
+    a = block.acceleration
+    v = block.nominal_speed
+
+    acceleration_distance = (v * v - entry_speed * entry_speed) / (2 * a)
+    deceleration_distance = (v * v - exit_speed * exit_speed) / (2 * a)
+
+    if acceleration_distance + deceleration_distance <= block.distance:
+        cruise_distance = block.distance - acceleration_distance - deceleration_distance
+        return (v - entry_speed) / a + (v - exit_speed) / a + cruise_distance / v
+
+    # nominal speed is never reached, triangular profile
+    peak_speed = math.sqrt((2 * a * block.distance + entry_speed ** 2 + exit_speed ** 2) / 2)
+    return (peak_speed - entry_speed) / a + (peak_speed - exit_speed) / a
+
+
+def plan_move_times(
+        profile: PrinterProfile,
+        start: Position,
+        targets: Sequence[Position],
+        feedrate: float,
+        extruding: bool = False,
+) -> List[float]:
+    """
+    **Durations of consecutive moves, as executed by look-ahead planner.**
+    Every move follows trapezoidal speed profile, limited by per-axis max feedrate and acceleration.
+    Speed at junctions between moves is limited by jerk of every axis, and is reachable within move length
+    (backward and forward pass, like Marlin planner). Path starts and ends at standstill.
+
+    Parameters
+    ----------
+    **profile : PrinterProfile**
+        Printer motion limits
+
+    **start : Position**
+        Starting position
+
+    **targets : Sequence[Position]**
+        Consecutive move destinations
+
+    **feedrate : float**
+        Requested feedrate, in mm/min
+
+    Returns
+    -------
+    **List[float]**
+        Duration of every move, in seconds (0 for moves that do not change position)
+    """
+    blocks: List[Optional[_Block]] = []
+    position = start
+    for target in targets:
+        blocks.append(_block(profile, position, target, feedrate, extruding))
+        position = target
+
+    moving = [block for block in blocks if block is not None]
+
+    previous = None
+    for block in moving:
+        if previous is None:
+            block.max_entry_speed = _standstill_speed(profile, block)
+        else:
+            block.max_entry_speed = _junction_speed(profile, previous, block)
+        previous = block
+
+    # backward pass: every block must be able to decelerate to entry speed of the next one
+    next_entry_speed = 0.0
+    for block in reversed(moving):
+        block.entry_speed = min(
+            block.max_entry_speed,
+            math.sqrt(next_entry_speed ** 2 + 2 * block.acceleration * block.distance),
+        )
+        next_entry_speed = block.entry_speed
+
+    # forward pass: every block must be able to accelerate to entry speed of the next one
+    for previous, block in zip(moving, moving[1:]):
+        block.entry_speed = min(
+            block.entry_speed,
+            math.sqrt(previous.entry_speed ** 2 + 2 * previous.acceleration * previous.distance),
+        )
+
+    times = {}
+    for index, block in enumerate(moving):
+        exit_speed = moving[index + 1].entry_speed if index + 1 < len(moving) else 0.0
+        times[id(block)] = _trapezoid_time(block, block.entry_speed, exit_speed)
+
+    return [0.0 if block is None else times[id(block)] for block in blocks]
+
+
+def estimate_move_time(profile: PrinterProfile, start: Position, end: Position, feedrate: float) -> float:
+    """
+    **Duration of single move, from standstill to standstill, in seconds.**
+
+    Parameters
+    ----------
+    **feedrate : float**
+        Requested feedrate, in mm/min
+    """
+    return plan_move_times(profile, start, [end], feedrate)[0]
+
+
+def estimate_path_time(
+        profile: PrinterProfile,
+        start: Position,
+        targets: Iterable[Position],
+        feedrate: float,
+        stop_at_every_point: bool = False,
+) -> float:
+    """
+    **Total duration of path, in seconds.**
+
+    Parameters
+    ----------
+    **stop_at_every_point : bool, optional**
+        Head stops at every target (like measurement scan), instead of moving continuously,
+        command overhead is added for every move. **By default False**
+    """
+    targets = list(targets)
+
+    if not stop_at_every_point:
+        return sum(plan_move_times(profile, start, targets, feedrate))
+
+    total = 0.0
+    for target in targets:
+        total += estimate_move_time(profile, start, target, feedrate) + profile.command_overhead
+        start = target
+    return total
@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import serial.tools.list_ports
+from serial import Serial
+from serial import SerialException
+
+# port, description, hardware id
+PortInfo = Tuple[str, str, str]
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".printer_device_connector_ports.json")
+
+# message printed by Marlin and Prusa firmware after reset
+_SUCCESSFUL_CONNECTION_MESSAGE = "start"
+
+
+def enumerate_ports() -> List[PortInfo]:
+    """
+    **All serial ports available in system, sorted by port name.**
+    """
+    return [(str(port), desc, hwid) for port, desc, hwid in sorted(serial.tools.list_ports.comports())]
+
+
+class PortCache:
+    """
+    **On-disk map of hardware id to port and baudrate, on which device was last found.**
+    Firmware capabilities of device are remembered next to them.
+    Cache is a small json file, unreadable or missing file is treated as empty cache.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Tuple[str, int]]:
+        return {
+            hwid: (entry["port"], int(entry["baudrate"]))
+            for hwid, entry in self._entries().items()
+            if "port" in entry and "baudrate" in entry
+        }
+
+    def store(self, hwid: str, port: str, baudrate: int) -> None:
+        self._update(hwid, port=port, baudrate=baudrate)
+
+    def load_capabilities(self, hwid: str) -> Optional[Dict]:
+        """
+        Capabilities (`FirmwareCapabilities.to_dict`) of device with hardware id `hwid`, None if not cached.
+        """
+        return self._entries().get(hwid, {}).get("capabilities")
+
+    def store_capabilities(self, hwid: str, capabilities: Dict) -> None:
+        self._update(hwid, capabilities=capabilities)
+
+    def _entries(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    def _update(self, hwid: str, **values) -> None:
+        with self._lock:
+            entries = self._entries()
+            entries.setdefault(hwid, {}).update(values)
+
+            try:
+                with open(self.path, "w") as file:
+                    json.dump(entries, file, indent=2)
+            except OSError:
+                # cache only speeds up discovery, device is found without it
+                pass
+
+
+def hardware_id(port: str) -> Optional[str]:
+    """
+    Hardware id of `port`, None if port is not listed by system (like pseudo-terminals).
+    """
+    for name, _, hwid in enumerate_ports():
+        if name == port:
+            return hwid
+    return None
+
+
+def probe_port(port: str, baudrates: Sequence[int], timeout: float = 1) -> Optional[Tuple[Serial, int]]:
+    """
+    **Open port with every baudrate in turn, until device greets with 'start' message.**
+    Port can be opened only once at a time, so baudrates of single port are never probed concurrently.
+
+    Returns
+    -------
+    **Optional[Tuple[Serial, int]]**
+        Open port and its baudrate, None if no device answered
+    """
+    for baudrate in baudrates:
+        try:
+            device = Serial(port=port, baudrate=baudrate, timeout=timeout)
+        except (SerialException, OSError, ValueError):
+            continue
+
+        try:
+            resp = device.readline().decode("utf-8", errors="replace").strip()
+        except (SerialException, OSError):
+            resp = ""
+
+        if resp == _SUCCESSFUL_CONNECTION_MESSAGE:
+            return device, baudrate
+
+        device.close()
+
+    return None
+
+
+def discover_port(
+        baudrates: Sequence[int],
+        timeout: float = 1,
+        ports: Optional[List[PortInfo]] = None,
+        cache: Optional[PortCache] = None,
+        max_workers: Optional[int] = None,
+) -> Tuple[Serial, PortInfo]:
+    """
+    **Find port on which printer device is connected.**
+    Baudrate remembered in cache for hardware id of any present port is tried first,
+    then all ports are probed concurrently on thread pool. First device that answers wins,
+    ports opened by other probes are closed.
+
+    Parameters
+    ----------
+    **baudrates : Sequence[int]**
+        Baudrates tried on every port, in order
+
+    **timeout : float, optional**
+        Time of waiting for 'start' message on every port and baudrate, **by default 1**
+
+    **ports : Optional[List[PortInfo]], optional**
+        Candidate ports, **by default all ports available in system**
+
+    **cache : Optional[PortCache], optional**
+        Cache of hardware id to port affinity, **by default None** (no cache)
+
+    Raises
+    ------
+    **SerialException**
+        No device found
+
+    Returns
+    -------
+    **Tuple[Serial, PortInfo]**
+        Open port, with 'start' message already read, and information of that port
+    """
+    ports = enumerate_ports() if ports is None else ports
+    if len(ports) == 0:
+        raise SerialException("Device not found, no serial ports available")
+
+    if cache is not None:
+        cached = cache.load()
+        for info in ports:
+            port, _, hwid = info
+            # port name may change between sessions, hardware id stays the same
+            if hwid in cached:
+                found = probe_port(port, [cached[hwid][1]], timeout)
+                if found is not None:
+                    print(f"Connected on cached port: '{port}', hwid: '{hwid}'")
+                    return found[0], info
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(ports), thread_name_prefix="probe_port")
+    futures: Dict[Future, PortInfo] = {
+        executor.submit(probe_port, info[0], baudrates, timeout): info for info in ports
+    }
+
+    winner: Optional[Future] = None
+    for future in as_completed(futures):
+        if future.result() is not None:
+            winner = future
+            break
+
+    for future in futures:
+        if future is not winner:
+            future.add_done_callback(_close_probed_port)
+    executor.shutdown(wait=False)
+
+    if winner is None:
+        raise SerialException("Device not found")
+
+    (device, baudrate), info = winner.result(), futures[winner]
+    print(f"Connected on port: '{info[0]}', desc: '{info[1]}', hwid: '{info[2]}'")
+
+    if cache is not None:
+        cache.store(info[2], info[0], baudrate)
+
+    return device, info
+
+
+def _close_probed_port(future: Future) -> None:
+    if future.result() is not None:
+        future.result()[0].close()
@@ -1,23 +1,43 @@
 import enum
+import re
 import time
+from collections import deque
 from serial import Serial
 from serial import SerialException
-from typing import Optional
-from printer_device_connector.device import Device
-import serial.tools.list_ports
-
-
-class PrusaDevice(Device):
-    _device: Serial = None  # pyserial connector device
-
+from typing import Deque, Dict, Iterable, List, Optional
+from printer_device_connector.firmware_capabilities import FirmwareCapabilities
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.line_protocol import Reply
+from printer_device_connector.port_discovery import PortCache, discover_port, enumerate_ports, hardware_id
+from printer_device_connector.serial_device import SerialDevice
+from printer_device_connector.supervisor import DeviceResetError, supervised_command, supervised_stream
+
+# 'echo:M113 S2', host keepalive interval in seconds
+_KEEPALIVE_REPORT = re.compile(r"M113\s+S\s*([\d.]+)")
+# longest silence before keepalive interval of firmware is known
+_DEFAULT_SILENCE_TIMEOUT = 10  # s
+# travel limits of MK3S firmware (X_MIN_POS .. X_MAX_POS etc.), purge line of sliced files starts at Y-3
+_MK3S_WORK_AREA = {"X": (0, 255), "Y": (-4, 212.5), "Z": (0, 210)}
+
+
+class PrusaDevice(SerialDevice):
     def __init__(self, device) -> None:
-        super().__init__()
-        self._device = device
+        super().__init__(device)
+        self.profile.work_area.update(_MK3S_WORK_AREA)
+        self.silence_timeout = _DEFAULT_SILENCE_TIMEOUT
+        # interval of 'busy: processing' messages, reported by M113 or measured between them
+        self.keepalive_interval: Optional[float] = None
+
+        # time from first busy message to 'ok'
+        self.last_busy_time: float = 0
+        self.busy_time: float = 0
+        self.busy_time_by_command: Dict[str, float] = {}
 
     # TODO READ on self
     def __del__(self) -> None:
         if self._device is None:
             return
+        self.stop_reader()
         commands = [
             # "G1 Z4 F720",  # Move print head up
             "G1 X0 Y200 F3600",  # park
@@ -36,13 +56,16 @@ class PrusaDevice(Device):
         self._device.close()
 
     @staticmethod
-    def connect_on_port(port: str, baudrate: int = 115200, timeout=2) -> "PrusaDevice":
+    def connect_on_port(
+            port: str, baudrate: int = 115200, timeout=2, cache: Optional[PortCache] = None
+    ) -> "PrusaDevice":
         """
-        Connect to Prusa device
+        Connect to Prusa device, transport is tuned to capabilities reported by firmware.
         Args:
             port (str): COM port on windows system, usually 9.
             baudrate (int, optional): baudrate. Defaults to 115200.
             timeout (int, optional): timeout. Defaults to 5.
+            cache (PortCache, optional): cache of firmware capabilities. Defaults to None (firmware is always probed).
 
         Returns:
             PrusaDevice: _description_
@@ -56,54 +79,33 @@ class PrusaDevice(Device):
             print(resp.strip())
             resp = device.readline().decode("utf-8")
 
-        return PrusaDevice(device)
+        printer = PrusaDevice(device)
+        printer.probe_capabilities(hardware_id(port), cache)
+        return printer
 
     @staticmethod
     def connect() -> "PrusaDevice":
-        baudrate: int = 115200
-        timeout: int = 1
-        device: Optional[Serial] = None
-        available_ports = serial.tools.list_ports.comports()
-
         print("List all available ports:")
-        for port, desc, hwid in sorted(available_ports):
+        for port, desc, hwid in enumerate_ports():
             print(f"\t port: '{port}', desc: '{desc}', hwid: '{hwid}")
 
-        for port, desc, hwid in sorted(available_ports):
-            print(f"Scanning port: '{port}', desc: '{desc}', hwid: '{hwid}")
-            try:
-                device: Serial = Serial(
-                    port=str(port), baudrate=baudrate, timeout=timeout
-                )
-                print(f"Serial port is Open'")
-
-                resp = device.readline().decode("utf-8")
-                print(f"Answer: '{resp}'")
-
-                if resp != "start":
-                    raise SerialException()
-
-                print(f"Connected on port: '{port}', desc: '{desc}', hwid: '{hwid}")
-
-                break
-
-            except SerialException:
-                device = None
-                continue
-
-        if not device:
-            raise SerialException("Device not found")
+        cache = PortCache()
+        device, (_, _, hwid) = discover_port(baudrates=[115200], timeout=1, cache=cache)
 
+        resp = device.readline().decode("utf-8")
         while resp != "":
             print(resp.strip())
             resp = device.readline().decode("utf-8")
 
-        return PrusaDevice(device=device)
+        printer = PrusaDevice(device=device)
+        printer.probe_capabilities(hwid, cache)
+        return printer
 
     class PrusaPrinterStatus(enum.Enum):
         PROCESSING = "processing"
         READY = "ready"
 
+    @supervised_command
     def send_and_await(self, command: str) -> str:
         """
         send command to Prusa device, then await response
@@ -114,37 +116,252 @@ class PrusaDevice(Device):
         Returns:
             str: response from device
         """
+        self._check_bounds(command)
+        command = self._protocol.prepare(command, self.speed)
 
-        if "F" not in command:
-            command += f" F {self.speed}"
+        parsed_command = parse_line(command)
+        predicted_time_of_execution = self.predict_time_of_execution(parsed_command)
 
-        if command[-1] != "\n":
-            command += "\n"
+        self.traffic_log.event("predicted time of execution: %.3fs", predicted_time_of_execution)
+        self._stopped.clear()
+        sent_at = time.monotonic()
+        self._write(bytes(command, "utf-8"))
+        if not self._synchronizes(parsed_command):
+            self._sleep_predicted(predicted_time_of_execution)
 
-        print(f"predicted_time_of_execution: {self.predict_time_of_execution(command)}")
-        self._device.write(bytearray(command, "utf-8"))
-        time.sleep(self.predict_time_of_execution(command))
+        if self._await_ok(code=parsed_command.code) is None:
+            return "none message"
 
-        if "G1" in command:
-            self.set_current_position_from_string(command)
+        if self._synchronizes(parsed_command):
+            self._await_motion(parsed_command, predicted_time_of_execution, sent_at)
 
-        elif "G28" in command:
-            self.current_position.from_tuple((0, 0, 0))
+        self._update_state(parsed_command)
+
+    @supervised_stream
+    def stream(self, commands: Iterable[str], window: Optional[int] = None) -> int:
+        """
+        **Stream commands using firmware acknowledgements as flow control.**
+        Prusa answers every command with 'ok' once it is queued, up to `window` commands are kept unacknowledged,
+        no time is spent sleeping on predicted execution times.
+
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            G-code commands, sent in order
+
+        **window : int, optional**
+            Maximum number of unacknowledged commands, **by default `stream_window`**
+            (command buffer size reported by firmware, or 1)
+
+        Raises
+        ------
+        **ValueError**
+            Move ends outside of work area, commands before it are still sent
+
+        **SerialException**
+            Device stopped answering before all commands were acknowledged
+
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        window = self.stream_window if window is None else window
+        if window < 1:
+            raise ValueError(f"Expected window of at least 1 line, got {window}")
+
+        in_flight = 0
+        sent = 0
+        try:
+            for command in commands:
+                self._check_bounds(command)
+                while in_flight >= window:
+                    self._await_stream_ok()
+                    in_flight -= 1
+
+                command = self._protocol.prepare(command, self.speed)
+                self._write(bytes(command, "utf-8"))
+                self._update_state(command)
+                in_flight += 1
+                sent += 1
+        except ValueError:
+            # commands written before rejected one are still acknowledged
+            while in_flight > 0:
+                self._await_stream_ok()
+                in_flight -= 1
+            raise
+
+        while in_flight > 0:
+            self._await_stream_ok()
+            in_flight -= 1
+
+        return sent
+
+    @supervised_stream
+    def send_batch(self, commands: Iterable[str], rx_buffer_size: Optional[int] = None) -> int:
+        """
+        **Stream commands, packing as many lines as fit in firmware RX buffer into single write.**
+        Grbl-style character counting: size of every unacknowledged line is tracked, and lines are written
+        only while all of them fit in RX buffer. Lines are written once budget is used up or `commands` run out.
+
+        Parameters
+        ----------
+        **commands : Iterable[str]**
+            G-code commands, sent in order
+
+        **rx_buffer_size : int, optional**
+            Byte budget of unacknowledged lines, **by default `rx_buffer_size`**
+
+        Raises
+        ------
+        **ValueError**
+            Single line does not fit in RX buffer, or move ends outside of work area
+
+        **SerialException**
+            Device stopped answering before all commands were acknowledged
+
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        rx_buffer_size = self.rx_buffer_size if rx_buffer_size is None else rx_buffer_size
+
+        # sizes of unacknowledged lines, oldest first
+        in_flight: Deque[int] = deque()
+        batch: List[bytes] = []
+        sent = 0
+
+        try:
+            for command in commands:
+                self._check_bounds(command)
+                command = self._protocol.prepare(command, self.speed)
+                line = bytes(command, "utf-8")
+                if len(line) > rx_buffer_size:
+                    raise ValueError(f"Line of {len(line)} bytes does not fit in RX buffer of {rx_buffer_size} bytes")
+
+                while sum(in_flight) + sum(len(queued) for queued in batch) + len(line) > rx_buffer_size:
+                    if len(batch) > 0:
+                        self._flush_batch(batch, in_flight)
+                    else:
+                        self._await_stream_ok()
+                        in_flight.popleft()
+                        while len(in_flight) > 0 and self._input_waiting():
+                            self._await_stream_ok()
+                            in_flight.popleft()
+
+                batch.append(line)
+                self._update_state(command)
+                sent += 1
+        except ValueError:
+            # lines queued before rejected one are sent and acknowledged, they already moved tracked state
+            if len(batch) > 0:
+                self._flush_batch(batch, in_flight)
+            while len(in_flight) > 0:
+                self._await_stream_ok()
+                in_flight.popleft()
+            raise
+
+        if len(batch) > 0:
+            self._flush_batch(batch, in_flight)
+
+        while len(in_flight) > 0:
+            self._await_stream_ok()
+            in_flight.popleft()
+
+        return sent
+
+    def _flush_batch(self, batch: List[bytes], in_flight: Deque[int]) -> None:
+        self._write(b"".join(batch))
+        in_flight.extend(len(line) for line in batch)
+        batch.clear()
+
+    def _await_stream_ok(self) -> None:
+        if self._await_ok(code="stream") is None:
+            raise SerialException("No acknowledgement received for streamed command")
+
+    def _send_sync_command(self, command: str) -> List[str]:
+        self._write(bytes(command + "\n", "utf-8"))
+
+        messages: List[str] = []
+        resp = self._await_ok(messages, code=command.split(" ")[0])
+        if resp is None:
+            raise SerialException(f"No acknowledgement received for: {command}")
+        messages.append(resp.strip())
+        return messages
+
+    def apply_capabilities(self, capabilities: FirmwareCapabilities) -> None:
+        super().apply_capabilities(capabilities)
+        self.keepalive_interval = capabilities.keepalive_interval
+
+    def _await_ok(self, messages: Optional[List[str]] = None, code: str = "") -> Optional[str]:
+        """
+        Read device output until 'ok', returns None if device stayed silent for `silence_timeout` (on top of read timeout).
+        Other messages are collected in `messages`.
+        Every line is handled as soon as it arrives, 'busy: processing' only proves device is alive,
+        intervals between busy messages (or reported by M113) adapt `silence_timeout`.
+        Time spent busy is added to statistics of command `code`.
+        """
+        busy_since: Optional[float] = None
+        last_busy: Optional[float] = None
+        silent_since: Optional[float] = None
 
-        resp = ""
-        retries = 5
-        r = 0
         # after every successfully completed command, prusa returns 'ok' message
-        while "ok" not in resp:
-            resp = str(self._device.readline().decode("utf-8"))
-            print(resp.strip())
-            if "busy" in resp:
-                print("awaiting 2s")
-                time.sleep(2)
-            else:
-                r += 1
-                if r > retries:
-                    return "none message"
+        while True:
+            resp = self._readline().decode("utf-8", errors="replace")
+            line = resp.strip()
+            now = time.monotonic()
+
+            if line == "":
+                if silent_since is None:
+                    silent_since = now
+                if now - silent_since >= self.silence_timeout:
+                    self._record_busy(code, busy_since)
+                    return None
+                continue
+            silent_since = None
+
+            reply, _ = self._protocol.receive(line)
+            if reply == Reply.SKIPPED:
+                # reply to real-time command
+                continue
+
+            if reply == Reply.ACKNOWLEDGEMENT:
+                self._record_busy(code, busy_since)
+                self.acknowledged_lines += 1
+                return resp
+
+            if reply == Reply.RESET:
+                raise DeviceResetError("Device was reset, 'start' received mid-session")
+
+            if "busy:" in line:
+                if last_busy is not None:
+                    self._set_keepalive_interval(now - last_busy)
+                if busy_since is None:
+                    busy_since = now
+                last_busy = now
+                continue
+
+            keepalive = _KEEPALIVE_REPORT.search(line)
+            if keepalive is not None:
+                self._set_keepalive_interval(float(keepalive.group(1)))
+
+            if messages is not None:
+                messages.append(line)
+
+    def _set_keepalive_interval(self, interval: float) -> None:
+        self.keepalive_interval = interval
+        # one keepalive may be lost or delayed by slow command
+        self.silence_timeout = 2 * interval
+
+    def _record_busy(self, code: str, busy_since: Optional[float]) -> None:
+        self.last_busy_time = 0 if busy_since is None else time.monotonic() - busy_since
+        if self.last_busy_time == 0:
+            return
+
+        self.busy_time += self.last_busy_time
+        self.busy_time_by_command[code] = self.busy_time_by_command.get(code, 0) + self.last_busy_time
+        self.traffic_log.event("%s: device busy for %.2fs", code or "command", self.last_busy_time)
 
     def startup_procedure(self) -> None:
         """
@@ -0,0 +1,134 @@
+import re
+from collections import deque
+from typing import Deque, List, Optional, Tuple, Union
+
+from serial import SerialException
+
+# 'Resend: 12' (Marlin, Prusa), 'rs 12' / 'rs N12' (Repetier)
+_RESEND_REQUEST = re.compile(r"^(?:resend|rs)\s*:?\s*N?:?\s*(\d+)", re.IGNORECASE)
+
+# errors reported for damaged lines, always followed by resend request
+_TRANSMISSION_ERRORS = ("checksum", "line number", "no line number")
+
+
+class ResendBuffer:
+    """
+    **Ring buffer of recently sent numbered lines.**
+    Keeps last `size` lines, so the ones requested by firmware with 'Resend: N' can be transmitted again.
+
+    After an error firmware discards every line that was already in flight and asks for the same line
+    again for each of them, those duplicated requests are skipped.
+    """
+
+    def __init__(self, size: int = 64) -> None:
+        self._lines: Deque[Tuple[int, Union[str, bytes]]] = deque(maxlen=size)
+        self._last_request: Optional[int] = None
+        self._duplicates_expected: int = 0
+
+        self.lines_sent: int = 0
+        self.lines_resent: int = 0
+        self.resend_requests: int = 0
+
+    @property
+    def resend_rate(self) -> float:
+        """
+        Fraction of transmitted lines that had to be sent again.
+        """
+        if self.lines_sent == 0:
+            return 0
+        return self.lines_resent / self.lines_sent
+
+    @property
+    def last_line_number(self) -> Optional[int]:
+        """
+        Number of the most recently stored line, None if there is none.
+        """
+        return self._lines[-1][0] if len(self._lines) > 0 else None
+
+    def store(self, line: Union[str, bytes]) -> int:
+        """
+        **Remember numbered line.**
+
+        Parameters
+        ----------
+        **line : Union[str, bytes]**
+            Line in 'N<number> ...' format
+
+        Returns
+        -------
+        **int**
+            Number of the stored line
+        """
+        line_number = ResendBuffer.line_number(line)
+        self._lines.append((line_number, line))
+        self.lines_sent += 1
+
+        return line_number
+
+    def clear(self) -> None:
+        """
+        Forget stored lines, when device line numbering is reset (M110).
+        """
+        self._lines.clear()
+        self._last_request = None
+        self._duplicates_expected = 0
+
+    def request(self, line_number: int) -> List[Union[str, bytes]]:
+        """
+        **Lines to retransmit after firmware asked for `line_number`.**
+
+        Raises
+        ------
+        **SerialException**
+            Requested line is no longer held in buffer
+
+        Returns
+        -------
+        **List[Union[str, bytes]]**
+            Requested line and every line sent after it, as they were stored, empty for duplicated request
+        """
+        self.resend_requests += 1
+
+        if line_number == self._last_request and self._duplicates_expected > 0:
+            self._duplicates_expected -= 1
+            return []
+
+        if len(self._lines) == 0 or self._lines[0][0] > line_number:
+            raise SerialException(
+                f"Line {line_number} requested by device is no longer in resend buffer"
+            )
+
+        lines = [line for number, line in self._lines if number >= line_number]
+
+        self._last_request = line_number
+        self._duplicates_expected = max(len(lines) - 1, 0)
+        self.lines_resent += len(lines)
+
+        return lines
+
+    @staticmethod
+    def line_number(line: Union[str, bytes]) -> int:
+        """
+        Number of line in 'N<number> ...' format, given as text or encoded.
+        """
+        return int(line.split(maxsplit=1)[0][1:])
+
+    @staticmethod
+    def parse_resend_request(response: str) -> Optional[int]:
+        """
+        Line number requested by 'Resend: N' or 'rs N' response, None for any other message.
+        """
+        match = _RESEND_REQUEST.match(response.strip())
+        if match is None:
+            return None
+        return int(match.group(1))
+
+    @staticmethod
+    def is_transmission_error(response: str) -> bool:
+        """
+        True for errors caused by corrupted line, like 'Error:checksum mismatch, Last Line: 3'.
+        """
+        response = response.strip().casefold()
+        return response.startswith("error") and any(
+            error in response for error in _TRANSMISSION_ERRORS
+        )
@@ -0,0 +1,447 @@
+import itertools
+import json
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from serial import SerialException
+
+from printer_device_connector.device import Device, MotionSync
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.traffic_log import Direction
+from printer_device_connector.trajectory import Point3D
+
+# every message is JSON object followed by ETX, like in Klipper API server
+MESSAGE_TERMINATOR = b"\x03"
+# Klipper started with '-a /tmp/klippy_uds'
+DEFAULT_SOCKET_PATH = "/tmp/klippy_uds"
+
+Status = Dict[str, Dict[str, Any]]
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    **Socket family and address of API server.**
+    'host:port' is TCP address, anything else is path of Unix socket.
+    """
+    host, separator, port = address.rpartition(":")
+    if separator != "" and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise SerialException(f"Unix sockets are not supported on this system, use 'host:port' instead of '{address}'")
+    return socket.AF_UNIX, address
+
+
+def open_socket(address: str, timeout: float) -> socket.socket:
+    family, socket_address = parse_address(address)
+    connection = socket.socket(family, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_address)
+    except OSError as ex:
+        connection.close()
+        raise SerialException(f"Could not connect to API server at '{address}': {ex}")
+
+    # replies are awaited by callers, receiver blocks until something arrives
+    connection.settimeout(None)
+    return connection
+
+
+class RpcError(SerialException):
+    """
+    API server answered request with error, like 'Must home axis first' for move of not homed printer.
+    """
+
+    def __init__(self, method: str, error: Dict[str, Any]) -> None:
+        self.method = method
+        self.name: str = error.get("error", "")
+        self.message: str = error.get("message", "")
+        super().__init__(f"{method}: {self.message or self.name}")
+
+
+class RpcDevice(Device):
+    """
+    **Printer driven through JSON-RPC API server (Klipper style), over Unix socket or TCP.**
+    Instead of single lines with acknowledgements, whole multi-line G-code scripts are submitted in one request
+    (`run_script`, `send_batch`), so row of scan costs one round trip instead of one per point.
+    Position and status are pushed by server to subscribers (`subscribe`, `subscribe_output`),
+    and latest values of subscribed objects are kept in `status`.
+
+    Messages are received by background thread, subscription callbacks are called from it,
+    so they must not wait for other requests of the same device.
+
+    Parameters
+    ----------
+    **connection : socket.socket**
+        Connected socket of API server
+
+    **timeout : float, optional**
+        Await for response to requests other than G-code scripts, in seconds, **by default 5**
+    """
+
+    def __init__(self, connection: socket.socket, timeout: float = 5) -> None:
+        super().__init__()
+        self._socket = connection
+        self.timeout = timeout
+        # server reports when queued moves are done (M400), no need to sleep on predictions
+        self.motion_sync = MotionSync.M400
+        # lines of single script sent by `stream`
+        self.max_script_lines: int = 64
+
+        # reply of 'info' request
+        self.info: Dict[str, Any] = {}
+        # latest values of subscribed objects, like {'toolhead': {'position': [x, y, z, e]}}
+        self.status: Status = {}
+        self.scripts_sent: int = 0
+
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[str, Future]] = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._error: Optional[Exception] = None
+
+        # server keeps one subscription per connection, every call of `subscribe` extends it
+        self._subscribed_objects: Dict[str, Optional[List[str]]] = {}
+        self._status_callbacks: List[Callable[[float, Status], None]] = []
+        self._output_callbacks: List[Callable[[str], None]] = []
+
+        self._receiver = threading.Thread(target=self._receive, name="RpcDevice.receive", daemon=True)
+        self._receiver.start()
+
+    def __del__(self) -> None:
+        if getattr(self, "_receiver", None) is not None:
+            self.close()
+
+    @staticmethod
+    def connect_on_port(port: str, baudrate: int = 0, timeout: float = 5) -> "RpcDevice":
+        """
+        **Connects to API server.**
+
+        Parameters
+        ----------
+        **port : str**
+            Path of Unix socket, or 'host:port' of TCP server
+
+        **baudrate : int, optional**
+            Not used, there is no serial link, **by default 0**
+
+        **timeout : float, optional**
+            Await for response time in seconds, **by default 5**
+
+        Raises
+        ------
+        **SerialException**
+            Server is not reachable, or printer is not ready
+
+        Returns
+        -------
+        **RpcDevice**
+            Connected device
+        """
+        printer = RpcDevice(open_socket(port, timeout), timeout)
+        printer.info = printer.call("info", {"client_info": {"program": "printer-connector"}})
+
+        if printer.info.get("state") != "ready":
+            state = printer.info.get("state_message") or printer.info.get("state")
+            printer.close()
+            raise SerialException(f"Printer behind '{port}' is not ready: {state}")
+
+        return printer
+
+    @staticmethod
+    def connect() -> "RpcDevice":
+        return RpcDevice.connect_on_port(DEFAULT_SOCKET_PATH)
+
+    def close(self) -> None:
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+        if self._receiver is not threading.current_thread():
+            self._receiver.join(timeout=1)
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        **Send request and await its result.**
+
+        Parameters
+        ----------
+        **method : str**
+            Endpoint of API server, like 'objects/query'
+
+        **params : Dict[str, Any], optional**
+            Parameters of request, **by default None**
+
+        Raises
+        ------
+        **RpcError**
+            Server answered with error
+
+        **SerialException**
+            Connection was lost, or no response arrived within `timeout`
+
+        Returns
+        -------
+        **Any**
+            Result of request
+        """
+        return self._request(method, params, self.timeout)
+
+    def run_script(self, commands: Union[str, Iterable[str]]) -> int:
+        """
+        **Execute multi-line G-code script in single request.**
+        Server returns once all commands are processed, moves are queued by then, not completed
+        (end script with M400 to wait for them). First failing command aborts the rest of script.
+
+        Parameters
+        ----------
+        **commands : Union[str, Iterable[str]]**
+            Script, or its commands in order
+
+        Raises
+        ------
+        **RpcError**
+            Command of script failed
+
+        **ValueError**
+            Move of script ends outside of work area, nothing is sent
+
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        if isinstance(commands, str):
+            commands = commands.splitlines()
+
+        lines = [self._prepare_command(command) for command in commands if command.strip() != ""]
+        if len(lines) == 0:
+            return 0
+
+        self._check_path_bounds(lines)
+
+        # scripts with long moves or heating take as long as they take
+        self._request("gcode/script", {"script": "\n".join(lines)}, timeout=None)
+        self.scripts_sent += 1
+
+        for line in lines:
+            self._update_state(line)
+        return len(lines)
+
+    def send_and_await(self, command: str) -> str:
+        """
+        send command to API server, then await its completion
+
+        Args:
+            command (str): g-code command
+
+        Returns:
+            str: response from device
+        """
+        parsed_command = parse_line(self._prepare_command(command))
+        predicted_time_of_execution = self.predict_time_of_execution(parsed_command)
+        self.traffic_log.event("predicted time of execution: %.3fs", predicted_time_of_execution)
+
+        synchronizes = self.motion_sync != MotionSync.PREDICTED and (
+                parsed_command.is_move or parsed_command.is_arc or parsed_command.code == "G28"
+        )
+
+        sent_at = time.monotonic()
+        self.run_script([command, "M400"] if synchronizes else [command])
+
+        if synchronizes:
+            self.last_time_saved = predicted_time_of_execution - (time.monotonic() - sent_at)
+            self.time_saved += self.last_time_saved
+        else:
+            time.sleep(predicted_time_of_execution)
+
+        return "ok"
+
+    def stream(self, commands: Iterable[str], window: Optional[int] = None) -> int:
+        """
+        **Send commands as consecutive scripts of up to `max_script_lines` lines.**
+        Server executes one script at a time, so `window` is not used.
+
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        commands = iter(commands)
+        sent = 0
+        while True:
+            script = list(itertools.islice(commands, self.max_script_lines))
+            if len(script) == 0:
+                return sent
+            sent += self.run_script(script)
+
+    def send_batch(self, commands: Iterable[str]) -> int:
+        """
+        **Send all commands as single script**, like whole row of serpentine scan (see `Trajectory.rows`).
+
+        Returns
+        -------
+        **int**
+            Number of sent commands
+        """
+        return self.run_script(commands)
+
+    def subscribe(
+            self, objects: Dict[str, Optional[List[str]]], callback: Optional[Callable[[float, Status], None]] = None
+    ) -> Status:
+        """
+        **Receive changes of printer objects as they happen.**
+        Every change is merged into `status`, and passed to `callback` with server event time.
+
+        Parameters
+        ----------
+        **objects : Dict[str, Optional[List[str]]]**
+            Objects and their fields, None for all fields,
+            like {'motion_report': ['live_position'], 'idle_timeout': ['state']}
+
+        **callback : Callable[[float, Status], None], optional**
+            Called with event time and changed fields, **by default None**
+
+        Returns
+        -------
+        **Status**
+            Current values of subscribed fields
+        """
+        for name, fields in objects.items():
+            known = self._subscribed_objects.get(name, [])
+            if fields is None or (name in self._subscribed_objects and known is None):
+                self._subscribed_objects[name] = None
+            else:
+                self._subscribed_objects[name] = list(dict.fromkeys(known + fields))
+        if callback is not None:
+            self._status_callbacks.append(callback)
+
+        result = self.call(
+            "objects/subscribe", {"objects": self._subscribed_objects, "response_template": {"key": "status"}}
+        )
+        self._merge_status(result.get("status", {}))
+        return result.get("status", {})
+
+    def subscribe_output(self, callback: Callable[[str], None]) -> None:
+        """
+        Receive every line printed by G-code commands (M114 reports, errors, 'echo:' messages).
+        """
+        if len(self._output_callbacks) == 0:
+            self.call("gcode/subscribe_output", {"response_template": {"key": "output"}})
+        self._output_callbacks.append(callback)
+
+    def query(self, objects: Dict[str, Optional[List[str]]]) -> Status:
+        """
+        Current values of fields of printer `objects`, None selects all fields.
+        """
+        return self.call("objects/query", {"objects": objects}).get("status", {})
+
+    def query_position(self) -> Optional[Tuple[float, float, float]]:
+        """
+        **Position of the head at this moment**, not where queued moves end.
+        """
+        live_position = self.query({"motion_report": ["live_position"]}).get("motion_report", {}).get("live_position")
+        return None if live_position is None else tuple(live_position[:3])
+
+    def emergency_stop(self) -> None:
+        """
+        **Stop motion and heaters immediately**, server handles request ahead of queued scripts.
+        Position is unknown afterwards.
+        """
+        self.call("emergency_stop")
+        self.state = MachineState(Point3D(None, None, None))
+
+    def startup_procedure(self) -> None:
+        self.run_script(["G90", "G28"])
+
+    def _prepare_command(self, command: str) -> str:
+        command = command.strip()
+        parsed_command = parse_line(command)
+        if (parsed_command.is_move or parsed_command.is_arc) and parsed_command.feedrate is None:
+            command += f" F{self.speed}"
+        return command
+
+    def _request(self, method: str, params: Optional[Dict[str, Any]], timeout: Optional[float]) -> Any:
+        future: Future = Future()
+        with self._pending_lock:
+            if self._error is not None:
+                raise SerialException(f"Connection to API server lost: {self._error}")
+            request_id = next(self._ids)
+            self._pending[request_id] = (method, future)
+
+        message = json.dumps({"id": request_id, "method": method, "params": params or {}}).encode("utf-8")
+        try:
+            with self._write_lock:
+                self.traffic_log.record(Direction.SENT, message)
+                self._socket.sendall(message + MESSAGE_TERMINATOR)
+        except OSError as ex:
+            self._fail(ex)
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise SerialException(f"No response to '{method}' received within {timeout}s")
+
+    def _receive(self) -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                data = self._socket.recv(4096)
+                if len(data) == 0:
+                    raise SerialException("Connection closed by API server")
+                buffer += data
+
+                while MESSAGE_TERMINATOR in buffer:
+                    message, _, rest = bytes(buffer).partition(MESSAGE_TERMINATOR)
+                    buffer = bytearray(rest)
+                    self.traffic_log.record(Direction.RECEIVED, message)
+                    self._dispatch(json.loads(message))
+        except (OSError, ValueError, SerialException) as ex:
+            self._fail(ex)
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        if "id" in message:
+            with self._pending_lock:
+                method, future = self._pending.pop(message["id"], (None, None))
+            if future is None:
+                return
+            if "error" in message:
+                future.set_exception(RpcError(method, message["error"]))
+            else:
+                future.set_result(message.get("result"))
+            return
+
+        # notifications carry `response_template` of subscription
+        params = message.get("params", {})
+        if message.get("key") == "status":
+            status = params.get("status", {})
+            self._merge_status(status)
+            for callback in self._status_callbacks:
+                callback(params.get("eventtime", 0), status)
+
+        elif message.get("key") == "output":
+            for callback in self._output_callbacks:
+                callback(params.get("response", ""))
+
+    def _merge_status(self, status: Status) -> None:
+        for name, fields in status.items():
+            self.status.setdefault(name, {}).update(fields)
+
+    def _fail(self, error: Exception) -> None:
+        with self._pending_lock:
+            if self._error is None:
+                self._error = error
+            pending = list(self._pending.values())
+            self._pending.clear()
+
+        for method, future in pending:
+            future.set_exception(SerialException(f"Connection to API server lost during '{method}': {error}"))
@@ -0,0 +1,398 @@
+import re
+import threading
+import time
+from abc import abstractmethod
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from serial import Serial
+from serial import SerialException
+
+from printer_device_connector.device import Device, MotionSync
+from printer_device_connector.firmware_capabilities import FirmwareCapabilities
+from printer_device_connector.gcode_parser import GCodeCommand, parse_line
+from printer_device_connector.line_protocol import LineProtocol
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.port_discovery import PortCache
+from printer_device_connector.serial_reader import ResponseType, SerialReader
+from printer_device_connector.supervisor import ConnectionSupervisor
+from printer_device_connector.traffic_log import Direction
+from printer_device_connector.trajectory import Point3D
+
+# 'X:10.00 Y:20.00 Z:5.00 E:0.00 Count X:800 Y:1600 Z:2000' (M114), logical position in mm, before steps 'Count'
+_POSITION = re.compile(r"^X:\s*(-?[\d.]+)\s*Y:\s*(-?[\d.]+)\s*Z:\s*(-?[\d.]+)")
+
+_DEFAULT_KEEPALIVE_INTERVAL = 2  # s, Marlin DEFAULT_KEEPALIVE_INTERVAL
+# without keepalive firmware stays silent while it heats or homes, this is the longest wait for acknowledgement
+_LONG_SILENCE = 600  # s
+
+# commands executed on receipt by firmware with emergency parser: continue (M108), kill (M112),
+# quickstop (M410), prompt response (M876)
+REALTIME_COMMANDS = ("M108", "M112", "M410", "M876")
+# real-time commands that drop planned moves, position is unknown after them
+_STOPPING_COMMANDS = ("M112", "M410")
+
+
+class SerialDevice(Device):
+    """
+    **Base class for printer devices connected through serial port.**
+    Responses are read directly from port, or, once `start_reader` is called,
+    from background reader thread that separates replies from asynchronous messages.
+    """
+
+    _device: Serial  # pyserial connector device
+    _STREAM_WINDOW = 1  # number of unacknowledged commands, when firmware does not report its buffer size
+    _NUMBERED_LINES = False  # lines are numbered and check summed, firmware may request them again
+
+    def __init__(self, device: Serial) -> None:
+        super().__init__()
+        self._device = device
+        self._reader: Optional[SerialReader] = None
+
+        self.position_tolerance: float = 0.01  # mm, for MotionSync.M114
+        self.position_poll_interval: float = 0.05  # s, for MotionSync.M114
+        # time on top of predicted time of execution, after which head that did not reach target is lost
+        self.motion_timeout_margin: float = 5  # s, for MotionSync.M114
+
+        # transport settings, tuned by `apply_capabilities`
+        self.capabilities: Optional[FirmwareCapabilities] = None
+        self.stream_window: int = self._STREAM_WINDOW
+        # time without any message, on top of read timeout, after which in-flight line is considered lost
+        self.silence_timeout: float = 0
+        # byte budget of unacknowledged lines in `send_batch`, Marlin and Prusa RX_BUFFER_SIZE
+        self.rx_buffer_size: int = 128
+        # number of writes to port, one per line unless lines are batched
+        self.write_calls: int = 0
+
+        # priority lane: real-time commands are written between regular lines, never behind them
+        self._write_lock = threading.Lock()
+        # cleared by `pause`, regular writes wait for it
+        self._feeding = threading.Event()
+        self._feeding.set()
+        # set by stopping real-time command, ends sleep on predicted time of execution
+        self._stopped = threading.Event()
+        # line numbering, resend buffer and 'ok' replies that do not acknowledge any regular line
+        # (replies to real-time commands), shared with asyncio devices
+        self._protocol = LineProtocol(numbered=self._NUMBERED_LINES)
+        # time from real-time command request to its write, in seconds
+        self.realtime_latencies: Deque[float] = deque(maxlen=100)
+
+        # reconnects after lost connection or board reset, set by `supervise`
+        self.supervisor: Optional[ConnectionSupervisor] = None
+        # number of acknowledged streamed lines, tells supervisor which lines may be lost
+        self.acknowledged_lines: int = 0
+
+    @property
+    def reader(self) -> Optional[SerialReader]:
+        return self._reader
+
+    def start_reader(self) -> SerialReader:
+        """
+        **Start background reader thread.**
+        From now on every received line is kept in reader queues, and temperature and position reports
+        (also sent on their own by firmware) are no longer returned to senders.
+
+        Returns
+        -------
+        **SerialReader**
+            Running reader
+        """
+        if self._reader is None:
+            self._reader = SerialReader(self._device, traffic_log=self.traffic_log)
+            self._reader.start()
+
+        return self._reader
+
+    def stop_reader(self) -> None:
+        if self._reader is None:
+            return
+
+        self._reader.stop(timeout=self._device.timeout)
+        self._reader = None
+
+    def supervise(self, **kwargs) -> ConnectionSupervisor:
+        """
+        **Keep session alive over lost connection and board resets.**
+        From now on `stream`, `send_batch` and `send_and_await` reconnect to the same port and resume
+        when connection fails, keyword arguments are passed to `ConnectionSupervisor`.
+
+        Returns
+        -------
+        **ConnectionSupervisor**
+            Supervisor of device, with reconnect statistics
+        """
+        self.supervisor = ConnectionSupervisor(
+            self._device.port, self._device.baudrate, self._device.timeout, **kwargs
+        )
+        return self.supervisor
+
+    def replace_port(self, device: Serial, reset: bool) -> None:
+        """
+        Continue session on reopened port, after board `reset` position is unknown.
+        """
+        restart_reader = self._reader is not None
+        try:
+            self.stop_reader()
+        except (OSError, SerialException):
+            self._reader = None
+        try:
+            self._device.close()
+        except (OSError, SerialException):
+            pass
+
+        self._device = device
+        self._protocol.skip_acknowledgements = 0
+        if reset:
+            self.state = MachineState(Point3D(None, None, None))
+
+        if restart_reader:
+            self.start_reader()
+
+    def _readline(self) -> bytes:
+        if self._reader is None:
+            line = self._device.readline()
+            self.traffic_log.record(Direction.RECEIVED, line)
+            return line
+
+        # reader records every line it receives
+        return self._reader.readline()
+
+    def _input_waiting(self) -> bool:
+        """
+        Device output is waiting to be read, reading it will not block.
+        """
+        if self._reader is not None:
+            return False
+        try:
+            return self._device.in_waiting > 0
+        except (OSError, SerialException):
+            return False
+
+    def _write(self, data: bytes) -> None:
+        self._feeding.wait()
+        with self._write_lock:
+            self.traffic_log.record(Direction.SENT, data)
+            self._device.write(data)
+            self.write_calls += 1
+
+    def send_realtime(self, command: str) -> float:
+        """
+        **Write real-time command straight to port.**
+        Command skips everything regular commands go through: it's not numbered, not queued behind lines
+        awaiting acknowledgement, and does not wait for `pause` or predicted time of move being executed.
+        Sleep of `send_and_await` on predicted time is ended by stopping commands (M112, M410),
+        and position is unknown after them.
+        Firmware with emergency parser executes command on receipt, otherwise it's executed once
+        commands buffered before it are done.
+        Safe to call from any thread.
+
+        Parameters
+        ----------
+        **command : str**
+            One of `REALTIME_COMMANDS`, like 'M410'
+
+        Raises
+        ------
+        **ValueError**
+            Command is not a real-time command
+
+        Returns
+        -------
+        **float**
+            Time from request to write, in seconds, kept in `realtime_latencies` as well
+        """
+        requested_at = time.monotonic()
+        code = parse_line(command).code
+        if code not in REALTIME_COMMANDS:
+            raise ValueError(f"Expected one of real-time commands {REALTIME_COMMANDS}, got: '{command}'")
+
+        if code in _STOPPING_COMMANDS:
+            self._stopped.set()
+
+        data = bytes(command.strip() + "\n", "ascii")
+        with self._write_lock:
+            self._device.write(data)
+            latency = time.monotonic() - requested_at
+            # killed firmware does not answer anymore
+            if code != "M112":
+                self._protocol.skip_acknowledgements += 1
+
+        self.traffic_log.record(Direction.SENT, data)
+        self.traffic_log.event("real-time %s written in %.3fms", code, latency * 1000)
+        self.realtime_latencies.append(latency)
+
+        if code in _STOPPING_COMMANDS:
+            self.state.position = Point3D(None, None, None)
+
+        return latency
+
+    def pause(self) -> None:
+        """
+        **Stop feeding commands to firmware, from any thread.**
+        Senders block before writing next line, moves already buffered in firmware are completed.
+        Use `send_realtime('M410')` to drop them as well.
+        """
+        self._feeding.clear()
+        self.traffic_log.event("feeding paused")
+
+    def resume(self) -> None:
+        self._feeding.set()
+        self.traffic_log.event("feeding resumed")
+
+    @property
+    def paused(self) -> bool:
+        return not self._feeding.is_set()
+
+    def _sleep_predicted(self, predicted_time: float) -> None:
+        """
+        Sleep for predicted time of command execution, stopping real-time command ends it early.
+        """
+        if self._stopped.wait(predicted_time):
+            self.traffic_log.event("predicted time of execution interrupted by real-time command")
+
+    @abstractmethod
+    def _send_sync_command(self, command: str) -> List[str]:
+        """
+        Send command bypassing time prediction, await its acknowledgement.
+        Returns messages received before acknowledgement, followed by acknowledgement itself.
+        """
+        pass
+
+    def probe_capabilities(
+            self, hwid: Optional[str] = None, cache: Optional[PortCache] = None, refresh: bool = False
+    ) -> FirmwareCapabilities:
+        """
+        **Ask firmware what it supports (M115, M113) and tune transport to it.**
+        Result is cached for hardware id of device, so next connection skips the probe.
+
+        Parameters
+        ----------
+        **hwid : str, optional**
+            Hardware id of port, **by default None** (result is not cached)
+
+        **cache : PortCache, optional**
+            Cache of device capabilities, **by default None**
+
+        **refresh : bool, optional**
+            Probe even if capabilities are cached (after firmware update), **by default False**
+
+        Returns
+        -------
+        **FirmwareCapabilities**
+            Applied capabilities
+        """
+        cached = None
+        if hwid is not None and cache is not None and not refresh:
+            cached = cache.load_capabilities(hwid)
+
+        if cached is not None:
+            capabilities = FirmwareCapabilities.from_dict(cached)
+        else:
+            messages = self._send_sync_command("M115")
+            if FirmwareCapabilities.parse(messages).host_keepalive:
+                # M113 without arguments reports keepalive interval
+                messages += self._send_sync_command("M113")
+            capabilities = FirmwareCapabilities.parse(messages)
+
+            if hwid is not None and cache is not None:
+                cache.store_capabilities(hwid, capabilities.to_dict())
+
+        self.apply_capabilities(capabilities)
+        return capabilities
+
+    def apply_capabilities(self, capabilities: FirmwareCapabilities) -> None:
+        """
+        **Choose transport settings supported by firmware.**
+            - streaming window: command buffer size reported with ADVANCED_OK, otherwise connector default,
+            - silence: with host keepalive, device that is quiet for two keepalive intervals is lost,
+              without it, firmware may be quiet for as long as it heats or homes,
+            - emergency stop: see `emergency_stop`.
+        """
+        self.capabilities = capabilities
+        self.stream_window = capabilities.stream_window(self._STREAM_WINDOW)
+
+        if capabilities.host_keepalive:
+            self.silence_timeout = 2 * (capabilities.keepalive_interval or _DEFAULT_KEEPALIVE_INTERVAL)
+        else:
+            self.silence_timeout = _LONG_SILENCE
+
+        self.traffic_log.event(
+            "%r, stream window: %d, silence timeout: %.1fs", capabilities, self.stream_window, self.silence_timeout
+        )
+
+    def emergency_stop(self) -> None:
+        """
+        **Stop motion and heaters immediately.**
+        Firmware with emergency parser executes M112 as soon as it arrives, so it's written ahead of everything queued.
+        Otherwise M112 would wait until buffered commands are executed, so board is reset instead,
+        by toggling DTR (auto-reset of Arduino based boards). Either way position is unknown afterwards.
+        """
+        if self.capabilities is not None and self.capabilities.emergency_parser:
+            self.send_realtime("M112")
+        else:
+            self.traffic_log.event("emergency stop, firmware has no emergency parser: resetting board")
+            self._device.dtr = False
+            time.sleep(0.1)
+            self._device.dtr = True
+
+        self.state = MachineState(Point3D(None, None, None))
+
+    def _synchronizes(self, command: GCodeCommand) -> bool:
+        return self.motion_sync != MotionSync.PREDICTED and (command.is_move or command.is_arc or command.code == "G28")
+
+    def _await_motion(self, command: GCodeCommand, predicted_time: float, sent_at: float) -> None:
+        """
+        Block until acknowledged move `command` is completed by firmware, according to `motion_sync`.
+        Must be called before position is updated with `command`.
+        """
+        if self.motion_sync == MotionSync.M400:
+            self._send_sync_command("M400")
+
+        elif self.motion_sync == MotionSync.M114:
+            if command.code == "G28":
+                target = (0, 0, 0)
+            else:
+                target = self.state.target(command)
+
+            deadline = sent_at + predicted_time + self.motion_timeout_margin
+            while not self._reached(target):
+                if time.monotonic() >= deadline:
+                    raise SerialException(f"Head did not reach {target} within {deadline - sent_at:.1f}s")
+                time.sleep(self.position_poll_interval)
+
+        self.last_time_saved = predicted_time - (time.monotonic() - sent_at)
+        self.time_saved += self.last_time_saved
+        self.traffic_log.event("motion completed, time saved: %.2fs", self.last_time_saved)
+
+    def _reached(self, target: Tuple[Optional[float], ...]) -> bool:
+        position = self.query_position()
+        if position is None:
+            raise SerialException("Device did not report its position")
+
+        return all(
+            expected is None or abs(expected - actual) <= self.position_tolerance
+            for expected, actual in zip(target, position)
+        )
+
+    def query_position(self) -> Optional[Tuple[float, float, float]]:
+        """
+        **Read position of steppers from device (M114).**
+        Logical position in mm is taken, 'Count' part of report is in steps. Marlin waits for planned moves
+        before it answers M114, so reported position is where the head is.
+
+        Returns
+        -------
+        **Optional[Tuple[float, float, float]]**
+            Position reported by device, None if device sent no report
+        """
+        messages = self._send_sync_command("M114")
+        if self._reader is not None:
+            # reports are kept by reader, the last one answers M114 that was just acknowledged
+            messages = list(self._reader.queues[ResponseType.POSITION])[-1:]
+
+        for message in reversed(messages):
+            position = _POSITION.match(message.strip())
+            if position is not None:
+                return tuple(float(value) for value in position.groups())
+
+        return None
@@ -0,0 +1,193 @@
+import enum
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from typing import Deque, Dict, Optional
+
+from serial import Serial
+from serial import SerialException
+
+from printer_device_connector.resend_buffer import ResendBuffer
+from printer_device_connector.traffic_log import Direction, LogLevel, TrafficLog
+
+# 'T:210.00 /210.00 B:60.00 /60.00 @:0 B@:0' (M105 or auto report)
+_TEMPERATURE_REPORT = re.compile(r"^(?:ok\s+)?T\d?:\s*-?\d")
+
+# 'X:10.00 Y:20.00 Z:5.00 E:0.00 Count X:800 Y:1600 Z:2000' (M114)
+_POSITION_REPORT = re.compile(r"^X:\s*-?\d")
+
+
+class ResponseType(enum.Enum):
+    ACK = "ack"
+    ERROR = "error"
+    RESEND = "resend"
+    BUSY = "busy"
+    TEMPERATURE = "temperature"
+    POSITION = "position"
+    ECHO = "echo"
+    START = "start"
+    OTHER = "other"
+
+
+# responses handed to senders in order of arrival, as they would read them from port: replies to sent commands,
+# messages printed before reply (echo, capabilities), busy keepalive of command still being processed,
+# and 'start' banner of reset board, after which no command sent before will be answered.
+# Temperature and position reports, which firmware also sends on its own (auto report), are kept in queues only.
+REPLY_TYPES = (
+    ResponseType.ACK,
+    ResponseType.ERROR,
+    ResponseType.RESEND,
+    ResponseType.BUSY,
+    ResponseType.START,
+    ResponseType.ECHO,
+    ResponseType.OTHER,
+)
+
+
+def classify_response(response: str) -> ResponseType:
+    """
+    **Assign type to single line received from printer device.**
+
+    Parameters
+    ----------
+    **response : str**
+        Line received from device
+
+    Returns
+    -------
+    **ResponseType**
+        Type of response
+    """
+    response = response.strip()
+
+    if response.startswith("ok"):
+        return ResponseType.ACK
+
+    if ResendBuffer.parse_resend_request(response) is not None:
+        return ResponseType.RESEND
+
+    if response.casefold().startswith("error"):
+        return ResponseType.ERROR
+
+    if "busy:" in response:
+        return ResponseType.BUSY
+
+    if response == "start":
+        return ResponseType.START
+
+    if _TEMPERATURE_REPORT.match(response) is not None:
+        return ResponseType.TEMPERATURE
+
+    if _POSITION_REPORT.match(response) is not None:
+        return ResponseType.POSITION
+
+    if response.startswith("echo:"):
+        return ResponseType.ECHO
+
+    return ResponseType.OTHER
+
+
+class SerialReader(threading.Thread):
+    """
+    **Background reader of serial port.**
+    Every received line is classified and stored in queue of its type, lines other than temperature
+    and position reports (`REPLY_TYPES`) are additionally handed out to senders, one per `next_reply` future,
+    in order in which they arrived.
+    """
+
+    def __init__(self, device: Serial, history: int = 256, traffic_log: Optional[TrafficLog] = None) -> None:
+        super().__init__(name=f"SerialReader({device.port})", daemon=True)
+        self._device = device
+        self._traffic_log = TrafficLog(LogLevel.SILENT) if traffic_log is None else traffic_log
+        self._running = threading.Event()
+        self._lock = threading.Lock()
+
+        self._pending: Deque[Future] = deque()
+        self._replies: Deque[bytes] = deque()
+        self._error: Optional[Exception] = None
+
+        self.queues: Dict[ResponseType, Deque[str]] = {
+            response_type: deque(maxlen=history) for response_type in ResponseType
+        }
+
+    def start(self) -> None:
+        self._running.set()
+        super().start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._running.clear()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def next_reply(self) -> Future:
+        """
+        **Future of next reply, that was not yet claimed by other sender.**
+        Future is resolved with raw line received from device.
+        """
+        future = Future()
+
+        with self._lock:
+            if len(self._replies) > 0:
+                future.set_result(self._replies.popleft())
+            elif self._error is not None:
+                future.set_exception(self._error)
+            else:
+                self._pending.append(future)
+
+        return future
+
+    def readline(self) -> bytes:
+        """
+        Drop-in replacement of `Serial.readline` without temperature and position reports,
+        returns empty line after serial timeout.
+        """
+        future = self.next_reply()
+
+        try:
+            return future.result(timeout=self._device.timeout)
+        except TimeoutError:
+            if future.cancel():
+                return bytes()
+            # reply arrived just after timeout
+            return future.result()
+
+    def run(self) -> None:
+        while self._running.is_set():
+            try:
+                line: bytes = self._device.readline()
+            except (SerialException, OSError, TypeError) as ex:
+                # port was closed or device was disconnected
+                self._fail(SerialException(f"Reading from device failed: {ex}"))
+                return
+
+            if len(line) == 0:
+                continue
+
+            self._traffic_log.record(Direction.RECEIVED, line)
+            response = line.decode("ascii", errors="replace").strip()
+            response_type = classify_response(response)
+            self.queues[response_type].append(response)
+
+            if response_type in REPLY_TYPES:
+                self._deliver(line)
+
+    def _deliver(self, line: bytes) -> None:
+        with self._lock:
+            while len(self._pending) > 0:
+                future = self._pending.popleft()
+                # sender that already gave up does not get the reply
+                if future.set_running_or_notify_cancel():
+                    future.set_result(line)
+                    return
+
+            self._replies.append(line)
+
+    def _fail(self, error: Exception) -> None:
+        with self._lock:
+            self._error = error
+            while len(self._pending) > 0:
+                future = self._pending.popleft()
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+        self._running.clear()
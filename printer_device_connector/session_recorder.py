@@ -0,0 +1,284 @@
+import enum
+import json
+import struct
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from serial import Serial
+from serial import SerialException
+
+from printer_device_connector.serial_device import SerialDevice
+
+_MAGIC = b"PDCTRACE"
+# header length
+_HEADER = struct.Struct("<I")
+# seconds since start of recording, direction, payload length
+_EVENT = struct.Struct("<dBH")
+_MAX_PAYLOAD = 0xFFFF
+
+
+class TraceDirection(enum.IntEnum):
+    WRITE = 0
+    READ = 1  # empty payload means read that timed out
+
+
+class TraceEvent:
+    __slots__ = ("timestamp", "direction", "data")
+
+    def __init__(self, timestamp: float, direction: TraceDirection, data: bytes) -> None:
+        self.timestamp = timestamp
+        self.direction = direction
+        self.data = data
+
+    def __repr__(self) -> str:
+        return f"TraceEvent({self.timestamp:.6f}, {self.direction.name}, {self.data!r})"
+
+
+def read_trace(path: str) -> Tuple[Dict, List[TraceEvent]]:
+    """
+    **Load recorded session.**
+
+    Parameters
+    ----------
+    **path : str**
+        Trace file written by `RecordingSerial`
+
+    Raises
+    ------
+    **ValueError**
+        File is not a session trace
+
+    Returns
+    -------
+    **Tuple[Dict, List[TraceEvent]]**
+        Trace header (port, baudrate, timeout, wall clock time of start) and recorded events, in order
+    """
+    with open(path, "rb") as file:
+        if file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"'{path}' is not a session trace")
+
+        (header_length,) = _HEADER.unpack(file.read(_HEADER.size))
+        header = json.loads(file.read(header_length))
+
+        events = []
+        while True:
+            chunk = file.read(_EVENT.size)
+            if len(chunk) < _EVENT.size:
+                # trace of interrupted session ends with partial event
+                return header, events
+
+            timestamp, direction, length = _EVENT.unpack(chunk)
+            data = file.read(length)
+            if len(data) < length:
+                return header, events
+
+            events.append(TraceEvent(timestamp, TraceDirection(direction), data))
+
+
+class RecordingSerial:
+    """
+    **Serial port wrapper that writes every read and write to binary trace.**
+    Events are timestamped with monotonic clock, relative to start of recording,
+    reads that timed out are recorded too, so replay reproduces stalls. Trace is flushed at least once a second.
+    Any other attribute is taken from wrapped port.
+
+    Parameters
+    ----------
+    **device : Serial**
+        Recorded port
+
+    **path : str**
+        Trace file, overwritten
+    """
+
+    def __init__(self, device: Serial, path: str) -> None:
+        self._device = device
+        self._lock = threading.Lock()
+        self._file: BinaryIO = open(path, "wb")
+        self._started = time.monotonic()
+        self._last_flush = self._started
+
+        header = json.dumps({
+            "port": str(getattr(device, "port", "")),
+            "baudrate": getattr(device, "baudrate", None),
+            "timeout": getattr(device, "timeout", None),
+            "started": time.time(),
+        }).encode("utf-8")
+        self._file.write(_MAGIC + _HEADER.pack(len(header)) + header)
+
+    def __getattr__(self, name: str):
+        return getattr(self._device, name)
+
+    def write(self, data: bytes) -> Optional[int]:
+        self._record(TraceDirection.WRITE, bytes(data))
+        return self._device.write(data)
+
+    def readline(self) -> bytes:
+        data = self._device.readline()
+        self._record(TraceDirection.READ, data)
+        return data
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._device.read(size)
+        self._record(TraceDirection.READ, data)
+        return data
+
+    def close(self) -> None:
+        self._device.close()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _record(self, direction: TraceDirection, data: bytes) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._file.closed:
+                return
+
+            for start in range(0, max(len(data), 1), _MAX_PAYLOAD):
+                payload = data[start:start + _MAX_PAYLOAD]
+                self._file.write(_EVENT.pack(now - self._started, direction, len(payload)) + payload)
+
+            if now - self._last_flush >= 1:
+                self._file.flush()
+                self._last_flush = now
+
+
+def record_session(device: SerialDevice, path: str) -> RecordingSerial:
+    """
+    **Start recording traffic of connected device.**
+    Port of device is wrapped in place, background reader (if running) is restarted on wrapped port.
+
+    Returns
+    -------
+    **RecordingSerial**
+        Wrapped port, closing it finishes the trace
+    """
+    reader_running = device.reader is not None
+    device.stop_reader()
+
+    recorder = RecordingSerial(device._device, path)
+    device._device = recorder
+
+    if reader_running:
+        device.start_reader()
+
+    return recorder
+
+
+class ReplaySerial:
+    """
+    **Stand-in for serial port, that answers with recorded session.**
+    Reads return recorded reads in order. Every recorded read waits until host wrote everything
+    that was written before it in recording, in real time mode it also keeps the recorded delay
+    from that write (divided by `speed`). Written data can be checked against recording (`strict`).
+
+    Parameters
+    ----------
+    **path : str**
+        Trace file written by `RecordingSerial`
+
+    **realtime : bool, optional**
+        Reproduce recorded timing, otherwise replay as fast as possible, **by default True**
+
+    **speed : float, optional**
+        Playback speed in real time mode, **by default 1**
+
+    **strict : bool, optional**
+        Raise SerialException when host writes something else than recorded host, **by default False**
+    """
+
+    def __init__(self, path: str, realtime: bool = True, speed: float = 1, strict: bool = False) -> None:
+        header, events = read_trace(path)
+        self.port: str = header["port"]
+        self.baudrate: Optional[int] = header["baudrate"]
+        self.timeout: Optional[float] = header["timeout"]
+
+        self.realtime = realtime
+        self.speed = speed
+        self.strict = strict
+
+        self._writes: List[TraceEvent] = []
+        # recorded read and number of writes that preceded it
+        self._reads: List[Tuple[TraceEvent, int]] = []
+        for event in events:
+            if event.direction == TraceDirection.WRITE:
+                self._writes.append(event)
+            else:
+                self._reads.append((event, len(self._writes)))
+
+        self._condition = threading.Condition()
+        self._written: int = 0
+        self._write_times: List[float] = []
+        self._next_read: int = 0
+        self._started = time.monotonic()
+        self.is_open = True
+
+    @property
+    def finished(self) -> bool:
+        return self._next_read >= len(self._reads)
+
+    @property
+    def in_waiting(self) -> int:
+        with self._condition:
+            if self.finished:
+                return 0
+            event, writes_before = self._reads[self._next_read]
+            if writes_before > self._written or self._due(event, writes_before) > time.monotonic():
+                return 0
+            return max(len(event.data), 1)
+
+    def write(self, data: bytes) -> int:
+        with self._condition:
+            if self.strict:
+                expected = self._writes[self._written].data if self._written < len(self._writes) else b""
+                if bytes(data) != expected:
+                    raise SerialException(f"Replayed session expected {expected!r}, host wrote {bytes(data)!r}")
+
+            self._written += 1
+            self._write_times.append(time.monotonic())
+            self._condition.notify_all()
+
+        return len(data)
+
+    def readline(self) -> bytes:
+        with self._condition:
+            if self.finished:
+                self._condition.wait(self.timeout)
+                return bytes()
+
+            event, writes_before = self._reads[self._next_read]
+            # answer cannot arrive before host sent what device answered to
+            if not self._condition.wait_for(lambda: self._written >= writes_before or not self.is_open, self.timeout):
+                return bytes()
+
+            self._next_read += 1
+
+        delay = self._due(event, writes_before) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        return event.data
+
+    def read(self, size: int = 1) -> bytes:
+        return self.readline()
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def close(self) -> None:
+        with self._condition:
+            self.is_open = False
+            self._condition.notify_all()
+
+    def _due(self, event: TraceEvent, writes_before: int) -> float:
+        if not self.realtime:
+            return 0
+
+        if writes_before == 0:
+            return self._started + event.timestamp / self.speed
+
+        write_index = min(writes_before, len(self._write_times)) - 1
+        recorded_delay = event.timestamp - self._writes[write_index].timestamp
+        return self._write_times[write_index] + recorded_delay / self.speed
@@ -0,0 +1,283 @@
+import functools
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from serial import Serial
+from serial import SerialException
+
+from printer_device_connector.checkpoint import Checkpoint
+
+if TYPE_CHECKING:
+    from printer_device_connector.serial_device import SerialDevice
+
+# message printed by Marlin and Prusa firmware after reset
+_SUCCESSFUL_CONNECTION_MESSAGE = "start"
+
+# errors after which connection is reopened, instead of failing the call
+RECOVERABLE_ERRORS = (SerialException, OSError)
+
+
+class DeviceResetError(SerialException):
+    """
+    Board printed 'start' banner mid-session, it was reset and lost line numbering, modal state and planned moves.
+    """
+
+
+class ConnectionSupervisor:
+    """
+    **Keeps printer session alive over lost connection and board resets.**
+    Supervised calls (`stream`, `send_batch`, `send_and_await`) that fail with serial error, or notice 'start' banner
+    of reset board, reopen the port with exponential backoff and restore the session:
+        - line numbering is reset (M110),
+        - after board reset heaters are brought back to temperature and all axes are homed,
+          as position is unknown, then head returns to the last position that is sure to be reached,
+        - positioning mode, units and feedrate are restored,
+        - streamed commands that were not acknowledged are sent again and the stream continues,
+          after board reset `replay_depth` acknowledged ones (moves lost from planner buffer) are sent again as well,
+          without reset they are still planned by firmware.
+
+    Created by `SerialDevice.supervise`.
+
+    Parameters
+    ----------
+    **port : str**
+        Port reopened after failure
+
+    **baudrate : int**
+        Baudrate of port
+
+    **timeout : float**
+        Read timeout of port, in seconds
+
+    **max_attempts : int, optional**
+        Number of reconnect attempts of supervised call, counted until it makes progress, **by default 10**.
+        Reopened port that fails again before anything is acknowledged uses up next attempt
+
+    **backoff : float, optional**
+        Delay before first attempt, doubled after every failed one, in seconds, **by default 0.5**
+
+    **max_backoff : float, optional**
+        Longest delay between attempts, in seconds, **by default 30**
+
+    **lift : float, optional**
+        Height of safe return move above resumed position, in mm, **by default 5**
+
+    **replay_depth : int, optional**
+        Number of acknowledged commands sent again after reset, **by default 16** (Marlin planner buffer)
+    """
+
+    def __init__(
+            self,
+            port: str,
+            baudrate: int,
+            timeout: float,
+            max_attempts: int = 10,
+            backoff: float = 0.5,
+            max_backoff: float = 30,
+            lift: float = 5,
+            replay_depth: int = 16,
+    ) -> None:
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lift = lift
+        self.replay_depth = replay_depth
+
+        self.reconnects: int = 0
+        self.failed_attempts: int = 0
+        self.commands_replayed: int = 0
+        # supervised call is in progress, nested calls (like restoring session) are not supervised again
+        self._active = False
+        # reconnect attempts since supervised call was started or made progress
+        self._attempts = 0
+
+    def call(self, device: "SerialDevice", method: Callable, command: str, *args, **kwargs):
+        """
+        Call `method` of `device` with single command, the command is sent again after recovery.
+        """
+        checkpoint = Checkpoint.from_state("", device.state)
+
+        self._active = True
+        self._attempts = 0
+        try:
+            while True:
+                try:
+                    return method(device, command, *args, **kwargs)
+                except RECOVERABLE_ERRORS as error:
+                    self.recover(device, checkpoint, error)
+        finally:
+            self._active = False
+
+    def stream(self, device: "SerialDevice", method: Callable, commands: Iterable[str], *args, **kwargs) -> int:
+        """
+        Stream `commands` with `method` of `device`, the stream is resumed after recovery.
+        Returns number of streamed commands.
+        """
+        source = iter(commands)
+        # commands to send again, with checkpoint of state before each of them
+        replay: Deque[Tuple[str, Checkpoint]] = deque()
+        consumed = 0
+
+        self._active = True
+        self._attempts = 0
+        try:
+            while True:
+                history: Deque[Tuple[str, Checkpoint]] = deque()
+                acknowledged_before = device.acknowledged_lines
+                sent = [0]
+
+                def feed() -> Iterator[str]:
+                    nonlocal consumed
+                    while True:
+                        if len(replay) > 0:
+                            command, checkpoint = replay.popleft()
+                        else:
+                            command = next(source, None)
+                            if command is None:
+                                return
+                            consumed += 1
+                            checkpoint = Checkpoint.from_state("", device.state)
+
+                        history.append((command, checkpoint))
+                        sent[0] += 1
+                        # only not acknowledged commands and the latest acknowledged ones can be lost
+                        unacknowledged = sent[0] - (device.acknowledged_lines - acknowledged_before)
+                        while len(history) > unacknowledged + self.replay_depth:
+                            history.popleft()
+
+                        yield command
+
+                try:
+                    method(device, feed(), *args, **kwargs)
+                    return consumed
+                except RECOVERABLE_ERRORS as error:
+                    if device.acknowledged_lines > acknowledged_before:
+                        self._attempts = 0
+                    entries = list(history)
+                    split = len(entries) - (sent[0] - (device.acknowledged_lines - acknowledged_before))
+                    unacknowledged = entries[split:]
+                    acknowledged = entries[:split][-self.replay_depth:]
+
+                    current = Checkpoint.from_state("", device.state)
+                    checkpoint = unacknowledged[0][1] if len(unacknowledged) > 0 else current
+                    reset_checkpoint = (acknowledged + unacknowledged)[0][1] if len(entries) > 0 else current
+                    reset = self.recover(device, checkpoint, error, reset_checkpoint)
+
+                    lost = acknowledged + unacknowledged if reset else unacknowledged
+                    replay = deque(lost + list(replay))
+                    self.commands_replayed += len(lost)
+        finally:
+            self._active = False
+
+    def recover(
+            self,
+            device: "SerialDevice",
+            checkpoint: Checkpoint,
+            error: Exception,
+            reset_checkpoint: Optional[Checkpoint] = None,
+    ) -> bool:
+        """
+        **Reopen port with backoff and restore session at `checkpoint`.**
+        After board reset session is restored at `reset_checkpoint` instead, when given,
+        as moves acknowledged after it were lost from planner.
+
+        Returns
+        -------
+        **bool**
+            Board was reset
+
+        Raises
+        ------
+        **SerialException**
+            Connection was not restored within `max_attempts`, counted together with earlier recoveries
+            of supervised call that did not make progress
+        """
+        device.traffic_log.event("connection lost: %r, reconnecting", error)
+        # banner was already read from old port
+        board_reset = isinstance(error, DeviceResetError)
+
+        delay = self.backoff
+        while self._attempts < self.max_attempts:
+            self._attempts += 1
+            attempt = self._attempts
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+            try:
+                port, reset = self.reopen()
+                reset = reset or board_reset
+                device.replace_port(port, reset)
+                restored = reset_checkpoint if reset and reset_checkpoint is not None else checkpoint
+                device.stream(self.restore_commands(restored, reset))
+            except RECOVERABLE_ERRORS as ex:
+                self.failed_attempts += 1
+                device.traffic_log.event("reconnect attempt %d failed: %r", attempt, ex)
+                error = ex
+                continue
+
+            self.reconnects += 1
+            device.traffic_log.event("reconnected after %d attempts, board reset: %s", attempt, reset)
+            return reset
+
+        raise SerialException(f"Session on '{self.port}' not restored after {self.max_attempts} attempts: {error}")
+
+    def reopen(self) -> Tuple[Serial, bool]:
+        """
+        Open port and read startup messages, returns port and whether board was reset ('start' banner was printed).
+        """
+        port = Serial(port=self.port, baudrate=self.baudrate, timeout=self.timeout)
+
+        reset = False
+        resp = port.readline()
+        while resp != bytes():
+            reset = reset or resp.decode("utf-8", errors="replace").strip() == _SUCCESSFUL_CONNECTION_MESSAGE
+            resp = port.readline()
+
+        return port, reset
+
+    def restore_commands(self, checkpoint: Checkpoint, reset: bool) -> List[str]:
+        """
+        Commands bringing device back to `checkpoint`, all axes are homed after board `reset`.
+        """
+        if reset:
+            return checkpoint.resume_commands(lift=self.lift, home_z=True)
+
+        commands = ["G21", "G90"]
+        if checkpoint.position is not None and None not in checkpoint.position:
+            x, y, z = checkpoint.position
+            commands.append(f"G1 X{x} Y{y} Z{z}")
+        return commands + checkpoint.mode_commands()
+
+
+def supervised_command(method: Callable) -> Callable:
+    """
+    Run device method sending single command under supervisor of device, if it has one.
+    """
+
+    @functools.wraps(method)
+    def wrapper(device: "SerialDevice", command: str, *args, **kwargs):
+        supervisor: Optional[ConnectionSupervisor] = device.supervisor
+        if supervisor is None or supervisor._active:
+            return method(device, command, *args, **kwargs)
+        return supervisor.call(device, method, command, *args, **kwargs)
+
+    return wrapper
+
+
+def supervised_stream(method: Callable) -> Callable:
+    """
+    Run device method streaming commands under supervisor of device, if it has one.
+    """
+
+    @functools.wraps(method)
+    def wrapper(device: "SerialDevice", commands: Iterable[str], *args, **kwargs) -> int:
+        supervisor: Optional[ConnectionSupervisor] = device.supervisor
+        if supervisor is None or supervisor._active:
+            return method(device, commands, *args, **kwargs)
+        return supervisor.stream(device, method, commands, *args, **kwargs)
+
+    return wrapper
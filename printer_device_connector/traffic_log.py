@@ -0,0 +1,171 @@
+import enum
+import itertools
+import threading
+import time
+from typing import List, Optional, Tuple
+
+# sequence number, monotonic timestamp, direction, data
+Record = Tuple[int, float, "Direction", bytes]
+
+
+class Direction(enum.IntEnum):
+    SENT = 0
+    RECEIVED = 1
+    EVENT = 2  # message of connector itself, like predicted time of execution
+
+
+class LogLevel(enum.IntEnum):
+    SILENT = 0  # nothing is recorded
+    TRAFFIC = 1  # bytes sent and received
+    INFO = 2  # traffic and events
+    DEBUG = 3  # traffic and events, every record is also printed
+
+
+def _ignore(*args) -> None:
+    pass
+
+
+class TrafficLog:
+    """
+    **In-memory ring of device traffic.**
+    Records are `(sequence, timestamp, direction, data)` tuples, oldest records are overwritten once ring is full.
+    Writers never take a lock: slot is chosen by sequence number taken from atomic counter,
+    readers sort snapshot of ring by sequence numbers.
+    Below enabled level `record` and `event` are no-op functions, so silent log costs single call per command.
+    Records can be flushed to text file by background thread (`start_flushing`).
+
+    Parameters
+    ----------
+    **level : LogLevel, optional**
+        What is recorded, **by default LogLevel.INFO**
+
+    **capacity : int, optional**
+        Number of kept records, **by default 4096**
+    """
+
+    def __init__(self, level: LogLevel = LogLevel.INFO, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self._ring: List[Optional[Record]] = [None] * capacity
+        self._sequence = itertools.count()
+
+        self._flusher: Optional[threading.Thread] = None
+        self._flushing = threading.Event()
+        self._flushed: int = 0
+        # records overwritten before they were flushed
+        self.dropped: int = 0
+
+        self.level = level
+
+    @property
+    def level(self) -> LogLevel:
+        return self._level
+
+    @level.setter
+    def level(self, level: LogLevel) -> None:
+        self._level = level
+        self._echo = level >= LogLevel.DEBUG
+        self.record = self._record if level >= LogLevel.TRAFFIC else _ignore
+        self.event = self._event if level >= LogLevel.INFO else _ignore
+
+    def record(self, direction: Direction, data: bytes) -> None:
+        """
+        Record bytes sent to or received from device.
+        """
+        # replaced in `level` setter
+
+    def event(self, message: str, *args) -> None:
+        """
+        Record connector event, `message` is %-formatted with `args` only when event is recorded.
+        """
+        # replaced in `level` setter
+
+    def _record(self, direction: Direction, data: bytes) -> None:
+        sequence = next(self._sequence)
+        record = (sequence, time.monotonic(), direction, data)
+        self._ring[sequence % self.capacity] = record
+
+        if self._echo:
+            print(TrafficLog.format(record), end="")
+
+    def _event(self, message: str, *args) -> None:
+        self._record(Direction.EVENT, bytes(message % args if args else message, "utf-8"))
+
+    def records(self, since: int = 0) -> List[Record]:
+        """
+        **Records held in ring, in order.**
+
+        Parameters
+        ----------
+        **since : int, optional**
+            Only records with sequence number of at least `since` are returned, **by default 0**
+        """
+        return sorted(
+            (record for record in list(self._ring) if record is not None and record[0] >= since),
+            key=lambda record: record[0],
+        )
+
+    def clear(self) -> None:
+        self._ring = [None] * self.capacity
+
+    @staticmethod
+    def format(record: Record) -> str:
+        _, timestamp, direction, data = record
+        return f"{timestamp:.6f} {direction.name:<8} {data.decode('utf-8', errors='replace').rstrip()}\n"
+
+    def start_flushing(self, path: str, interval: float = 0.5) -> None:
+        """
+        **Append records to text file every `interval` seconds, from background thread.**
+        Records overwritten in ring before they were flushed are counted in `dropped`.
+        """
+        if self._flusher is not None:
+            return
+
+        self._flushing.set()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, args=(path, interval), name="TrafficLogFlusher", daemon=True
+        )
+        self._flusher.start()
+
+    def stop_flushing(self) -> None:
+        """
+        Stop background flushing, records recorded until now are flushed.
+        """
+        if self._flusher is None:
+            return
+
+        self._flushing.clear()
+        self._flusher.join()
+        self._flusher = None
+
+    def _flush_periodically(self, path: str, interval: float) -> None:
+        with open(path, "a") as file:
+            while self._flushing.is_set():
+                time.sleep(interval)
+                self._flush(file)
+            self._flush(file)
+
+    def _flush(self, file) -> None:
+        records = self.records(since=self._flushed)
+        if len(records) == 0:
+            return
+
+        self.dropped += records[0][0] - self._flushed
+        file.writelines(TrafficLog.format(record) for record in records)
+        file.flush()
+        self._flushed = records[-1][0] + 1
+
+
+if __name__ == "__main__":
+    import timeit
+
+    line = b"N12 G1 X10.5 Y20.25 Z5 F 900 N12*85\n"
+    repeats = 200_000
+
+    for level in LogLevel.SILENT, LogLevel.TRAFFIC:
+        log = TrafficLog(level)
+        per_record = min(timeit.repeat(lambda: log.record(Direction.SENT, line), number=repeats, repeat=5)) / repeats
+        print(f"{level.name:<8} record: {per_record * 1e9:.0f}ns")
+
+    log = TrafficLog(LogLevel.SILENT)
+    per_event = min(timeit.repeat(lambda: log.event("predicted: %.3fs", 1.25), number=repeats, repeat=5)) / repeats
+    print(f"SILENT   event:  {per_event * 1e9:.0f}ns")
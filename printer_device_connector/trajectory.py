@@ -0,0 +1,201 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from printer_device_connector.motion_planner import Position
+
+
+class Point3D:
+    """
+    **Single head position, axes are None when unknown.**
+    """
+
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0, y=0, z=0):
+        self.x: Optional[float] = x
+        self.y: Optional[float] = y
+        self.z: Optional[float] = z
+
+    def is_none(self):
+        return self.x is None or self.y is None or self.z is None
+
+    def from_tuple(self, position: Tuple[float, float, float]):
+        self.x = position[0]
+        self.y = position[1]
+        self.z = position[2]
+
+    def as_tuple(self) -> Optional[Tuple[float, float, float]]:
+        return self.x, self.y, self.z
+
+    def __iter__(self) -> Iterator[Optional[float]]:
+        return iter((self.x, self.y, self.z))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Point3D):
+            return self.as_tuple() == other.as_tuple()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Point3D(x={self.x}, y={self.y}, z={self.z})"
+
+
+class Trajectory:
+    """
+    **Sequence of head positions, kept in contiguous (N, 3) float64 array.**
+    Iterating yields `(x, y, z)` tuples, so trajectory can be used wherever list of positions was.
+
+    Parameters
+    ----------
+    **points : Union[np.ndarray, Iterable[Tuple[float, float, float]]]**
+        Consecutive positions, array of shape (N, 3) or iterable of (x, y, z)
+
+    Raises
+    ------
+    **ValueError**
+        Points are not 3D
+    """
+
+    __slots__ = ("points",)
+
+    def __init__(self, points: Union[np.ndarray, Iterable[Position], "Trajectory"] = ()) -> None:
+        if isinstance(points, Trajectory):
+            points = points.points
+        elif not isinstance(points, np.ndarray):
+            points = list(points)
+
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        if points.size == 0:
+            points = points.reshape(0, 3)
+
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError(f"Expected points of shape (N, 3), got {points.shape}")
+
+        self.points: np.ndarray = points
+
+    @staticmethod
+    def from_xy(x: Iterable[float], y: Iterable[float], z: float) -> "Trajectory":
+        """
+        Trajectory at constant height `z`, through points (x[i], y[i]).
+        """
+        x = np.asarray(x, dtype=np.float64)
+        points = np.empty((len(x), 3))
+        points[:, 0] = x
+        points[:, 1] = np.asarray(y, dtype=np.float64)
+        points[:, 2] = z
+        return Trajectory(points)
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.points[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.points[:, 1]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self.points[:, 2]
+
+    def offset(self, x: float = 0, y: float = 0, z: float = 0) -> "Trajectory":
+        """
+        Trajectory shifted by (x, y, z).
+        """
+        return Trajectory(self.points + (x, y, z))
+
+    def round(self, decimals: int = 3) -> "Trajectory":
+        return Trajectory(np.round(self.points, decimals))
+
+    def min(self) -> Position:
+        """
+        Smallest coordinate of every axis.
+        """
+        return tuple(self.points.min(axis=0).tolist())
+
+    def max(self) -> Position:
+        """
+        Largest coordinate of every axis.
+        """
+        return tuple(self.points.max(axis=0).tolist())
+
+    def bounds(self) -> Tuple[Position, Position]:
+        """
+        **Box containing whole trajectory.**
+
+        Returns
+        -------
+        **Tuple[Position, Position]**
+            Minimal and maximal corner
+        """
+        return self.min(), self.max()
+
+    def segment_lengths(self) -> np.ndarray:
+        """
+        Distance between consecutive points, array of N - 1 values, in mm.
+        """
+        return np.linalg.norm(np.diff(self.points, axis=0), axis=1)
+
+    def distances_from(self, position: Position) -> np.ndarray:
+        """
+        Distance of every point from `position`, in mm.
+        """
+        return np.linalg.norm(self.points - position, axis=1)
+
+    @property
+    def length(self) -> float:
+        """
+        Total length of path through all points, in mm.
+        """
+        return float(self.segment_lengths().sum())
+
+    def rows(self) -> List["Trajectory"]:
+        """
+        **Split trajectory into straight rows, like columns of serpentine scan.**
+        Row ends where direction of travel changes, next row starts at the following point,
+        so every row can be sent to printer as single script.
+
+        Returns
+        -------
+        **List[Trajectory]**
+            Consecutive rows, together they hold all points
+        """
+        segments = np.diff(self.points, axis=0)
+        lengths = np.linalg.norm(segments, axis=1, keepdims=True)
+        directions = np.divide(segments, lengths, out=np.zeros_like(segments), where=lengths > 0)
+
+        rows = []
+        start = 0
+        while start < len(self):
+            end = start + 1
+            while end < len(self) and np.allclose(directions[end - 1], directions[start]):
+                end += 1
+
+            rows.append(self[start:end])
+            start = end
+
+        return rows
+
+    def as_tuples(self) -> List[Position]:
+        return [tuple(point) for point in self.points.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __iter__(self) -> Iterator[Position]:
+        return iter(self.as_tuples())
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Position, "Trajectory"]:
+        if isinstance(index, slice):
+            return Trajectory(self.points[index])
+        return tuple(self.points[index].tolist())
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return self.points if dtype is None else self.points.astype(dtype)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Trajectory):
+            return np.array_equal(self.points, other.points)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Trajectory({len(self)} points)"
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from serial import SerialException
+
+from printer_device_connector.async_device import (
+    AsyncMarlinDevice,
+    AsyncPrinterDeviceMock,
+    AsyncPrusaDevice,
+    AsyncSerialPort,
+)
+from tests.test_marin_device import FakeSerial
+
+tty = pytest.importorskip("tty", reason="requires pseudo-terminal")
+
+
+class PtyResponder(threading.Thread):
+    """
+    Answers every line written to pseudo-terminal with 'ok', after printing 'start' banner.
+    """
+
+    def __init__(self, extra_replies=()):
+        super().__init__(daemon=True)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.extra_replies = extra_replies
+        self.received = []
+        os.write(self.master, b"start\n")
+
+    def run(self):
+        buffer = b""
+        while True:
+            try:
+                buffer += os.read(self.master, 1024)
+            except OSError:
+                return
+
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                self.received.append(line.decode("ascii"))
+                os.write(self.master, b"".join(self.extra_replies) + b"ok\n")
+
+    def close(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+
+@pytest.fixture
+def responder():
+    responder = PtyResponder(extra_replies=(b"echo:busy: processing\n",))
+    responder.start()
+    yield responder
+    responder.close()
+
+
+class TestAsyncDevice:
+    def test_marlin_send_many(self, responder):
+        async def scan():
+            printer = await AsyncMarlinDevice.connect(responder.port, timeout=0.2)
+            sent = await printer.send_many([f"G1 X{x} Y1 Z1" for x in range(10)])
+            await printer.close()
+            return sent, printer.get_current_position()
+
+        sent, position = asyncio.run(scan())
+
+        assert sent == 10
+        assert position == (9, 1, 1)
+        assert all(line.startswith("N") and "*" in line for line in responder.received)
+
+    def test_prusa_send(self, responder):
+        async def home():
+            printer = await AsyncPrusaDevice.connect(responder.port, timeout=0.2)
+            resp = await printer.send("G28")
+            await printer.close()
+            return resp
+
+        assert asyncio.run(home()) == "ok"
+        assert responder.received == ["G28 F 900"]
+
+    def test_mock_overlaps_with_other_tasks(self):
+        async def overlap():
+            printer = AsyncPrinterDeviceMock(move_time=0.1)
+            start = asyncio.get_running_loop().time()
+            await asyncio.gather(printer.send("G1 X1 Y1 Z1"), asyncio.sleep(0.1))
+            return asyncio.get_running_loop().time() - start
+
+        assert asyncio.run(overlap()) < 0.19
+
+    def test_write_to_full_buffer_does_not_block_loop(self):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        data = bytes(range(256)) * 4096
+        received = bytearray()
+
+        def drain():
+            while len(received) < len(data):
+                received.extend(os.read(master, 65536))
+
+        async def write():
+            port = await AsyncSerialPort.open(os.ttyname(slave), 250000)
+            writer = asyncio.create_task(port.write(data))
+            # nobody reads yet, so write is stuck on full buffer while loop keeps running
+            await asyncio.sleep(0.1)
+            stuck = not writer.done()
+
+            reader = threading.Thread(target=drain, daemon=True)
+            reader.start()
+            await asyncio.wait_for(writer, 5)
+            reader.join(5)
+            port.close()
+            return stuck
+
+        try:
+            assert asyncio.run(write())
+            assert received == data
+        finally:
+            os.close(slave)
+            os.close(master)
+
+
+class QuietSerial(FakeSerial):
+    """
+    Port without file descriptor, so it's read in executor, waits read timeout when there is nothing to read.
+    """
+
+    def readline(self):
+        if len(self.replies) == 0:
+            time.sleep(self.timeout)
+        return super().readline()
+
+
+class DisconnectedSerial(FakeSerial):
+    """
+    Port without file descriptor, reading fails once received replies are read.
+    """
+
+    def readline(self):
+        if len(self.replies) == 0:
+            raise SerialException("device disconnected")
+        return super().readline()
+
+
+class TestExecutorReader:
+    def test_read_error_ends_reader(self):
+        serial = DisconnectedSerial()
+        serial.replies = [b"ok\n"]
+
+        async def read():
+            port = AsyncSerialPort(serial)
+            first = await port.readline(1)
+            with pytest.raises(SerialException, match="disconnected"):
+                await port.readline(1)
+            # failure is not forgotten
+            with pytest.raises(SerialException):
+                await port.readline(1)
+            return first, port._executor_reader.done()
+
+        assert asyncio.run(read()) == (b"ok\n", True)
+
+    def test_marlin_resend_with_shared_protocol(self):
+        serial = QuietSerial(
+            scripted_replies=[(b"Error:checksum mismatch, Last Line: 0\n", b"Resend: 1\n", b"ok\n")],
+        )
+
+        async def send():
+            printer = AsyncMarlinDevice(AsyncSerialPort(serial), timeout=1)
+            # the first line is corrupted, its own 'ok' follows the retransmission
+            await printer.send_many(["G1 X1 Y1 Z1", "G1 X2 Y1 Z1"], window=1)
+            await printer.close()
+            return printer
+
+        printer = asyncio.run(send())
+
+        assert serial.written[0] == serial.written[1]
+        assert printer.resend_buffer.lines_resent == 1
+        assert printer.line_counter == 3
+        assert printer.get_current_position() == (2, 1, 1)
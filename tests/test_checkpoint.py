@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+from serial import SerialException
+
+from g_code_file_handler.g_code_file import GCodeFile
+from print_from_file import PrintEngine, resume_print
+from printer_device_connector.checkpoint import Checkpoint, CheckpointJournal
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.marlin_device import MarlinDevice
+from tests.test_marin_device import FakeSerial
+
+TEST_FILE = "assets/anycubic_cobra_testing_block.gcode"
+
+
+def file_commands():
+    commands = [command.partition(";")[0].strip() for command in GCodeFile(TEST_FILE).commands()]
+    return [command for command in commands if command != ""]
+
+
+def sent_commands(port):
+    # 'N12 G1 X1 N12*85\n' -> 'G1 X1'
+    return [line.decode("ascii").split(" ", 1)[1].rsplit(" N", 1)[0] for line in port.lines]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return CheckpointJournal(str(tmp_path / "checkpoint.json"), interval=60)
+
+
+class TestCheckpoint:
+    def test_from_state(self):
+        state = MachineState()
+        for command in ["G28", "M140 S60", "M104 S215", "G91", "G1 X1 F1200", "M104 S0"]:
+            state.apply(parse_line(command))
+
+        checkpoint = Checkpoint.from_state("job", state, offset=10)
+
+        assert checkpoint.offset == 10
+        assert checkpoint.position == (1, 0, 0)
+        assert checkpoint.relative
+        assert checkpoint.feedrate == 1200
+        assert checkpoint.temperatures == {"bed": 60, "hotend": 0}
+
+    def test_resume_commands_heat_lift_and_return(self):
+        checkpoint = Checkpoint("job", position=(10, 20, 1.2), feedrate=1500, temperatures={"bed": 60, "hotend": 215})
+
+        commands = checkpoint.resume_commands(lift=5)
+
+        assert commands[:4] == ["M140 S60", "M190 S60", "M104 S215", "M109 S215"]
+        assert commands.index("G1 Z5 F300") < commands.index("G28 X Y")
+        assert "G28" not in commands
+        assert commands[-4:] == ["G1 X10 Y20 Z6.2", "G1 Z1.2 F300", "M82", "G1 F1500"]
+
+    def test_resume_commands_restore_relative_positioning(self):
+        commands = Checkpoint("job", position=(0, 0, 1), relative=True).resume_commands(home_z=True)
+
+        assert "G28" in commands
+        assert commands[-1] == "G91"
+
+    def test_resume_commands_restore_extruder(self):
+        state = MachineState()
+        for command in ["G28", "M83", "G1 X1 E2", "G1 X2 E1.5"]:
+            state.apply(parse_line(command))
+
+        checkpoint = Checkpoint.from_state("job", state)
+        commands = checkpoint.resume_commands()
+
+        assert checkpoint.e == 3.5
+        assert checkpoint.relative_extrusion
+        # extruder keeps its position, mode is restored after travel with homed and lifted head
+        assert commands[-2:] == ["M83", "G92 E3.5"]
+        assert commands.index("G28 X Y") < commands.index("M83")
+
+
+class TestCheckpointJournal:
+    def test_round_trip(self, journal):
+        journal.record(Checkpoint("job", offset=120, position=(1, 2, 3), extra={"m": np.array([1.5, 2.5])}))
+
+        checkpoint = journal.load()
+
+        assert checkpoint.offset == 120
+        assert checkpoint.position == (1, 2, 3)
+        assert checkpoint.extra == {"m": [1.5, 2.5]}
+
+    def test_round_trip_of_extruder_state(self, journal):
+        journal.record(Checkpoint("job", offset=120, e=12.5, relative_extrusion=True))
+
+        checkpoint = journal.load()
+
+        assert checkpoint.e == 12.5
+        assert checkpoint.relative_extrusion
+
+    def test_throttled_by_interval(self, tmp_path):
+        journal = CheckpointJournal(str(tmp_path / "checkpoint.json"), interval=60)
+
+        assert journal.record(Checkpoint("job", path_index=1))
+        assert not journal.record(Checkpoint("job", path_index=2))
+        assert journal.record(Checkpoint("job", path_index=3), force=True)
+        assert journal.load().path_index == 3
+
+    def test_clear(self, journal):
+        journal.record(Checkpoint("job"))
+        journal.clear()
+
+        assert journal.load() is None
+
+
+class TestResumePrint:
+    def test_checkpoint_lags_unacknowledged_lines(self, journal):
+        expected = file_commands()
+        # device stops answering after 30 lines
+        port = FakeSerial(scripted_replies=[(b"ok\n",)] * 30 + [()] * len(expected))
+
+        with pytest.raises(SerialException):
+            PrintEngine(MarlinDevice(port), GCodeFile(TEST_FILE), window=4, journal=journal).run()
+
+        file = GCodeFile(TEST_FILE)
+        file.seek(journal.load().offset)
+        confirmed = len(expected) - len([c for c in file.commands() if c.partition(";")[0].strip() != ""])
+
+        assert 30 - 4 <= confirmed <= 30
+
+    def test_stopped_print_resumes_from_last_line(self, journal):
+        expected = file_commands()
+        engine = PrintEngine(MarlinDevice(FakeSerial()), GCodeFile(TEST_FILE), journal=journal, report_interval=0)
+        engine.on_progress = lambda statistics: engine.stop() if statistics.lines_sent >= 20 else None
+
+        sent = engine.run().lines_sent
+        assert 20 <= sent < len(expected)
+
+        port = FakeSerial()
+        checkpoint = journal.load()
+        resume_commands = checkpoint.resume_commands()
+        resume_print(MarlinDevice(port), GCodeFile(TEST_FILE), journal)
+
+        commands = sent_commands(port)
+        # M110, then the commands returning printer to the checkpoint
+        assert commands[0] == "M110 N0"
+        assert [c.split(" F ")[0] for c in commands[1:len(resume_commands) + 1]] == resume_commands
+        assert commands[len(resume_commands) + 1:] == expected[sent:]
+        assert journal.load() is None
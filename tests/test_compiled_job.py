@@ -0,0 +1,72 @@
+import pytest
+
+from g_code_file_handler.g_code_file import GCodeFile
+from printer_device_connector.compiled_job import CompiledJob
+from printer_device_connector.marlin_device import MarlinDevice
+from tests.test_marin_device import FakeSerial
+
+
+class TestCompiledJob:
+    def test_lines_match_send_path_format(self):
+        job = CompiledJob.compile(["G28", "G1 X1 Y2 Z3 ; first point", "", "G1 X4 F1800"], first_line_number=7)
+
+        assert len(job) == 3
+        assert job.lines[0] == bytes(MarlinDevice.cs_line("N7 G28 F 900 N7") + "\n", "ascii")
+        assert job.lines[2] == bytes(MarlinDevice.cs_line("N9 G1 X4 F1800 N9") + "\n", "ascii")
+        assert job.final_position == (4, 2, 3)
+
+    def test_save_and_load(self, tmp_path):
+        job = CompiledJob.compile(GCodeFile("assets/anycubic_cobra_testing_block.gcode").commands())
+        job.save(str(tmp_path / "job.cjob"))
+
+        loaded = CompiledJob.load(str(tmp_path / "job.cjob"))
+
+        assert loaded.lines == job.lines
+        assert loaded.first_line_number == job.first_line_number
+        assert loaded.final_position == job.final_position
+        assert loaded.final_state.to_dict() == job.final_state.to_dict()
+
+    def test_load_not_compiled_job(self):
+        with pytest.raises(ValueError):
+            CompiledJob.load("assets/stepper.gcode")
+
+
+class TestStreamJob:
+    def test_job_outside_work_area_is_not_sent(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        job = CompiledJob.compile(["G28", "G1 X10 Y10 Z1", "G91", "G1 X300"])
+
+        with pytest.raises(ValueError):
+            printer.stream_job(job)
+
+        assert port.written == []
+
+    def test_state_after_job(self):
+        printer = MarlinDevice(FakeSerial())
+        printer.stream(["G28", "G1 X10 Y10 Z1"])
+        job = CompiledJob.compile(["G91", "G1 X5", "G92 Y0", "M83", "G1 X1 E2 F1200", "M104 S200"])
+
+        printer.stream_job(job)
+
+        assert job.final_state.relative and job.final_state.relative_extrusion
+        assert printer.get_current_position() == (16, 0, 1)
+        assert printer.state.machine_position == (16, 10, 1)
+        assert printer.state.relative and printer.state.relative_extrusion
+        assert printer.state.e == 2
+        assert printer.state.feedrate == 1200
+        assert printer.state.temperatures == {"hotend": 200}
+
+    def test_stream_job_on_simulator(self):
+        simulator_module = pytest.importorskip("printer_device_connector.firmware_simulator")
+
+        with simulator_module.FirmwareSimulator(time_scale=0.01) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            job = CompiledJob.compile([f"G1 X{x} Y{x} Z1" for x in range(10)], first_line_number=100)
+
+            assert printer.stream_job(job) == 10
+            assert printer.get_current_position() == (9, 9, 1)
+
+            # device numbering continues after the job
+            printer.stream(["G1 X0 Y0 Z1"])
+            assert simulator.position == (0, 0, 1)
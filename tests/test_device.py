@@ -8,3 +8,55 @@ class TestPrinterDevice:
     def test_parse_move_command_to_position(self):
         command = "G1 X 32 Y 0.12 Z 12"
         assert Device.parse_move_command_to_position(command) == (32, 0.12, 12)
+
+    def test_predict_time_follows_motion_profile(self):
+        printer = Device()
+        printer.set_current_position(0, 0, 0)
+
+        slow = printer.predict_time_of_execution("G1 X100 F900")
+        printer._update_state("M201 X100 Y100")
+
+        assert printer.predict_time_of_execution("G1 X100 F900") > slow
+        assert printer.predict_time_of_execution("G1 X0 Y0 Z10 F900") > 10 / 12
+
+    def test_predict_time_uses_modal_state(self):
+        printer = Device()
+        absolute = printer.predict_time_of_execution("G1 X10 F900")
+
+        printer._update_state("G1 X50 F900")
+        printer._update_state("G91")
+
+        assert printer.predict_time_of_execution("G1 X10") == pytest.approx(absolute)
+        assert printer.predict_time_of_execution("G2 X0 Y0 I5") > printer.predict_time_of_execution("G1 X10")
+
+    def test_update_state_keeps_unspecified_axes(self):
+        printer = Device()
+        printer._update_state("G1 X10 Y20 Z5")
+        printer._update_state("G1 Z1")
+
+        assert printer.get_current_position() == (10, 20, 1)
+
+    def test_is_within_bounds(self):
+        printer = Device()
+        printer._update_state("G1 X200 Y10 Z10")
+
+        assert printer.is_within_bounds("G1 X220")
+        assert not printer.is_within_bounds("G1 X221")
+
+        printer._update_state("G92 X0")
+        assert not printer.is_within_bounds("G1 X21")
+
+        printer._update_state("G91")
+        assert not printer.is_within_bounds("G1 Y-11")
+
+    def test_work_area_of_profile(self):
+        printer = Device()
+        printer.profile.work_area["Y"] = (-4, 212.5)
+        printer._update_state("G1 X10 Y10 Z1")
+
+        assert printer.is_within_bounds("G1 Y-3")
+        assert not printer.is_within_bounds("G1 Y-5")
+        assert not printer.is_within_bounds("G1 Y213")
+
+        with pytest.raises(ValueError):
+            printer._check_bounds("G1 Y-5")
@@ -0,0 +1,100 @@
+import pytest
+
+from printer_device_connector.firmware_capabilities import FirmwareCapabilities
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.port_discovery import PortCache
+from tests.test_marin_device import FakeSerial
+
+MARLIN_M115 = [
+    "FIRMWARE_NAME:Marlin 2.1.2 (Jun  4 2023) SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin"
+    " PROTOCOL_VERSION:1.0 MACHINE_TYPE:Ender-3 EXTRUDER_COUNT:1 UUID:cede2a2f-41a2-4748-9b12-c55c62f367ff",
+    "Cap:SERIAL_XON_XOFF:0",
+    "Cap:AUTOREPORT_TEMP:1",
+    "Cap:EMERGENCY_PARSER:1",
+    "Cap:HOST_KEEPALIVE:1",
+    "ok N1 P15 B7",
+    "echo:M113 S2",
+    "ok N2 P15 B7",
+]
+
+PRUSA_M115 = [
+    "FIRMWARE_NAME:Prusa-Firmware 3.13.2 based on Marlin FIRMWARE_URL:https://github.com/prusa3d/Prusa-Firmware"
+    " PROTOCOL_VERSION:1.0 MACHINE_TYPE:Prusa i3 MK3S EXTRUDER_COUNT:1",
+    "Cap:AUTOREPORT_TEMP:1",
+    "Cap:EMERGENCY_PARSER:0",
+    "ok",
+]
+
+
+class TestFirmwareCapabilities:
+    def test_parse_marlin(self):
+        capabilities = FirmwareCapabilities.parse(MARLIN_M115)
+
+        assert capabilities.firmware_name == "Marlin"
+        assert capabilities.firmware_version == (2, 1, 2)
+        assert capabilities.info["MACHINE_TYPE"] == "Ender-3"
+        assert capabilities.autoreport_temp and capabilities.emergency_parser and capabilities.advanced_ok
+        assert not capabilities.supports("SERIAL_XON_XOFF")
+        assert capabilities.command_buffer_size == 8
+        assert capabilities.keepalive_interval == 2
+        assert capabilities.stream_window(default=4) == 8
+
+    def test_parse_prusa(self):
+        capabilities = FirmwareCapabilities.parse(PRUSA_M115)
+
+        assert capabilities.firmware_name == "Prusa-Firmware"
+        assert capabilities.firmware_version == (3, 13, 2)
+        assert capabilities.info["FIRMWARE_URL"] == "https://github.com/prusa3d/Prusa-Firmware"
+        assert not capabilities.emergency_parser and not capabilities.advanced_ok and not capabilities.host_keepalive
+        assert capabilities.stream_window(default=1) == 1
+
+    def test_round_trip_through_cache(self, tmp_path):
+        cache = PortCache(str(tmp_path / "ports.json"))
+        cache.store("USB VID:PID=2C99:0002", "/dev/ttyACM0", 250000)
+        cache.store_capabilities("USB VID:PID=2C99:0002", FirmwareCapabilities.parse(MARLIN_M115).to_dict())
+
+        cached = FirmwareCapabilities.from_dict(PortCache(cache.path).load_capabilities("USB VID:PID=2C99:0002"))
+
+        assert cached.to_dict() == FirmwareCapabilities.parse(MARLIN_M115).to_dict()
+        assert cache.load() == {"USB VID:PID=2C99:0002": ("/dev/ttyACM0", 250000)}
+        assert cache.load_capabilities("unknown") is None
+
+
+class TestTransportTuning:
+    def test_probe_tunes_window_and_silence(self, tmp_path):
+        port = FakeSerial(scripted_replies=[[bytes(line + "\n", "ascii") for line in MARLIN_M115[:6]]])
+        printer = MarlinDevice(port)
+        printer.probe_capabilities()
+
+        assert printer.stream_window == 8
+        assert printer.silence_timeout == 4
+        assert port.written[0].startswith(b"N1 M115")
+        assert port.written[1].startswith(b"N2 M113")
+
+    def test_cached_capabilities_skip_probe(self, tmp_path):
+        cache = PortCache(str(tmp_path / "ports.json"))
+        cache.store_capabilities("hwid", FirmwareCapabilities.parse(PRUSA_M115).to_dict())
+
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        printer.probe_capabilities("hwid", cache)
+
+        assert port.written == []
+        assert printer.stream_window == MarlinDevice._STREAM_WINDOW
+        # no keepalive, firmware may be silent while it heats
+        assert printer.silence_timeout > 60
+
+    @pytest.mark.parametrize("emergency_parser", [True, False])
+    def test_emergency_stop(self, emergency_parser):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        printer.set_current_position(10, 10, 10)
+        printer.apply_capabilities(FirmwareCapabilities(capabilities={"EMERGENCY_PARSER": emergency_parser}))
+
+        printer.emergency_stop()
+
+        if emergency_parser:
+            assert port.written == [b"M112\n"]
+        else:
+            assert port.written == [] and port.dtr
+        assert printer.get_current_position() == (None, None, None)
@@ -0,0 +1,300 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from serial import SerialException
+
+pytest.importorskip("tty", reason="requires pseudo-terminal")
+
+from printer_device_connector.async_device import AsyncPrusaDevice
+from printer_device_connector.device import MotionSync
+from printer_device_connector.firmware_simulator import FirmwareDialect, FirmwareSimulator
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.prusa_device import PrusaDevice
+from printer_device_connector.serial_reader import ResponseType
+
+
+class TestFirmwareSimulator:
+    def test_marlin_stream(self):
+        with FirmwareSimulator(time_scale=0.01) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            printer.stream([f"G1 X{x} Y{x} Z1" for x in range(20)])
+            printer.stream(["M400"])
+
+            assert simulator.position == (19, 19, 1)
+            assert simulator.moves_executed == 20
+
+    def test_marlin_resend(self):
+        with FirmwareSimulator(time_scale=0.01, corrupt_every=5) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            printer.stream([f"G1 X{x} Y1 Z1" for x in range(20)], window=2)
+
+            assert simulator.checksum_errors > 0
+            assert printer.resend_buffer.lines_resent > 0
+            assert simulator.position == (19, 1, 1)
+
+    def test_busy_keepalive_while_homing(self):
+        with FirmwareSimulator(time_scale=0.01, keepalive_interval=0.5) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            reader = printer.start_reader()
+            printer.stream(["G1 X200 Y200 Z10", "G28"], window=1)
+            printer.stop_reader()
+
+            assert len(reader.queues[ResponseType.BUSY]) > 0
+
+    def test_prusa_dialect(self):
+        async def home():
+            with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.01) as simulator:
+                printer = await AsyncPrusaDevice.connect(simulator.port, timeout=0.2)
+                resp = await printer.send("G28")
+                await printer.close()
+                return resp
+
+        assert asyncio.run(home()) == "ok"
+
+
+    def test_prusa_stream(self):
+        with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.01, keepalive_interval=100) as simulator:
+            printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+            printer.stream([f"G1 X{x} Y{x} Z1" for x in range(20)], window=3)
+            printer.stream(["M400"])
+
+            assert simulator.position == (19, 19, 1)
+            assert printer.get_current_position() == (19, 19, 1)
+
+            # skip parking sequence of PrusaDevice.__del__
+            printer._device.close()
+            printer._device = None
+
+    def test_prusa_busy_is_awaited_without_sleeping(self):
+        with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.05, keepalive_interval=0.5) as simulator:
+            printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+            printer.stream(["G1 X200 Y200 Z10"])
+
+            started = time.monotonic()
+            printer._send_sync_command("G28")
+            elapsed = time.monotonic() - started
+
+            assert simulator.position == (0, 0, 0)
+            # busy message every 25 ms, previously each one cost 2 s sleep
+            assert elapsed < 2.5
+            assert printer.busy_time_by_command["G28"] > 0.5
+            assert printer.keepalive_interval == pytest.approx(0.025, abs=0.02)
+
+            # skip parking sequence of PrusaDevice.__del__
+            printer._device.close()
+            printer._device = None
+
+
+    def test_prusa_busy_is_accounted_with_reader(self):
+        with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.05, keepalive_interval=0.5) as simulator:
+            printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+            printer.start_reader()
+            printer.stream(["G1 X200 Y200 Z10"])
+
+            printer._send_sync_command("G28")
+            printer.stop_reader()
+
+            assert simulator.position == (0, 0, 0)
+            assert printer.busy_time_by_command["G28"] > 0.5
+            assert printer.keepalive_interval == pytest.approx(0.025, abs=0.02)
+            assert printer.silence_timeout == pytest.approx(2 * printer.keepalive_interval)
+
+            # skip parking sequence of PrusaDevice.__del__
+            printer._device.close()
+            printer._device = None
+
+
+class TestMotionSync:
+    @pytest.mark.parametrize("motion_sync", [MotionSync.M400, MotionSync.M114])
+    def test_marlin_returns_once_head_arrived(self, motion_sync):
+        with FirmwareSimulator(time_scale=0.05) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.5)
+            printer.set_current_position(0, 0, 0)
+            printer.motion_sync = motion_sync
+
+            printer.send_and_await("G1 X100 Y50")
+            assert simulator.stepper_position == (100, 50, 0)
+
+            printer.send_and_await("G1 Z5")
+            assert simulator.stepper_position == (100, 50, 5)
+            assert printer.time_saved > 0
+
+    def test_prusa_m400(self):
+        with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.05, keepalive_interval=100) as simulator:
+            printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+            printer.set_current_position(0, 0, 0)
+            printer.motion_sync = MotionSync.M400
+
+            printer.send_and_await("G1 X100 Y50")
+            assert simulator.stepper_position == (100, 50, 0)
+            assert printer.last_time_saved > 0
+
+            # skip parking sequence of PrusaDevice.__del__
+            printer._device.close()
+            printer._device = None
+
+class TestCapabilities:
+    def test_marlin_window_follows_command_buffer(self):
+        # board with bigger buffers, RX buffer holds the whole window
+        with FirmwareSimulator(time_scale=0.01, command_buffer_size=8, rx_buffer_size=512) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            printer.stream([f"G1 X{x} Y1 Z1" for x in range(20)])
+            printer.stream(["M400"])
+
+            assert printer.capabilities.emergency_parser
+            assert printer.capabilities.keepalive_interval == 2
+            assert printer.stream_window == 8
+            assert simulator.rx_overflows == 0
+            assert simulator.moves_executed == 20
+
+    def test_prusa_keeps_default_window(self):
+        with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.01, keepalive_interval=100) as simulator:
+            printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+
+            assert printer.capabilities.firmware_name == "Prusa-Firmware"
+            assert not printer.capabilities.emergency_parser
+            assert printer.stream_window == 1
+
+            # skip parking sequence of PrusaDevice.__del__
+            printer._device.close()
+            printer._device = None
+
+
+class TestRealtimeCommands:
+    def test_quickstop_mid_move(self):
+        with FirmwareSimulator() as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.5)
+            printer.set_current_position(0, 0, 0)
+            # about 13 s long move, sender sleeps on its predicted time
+            sender = threading.Thread(target=printer.send_and_await, args=("G1 X200",))
+            sender.start()
+            time.sleep(0.3)
+
+            latency = printer.send_realtime("M410")
+            sender.join(timeout=2)
+            time.sleep(0.1)
+
+            assert not sender.is_alive()
+            assert latency < 0.05
+            assert simulator.quickstops == 1
+            assert 0 < simulator.stepper_position[0] < 50
+            assert printer.query_position() == pytest.approx(simulator.stepper_position, abs=0.01)
+
+
+class TestSendBatch:
+    @pytest.mark.parametrize("dialect", [FirmwareDialect.MARLIN, FirmwareDialect.PRUSA])
+    def test_dense_moves_fit_rx_buffer(self, dialect):
+        moves = [f"G1 X{x % 2} Y{x % 3} F6000" for x in range(60)]
+
+        with FirmwareSimulator(dialect, time_scale=0.01, keepalive_interval=100) as simulator:
+            if dialect == FirmwareDialect.MARLIN:
+                printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.5)
+            else:
+                printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+            writes = printer.write_calls
+
+            assert printer.send_batch(moves) == 60
+            printer.stream(["M400"])
+
+            assert simulator.rx_overflows == 0
+            assert simulator.checksum_errors == 0
+            assert simulator.position == (1, 2, 0)
+            assert printer.write_calls - writes < 60
+
+            if dialect == FirmwareDialect.PRUSA:
+                # skip parking sequence of PrusaDevice.__del__
+                printer._device.close()
+                printer._device = None
+
+
+class TestSupervisor:
+    def test_stream_resumes_after_board_reset(self):
+        with FirmwareSimulator(time_scale=0.01) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            supervisor = printer.supervise(backoff=0.05)
+
+            def moves():
+                for x in range(30):
+                    if x == 10:
+                        simulator.reset()
+                    yield f"G1 X{x} Y1 Z1"
+
+            assert printer.stream(moves()) == 30
+            printer.stream(["M400"])
+
+            assert supervisor.reconnects == 1
+            assert supervisor.commands_replayed > 0
+            assert simulator.position == (29, 1, 1)
+            assert printer.get_current_position() == (29, 1, 1)
+
+    def test_board_reset_is_noticed_by_reader(self):
+        with FirmwareSimulator(time_scale=0.01) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            printer.start_reader()
+            supervisor = printer.supervise(backoff=0.05)
+            printer.stream(["G28"])
+
+            def moves():
+                for x in range(30):
+                    if x == 10:
+                        simulator.reset()
+                    yield f"G1 X{x} Y1 Z1"
+
+            started = time.monotonic()
+            assert printer.stream(moves()) == 30
+            printer.stream(["M400"])
+
+            # banner ends stream at once, session is restored as after reset: axes are homed again
+            assert time.monotonic() - started < 2
+            assert supervisor.reconnects == 1
+            assert sum("G28" in line for line in simulator.received_lines) == 2
+            assert simulator.position == (29, 1, 1)
+            assert printer.reader is not None
+            printer.stop_reader()
+
+    def test_stream_resumes_after_lost_connection(self):
+        with FirmwareSimulator(time_scale=0.01) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            supervisor = printer.supervise(backoff=0.1)
+
+            def moves():
+                for x in range(30):
+                    if x == 10:
+                        printer._device.close()
+                    yield f"G1 X{x} Y2 Z1"
+
+            assert printer.send_batch(moves()) == 30
+            printer.stream(["M400"])
+
+            assert supervisor.reconnects == 1
+            assert simulator.position == (29, 2, 1)
+
+    def test_prusa_command_is_sent_again_after_reset(self):
+        with FirmwareSimulator(FirmwareDialect.PRUSA, time_scale=0.01, keepalive_interval=100) as simulator:
+            printer = PrusaDevice.connect_on_port(simulator.port, timeout=0.5)
+            supervisor = printer.supervise(backoff=0.05)
+            printer.stream(["G28", "G1 X10 Y10 Z5"])
+
+            simulator.reset()
+            printer.send_and_await("G1 X20 Y20 Z5")
+            printer.stream(["M400"])
+
+            assert supervisor.reconnects == 1
+            assert simulator.position == (20, 20, 5)
+
+            # skip parking sequence of PrusaDevice.__del__
+            printer._device.close()
+            printer._device = None
+
+    def test_gives_up_after_max_attempts(self):
+        with FirmwareSimulator(time_scale=0.01) as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+            supervisor = printer.supervise(backoff=0.01, max_attempts=2)
+            supervisor.port = "/dev/nonexistent"
+            printer._device.close()
+
+            with pytest.raises(SerialException):
+                printer.stream(["G1 X1 Y1 Z1"])
+            assert supervisor.failed_attempts == 2
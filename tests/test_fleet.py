@@ -0,0 +1,89 @@
+import pytest
+
+from printer_device_connector.device_mock import PrinterDeviceMock
+from printer_device_connector.fleet import PrinterFleet, PrinterState
+
+
+class TestPrinterFleet:
+    def test_printers_run_concurrently(self):
+        simulator_module = pytest.importorskip("printer_device_connector.firmware_simulator")
+        from printer_device_connector.marlin_device import MarlinDevice
+
+        with simulator_module.FirmwareSimulator(time_scale=0.01) as first, \
+                simulator_module.FirmwareSimulator(time_scale=0.01) as second:
+            with PrinterFleet() as fleet:
+                fleet.add("first", MarlinDevice.connect_on_port(first.port, timeout=0.5))
+                fleet.add("second", MarlinDevice.connect_on_port(second.port, timeout=0.5))
+
+                fleet.broadcast(["G28"])
+                fleet.stream("first", [f"G1 X{x} Y1 Z1" for x in range(10)])
+                fleet.stream("second", [f"G1 X1 Y{y} Z2" for y in range(5)])
+                fleet.stream("second", ["M400"])
+                fleet.stream("first", ["M400"])
+
+                assert fleet.wait(timeout=10)
+                status = fleet.status()
+
+            # numbering of each printer starts over after M110 N0, sent after capability probe
+            assert any(line.startswith("N0 M110 N0") for line in first.received_lines)
+            assert any(line.startswith("N0 M110 N0") for line in second.received_lines)
+            assert first.position == (9, 1, 1)
+            assert second.position == (1, 4, 2)
+
+        assert status["first"].state == PrinterState.IDLE
+        assert status["first"].completed_jobs == 3
+        assert status["second"].position == (1, 4, 2)
+
+    def test_supervised_printer_probes_and_survives_reset(self):
+        simulator_module = pytest.importorskip("printer_device_connector.firmware_simulator")
+        from printer_device_connector.marlin_device import MarlinDevice
+
+        with simulator_module.FirmwareSimulator(time_scale=0.01) as simulator:
+            with PrinterFleet() as fleet:
+                printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.2)
+                fleet.add("marlin", printer)
+                supervisor = printer.supervise(backoff=0.05)
+
+                # capabilities and echo reply of M113 reach sender through running reader
+                probe = fleet.submit("marlin", lambda device: device.probe_capabilities(refresh=True))
+                assert fleet.wait(timeout=10)
+                capabilities = probe.result()
+                assert capabilities.emergency_parser
+                assert capabilities.keepalive_interval == 2
+
+                def moves():
+                    for x in range(20):
+                        if x == 10:
+                            simulator.reset()
+                        yield f"G1 X{x} Y1 Z1"
+
+                fleet.stream("marlin", ["G28"])
+                streamed = fleet.submit("marlin", lambda device: device.stream(moves()))
+                fleet.stream("marlin", ["M400"])
+                assert fleet.wait(timeout=10)
+                assert streamed.result() == 20
+
+            assert supervisor.reconnects == 1
+            assert sum("G28" in line for line in simulator.received_lines) == 2
+            assert simulator.position == (19, 1, 1)
+
+    def test_failed_job_cancels_queued_jobs(self):
+        def fail(device):
+            raise RuntimeError("disconnected")
+
+        with PrinterFleet() as fleet:
+            fleet.add("mock", PrinterDeviceMock())
+            failed = fleet.submit("mock", fail)
+            queued = fleet.send("mock", "G28")
+
+            fleet.wait(timeout=5)
+
+            assert isinstance(failed.exception(), RuntimeError)
+            assert isinstance(queued.exception(), RuntimeError)
+            assert fleet.status()["mock"].state == PrinterState.FAILED
+
+    def test_duplicated_name(self):
+        with PrinterFleet() as fleet:
+            fleet.add("mock", PrinterDeviceMock())
+            with pytest.raises(ValueError):
+                fleet.add("mock", PrinterDeviceMock())
@@ -0,0 +1,56 @@
+import pytest
+
+from printer_device_connector.gcode_parser import GCodeCommand, _parse_plain_move, parse_line, parse_lines
+
+
+class TestGCodeParser:
+    @pytest.mark.parametrize(
+        "example",
+        (
+            ("G1 X 32 Y 0.12 Z 12", GCodeCommand("G1", {"X": 32, "Y": 0.12, "Z": 12})),
+            ("g01 x1.5 e-.2 f1800", GCodeCommand("G1", {"X": 1.5, "E": -0.2, "F": 1800})),
+            ("G2 X10 Y10 I5 J0", GCodeCommand("G2", {"X": 10, "Y": 10, "I": 5, "J": 0})),
+            ("G28 W", GCodeCommand("G28", {"W": None})),
+            ("M862.3 P \"MK3S\"", GCodeCommand("M862.3", {"P": None})),
+            ("G1 Z0.2 ; lift nozzle", GCodeCommand("G1", {"Z": 0.2}, comment="lift nozzle")),
+            ("G1 X5 (move to x) Y2", GCodeCommand("G1", {"X": 5, "Y": 2}, comment="move to x")),
+            ("N12 G1 X1 F 900 N12*98", GCodeCommand("G1", {"X": 1, "F": 900}, line_number=12)),
+            ("; only comment with X1 Y2", GCodeCommand(comment="only comment with X1 Y2")),
+        ),
+    )
+    def test_parse_line(self, example):
+        line, expected_command = example
+        assert parse_line(line) == expected_command
+
+    @pytest.mark.parametrize(
+        "example",
+        (
+            ("G1 X10.5 Y-3 E.2 F1800\n", GCodeCommand("G1", {"X": 10.5, "Y": -3, "E": 0.2, "F": 1800})),
+            ("G00 Z+1.", GCodeCommand("G0", {"Z": 1})),
+            ("G1 X1E5", GCodeCommand("G1", {"X": 1, "E": 5})),
+            ("G1 X1 X2", GCodeCommand("G1", {"X": 1})),
+            ("G1 X1*57", GCodeCommand("G1", {"X": 1})),
+            ("G1 X1 N5", GCodeCommand("G1", {"X": 1})),
+        ),
+    )
+    def test_plain_move_matches_tokenizer(self, example):
+        line, expected_command = example
+        assert parse_line(line) == expected_command
+
+    @pytest.mark.parametrize("line", ("G1 X1E5", "G1 X1 X2", "G1 X 32", "G1 X1;", "G1 XINF", "g1 x1", "G28 X"))
+    def test_plain_move_fast_path_leaves_other_lines_to_tokenizer(self, line):
+        assert _parse_plain_move(line) is None
+
+    def test_command_properties(self):
+        command = parse_line("G0 X1 Y2 F600")
+
+        assert command.is_move
+        assert command.position == (1, 2, None)
+        assert command.feedrate == 600
+
+    def test_parse_lines_skips_empty_lines(self):
+        with open("assets/testing_block_0.1mm_PLA_MK3S_9m.gcode") as file:
+            commands = parse_lines(file)
+
+        assert len(commands) > 0
+        assert all(command.code != "" or command.comment is not None for command in commands)
@@ -0,0 +1,237 @@
+import threading
+import time
+
+import pytest
+
+from printer_device_connector.device import Device
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.jog import ContinuousJog, JogWorker
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.trajectory import Point3D
+from tests.test_marin_device import FakeSerial
+
+
+class GatedDevice(Device):
+    """
+    Device stand-in, every command blocks until test lets it through.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+        self.gate = threading.Semaphore(0)
+        self.started = threading.Event()
+
+    def send_and_await(self, command: str) -> str:
+        self.started.set()
+        self.gate.acquire()
+        self.sent.append(command)
+        self._update_state(command)
+        return "ok"
+
+    @staticmethod
+    def connect_on_port(port, baudrate=250000, timeout=5):
+        return GatedDevice()
+
+    @staticmethod
+    def connect():
+        return GatedDevice()
+
+    def startup_procedure(self):
+        pass
+
+
+class TestJogWorker:
+    def test_presses_during_move_are_merged(self):
+        printer = GatedDevice()
+        positions = []
+
+        with JogWorker(printer, on_position=positions.append) as worker:
+            worker.jog(x=1)
+            printer.started.wait(1)
+            for _ in range(20):
+                worker.jog(x=1)
+            worker.jog(y=2)
+
+            printer.gate.release(2)
+            assert worker.wait(1)
+
+        assert printer.sent == ["G1 X1 Y0 Z0", "G1 X21 Y2 Z0"]
+        assert worker.requests == 22
+        assert positions[-1] == (21, 2, 0)
+
+    def test_latest_target_wins(self):
+        printer = GatedDevice()
+
+        with JogWorker(printer) as worker:
+            worker.jog(z=1)
+            printer.started.wait(1)
+            worker.move_to(10, 10, 10)
+            worker.move_to(20, 20, 5)
+
+            printer.gate.release(2)
+            assert worker.wait(1)
+
+        assert printer.sent == ["G1 X0 Y0 Z1", "G1 X20 Y20 Z5"]
+
+    def test_targets_clamped_to_work_area(self):
+        printer = GatedDevice()
+        printer.gate.release(10)
+
+        with JogWorker(printer) as worker:
+            worker.jog(x=-5, z=500)
+            assert worker.wait(1)
+
+        assert printer.sent == [f"G1 X0 Y0 Z{printer.z_size}"]
+
+    def test_clamped_work_area_follows_offset(self):
+        printer = GatedDevice()
+        printer._update_state("G92 X10")
+        printer.gate.release(10)
+
+        with JogWorker(printer) as worker:
+            worker.jog(x=-20)
+            assert worker.wait(1)
+
+        assert len(printer.sent) == 1
+        assert parse_line(printer.sent[0]).position == (10, 0, 0)
+
+    def test_home_drops_pending_target(self):
+        printer = GatedDevice()
+
+        with JogWorker(printer) as worker:
+            worker.jog(x=5)
+            printer.started.wait(1)
+            worker.jog(x=5)
+            worker.home()
+            worker.jog(y=1)
+
+            printer.gate.release(3)
+            assert worker.wait(1)
+
+        assert printer.sent == ["G1 X5 Y0 Z0", "G28", "G1 X0 Y1 Z0"]
+
+    def test_errors_reported(self):
+        errors = []
+
+        class FailingDevice(GatedDevice):
+            def send_and_await(self, command):
+                raise TimeoutError(command)
+
+        with JogWorker(FailingDevice(), on_error=errors.append) as worker:
+            worker.jog(x=1)
+            assert worker.wait(1)
+
+        assert len(errors) == 1
+
+    def test_increment_refused_while_position_unknown(self):
+        printer = GatedDevice()
+        printer.state = MachineState(Point3D(None, None, None))
+        printer.gate.release(10)
+
+        with JogWorker(printer) as worker:
+            assert worker.target is None
+            with pytest.raises(ValueError):
+                worker.jog(x=1)
+
+            # increment requested while homing starts from homed position
+            worker.home()
+            worker.jog(x=1)
+            assert worker.wait(1)
+
+        assert printer.sent == ["G28", "G1 X1 Y0 Z0"]
+
+    def test_increment_after_quickstop_is_reported(self):
+        errors = []
+
+        class QuickstopDevice(GatedDevice):
+            def send_and_await(self, command):
+                result = super().send_and_await(command)
+                if command == "M410":
+                    self.state = MachineState(Point3D(None, None, None))
+                return result
+
+        printer = QuickstopDevice()
+        printer.gate.release(10)
+
+        with JogWorker(printer, on_error=errors.append) as worker:
+            worker.jog(x=5)
+            assert worker.wait(1)
+            worker.send("M410")
+            worker.jog(x=1)
+            assert worker.wait(1)
+
+            with pytest.raises(ValueError):
+                worker.jog(x=1)
+
+        assert printer.sent == ["G1 X5 Y0 Z0", "M410"]
+        assert len(errors) == 1 and isinstance(errors[0], ValueError)
+
+
+class DelayedDevice(GatedDevice):
+    """
+    Device stand-in, every command takes `delay` seconds.
+    """
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def send_and_await(self, command: str) -> str:
+        time.sleep(self.delay)
+        self.sent.append(command)
+        self._update_state(command)
+        return "ok"
+
+
+def segment_ends(commands):
+    return [parse_line(command).position for command in commands]
+
+
+class TestContinuousJog:
+    def test_streams_segments_to_target(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        with ContinuousJog(printer, feedrate=600, min_segment=1, max_segment=1) as jog:
+            jog.follow(10, 0, 0)
+            assert jog.wait(1)
+
+        assert printer.get_current_position() == (10, 0, 0)
+        assert len(port.written) == 10
+        assert port.max_in_flight <= jog.queue_depth
+
+    def test_stale_targets_dropped(self):
+        printer = DelayedDevice(delay=0.05)
+
+        with ContinuousJog(printer, min_segment=100, max_segment=100) as jog:
+            jog.follow(1, 1, 1)
+            time.sleep(0.01)
+            for x in range(2, 20):
+                jog.follow(x, 1, 1)
+            assert jog.wait(1)
+
+        assert segment_ends(printer.sent) == [(1, 1, 1), (19, 1, 1)]
+        assert jog.targets_dropped == 17
+
+    def test_segment_length_follows_latency(self):
+        printer = DelayedDevice(delay=0.02)
+
+        with ContinuousJog(printer, feedrate=6000, queue_depth=1, max_segment=50) as jog:
+            jog.follow(40, 0, 0)
+            assert jog.wait(5)
+
+        # 100 mm/s * 20 ms
+        assert jog.latency == pytest.approx(0.02, abs=0.01)
+        assert jog.segment_length == pytest.approx(2, abs=1)
+        assert len(printer.sent) < 40 / jog.min_segment
+
+    def test_head_stays_in_work_area(self):
+        printer = DelayedDevice(delay=0)
+
+        with ContinuousJog(printer, max_segment=1000) as jog:
+            jog.follow(-10, 500, 5)
+            assert jog.wait(1)
+
+        assert printer.get_current_position() == (0, printer.y_size, 5)
@@ -0,0 +1,42 @@
+from collections import deque
+
+from printer_device_connector.line_protocol import LineProtocol, Reply
+from printer_device_connector.marlin_device import MarlinDevice
+
+
+class TestLineProtocol:
+    def test_prepare_numbered_line(self):
+        protocol = LineProtocol()
+
+        assert protocol.prepare("G28", speed=900) == MarlinDevice.cs_line("N1 G28 F 900 N1") + "\n"
+        assert protocol.prepare("G1 X1 F1200", speed=900) == MarlinDevice.cs_line("N2 G1 X1 F1200 N2") + "\n"
+        assert protocol.line_counter == 3
+
+    def test_prepare_not_numbered_line(self):
+        protocol = LineProtocol(numbered=False)
+
+        assert protocol.prepare("G28", speed=900) == "G28 F 900\n"
+        assert protocol.sent("G28 F 900\n") == 1
+        assert protocol.sent("G28 F 900\n") == 2
+
+    def test_resend_request(self):
+        protocol = LineProtocol()
+        in_flight = deque(protocol.sent(protocol.prepare(f"G1 X{x}", speed=900)) for x in range(3))
+
+        assert protocol.receive("Error:checksum mismatch, Last Line: 1", in_flight) == (Reply.SKIPPED, [])
+        reply, lines = protocol.receive("Resend: 2", in_flight)
+
+        assert reply == Reply.RESEND
+        assert [line.split()[0] for line in lines] == ["N2", "N3"]
+        assert list(in_flight) == [1, 2, 3]
+        # 'ok' of resend request acknowledges no line
+        assert protocol.receive("ok", in_flight) == (Reply.SKIPPED, [])
+        assert protocol.receive("ok", in_flight) == (Reply.ACKNOWLEDGEMENT, [])
+
+    def test_other_replies(self):
+        protocol = LineProtocol(numbered=False)
+
+        assert protocol.receive("start") == (Reply.RESET, [])
+        assert protocol.receive("echo:busy: processing") == (Reply.MESSAGE, [])
+        # not numbered lines are never requested again
+        assert protocol.receive("Resend: 1") == (Reply.MESSAGE, [])
@@ -0,0 +1,115 @@
+import math
+
+import pytest
+
+from printer_device_connector.gcode_parser import parse_line
+from printer_device_connector.machine_state import MachineState
+from printer_device_connector.trajectory import Point3D
+
+
+def apply(state, *commands):
+    for command in commands:
+        state.apply(parse_line(command))
+    return state
+
+
+class TestMachineState:
+    def test_missing_axes_keep_position(self):
+        state = apply(MachineState(), "G1 X10 Y20 Z5", "G0 Z7")
+
+        assert state.position.as_tuple() == (10, 20, 7)
+
+    def test_relative_positioning(self):
+        state = apply(MachineState(), "G1 X10 Y10 Z10", "G91", "G1 X1 Z-2", "G1 X1", "G90", "G1 Y0")
+
+        assert state.position.as_tuple() == (12, 0, 8)
+
+    def test_relative_move_from_unknown_position(self):
+        state = apply(MachineState(Point3D(None, None, None)), "G91", "G1 X1", "G90", "G1 Y2")
+
+        assert state.position.as_tuple() == (None, 2, None)
+
+    def test_extruder_modes(self):
+        state = apply(MachineState(), "M83", "G1 E1", "G1 E1", "G90", "G1 E1")
+        assert state.e == 3
+
+        state = apply(MachineState(), "G1 E5", "G91", "G1 E1")
+        assert state.e == 6
+
+    def test_inches(self):
+        state = apply(MachineState(), "G20", "G1 X1 F10", "G21", "G1 Y1")
+
+        assert state.position.as_tuple() == (25.4, 1, 0)
+        assert state.feedrate == pytest.approx(254)
+
+    def test_set_position_shifts_coordinates(self):
+        state = apply(MachineState(), "G1 X50 Y50 Z5", "G92 X0 Y0", "G1 X10")
+
+        assert state.position.as_tuple() == (10, 0, 5)
+        assert state.machine_position == (60, 50, 5)
+
+        apply(state, "G28 X")
+        assert state.machine_position == (0, 50, 5)
+
+    def test_homing_selected_axes(self):
+        state = apply(MachineState(Point3D(None, None, None)), "G28 X Y")
+
+        assert state.position.as_tuple() == (0, 0, None)
+
+    def test_temperatures_replaced_on_change(self):
+        state = apply(MachineState(), "M140 S60")
+        before = state.temperatures
+
+        apply(state, "M109 S210")
+
+        assert before == {"bed": 60}
+        assert state.temperatures == {"bed": 60, "hotend": 210}
+
+    def test_not_tracked_command(self):
+        assert not MachineState().apply(parse_line("M201 X1000"))
+        assert MachineState().apply(parse_line("G91"))
+
+
+class TestArcs:
+    def test_arc_with_center_offset(self):
+        state = apply(MachineState(), "G1 X10 Y0 Z0")
+
+        arc = state.arc_path(parse_line("G3 X0 Y10 I-10 J0"))
+
+        assert arc[-1] == (0, 10, 0)
+        assert len(arc) == math.ceil(math.pi / 2 * 10)
+        assert all(math.hypot(x, y) == pytest.approx(10) for x, y, _ in arc)
+
+        state.apply(parse_line("G3 X0 Y10 I-10 J0"))
+        assert state.position.as_tuple() == (0, 10, 0)
+
+    def test_clockwise_arc_goes_the_other_way(self):
+        state = apply(MachineState(), "G1 X10 Y0 Z0")
+
+        arc = state.arc_path(parse_line("G2 X0 Y10 I-10 J0"))
+
+        # three quarters of circle, through negative y
+        assert min(y for _, y, _ in arc) == pytest.approx(-10, abs=0.1)
+        assert len(arc) == math.ceil(3 * math.pi / 2 * 10)
+
+    def test_arc_with_radius(self):
+        state = apply(MachineState(), "G1 X10 Y0 Z0")
+
+        short = state.arc_path(parse_line("G3 X0 Y10 R10"))
+        long = state.arc_path(parse_line("G3 X0 Y10 R-10"))
+
+        assert all(math.hypot(x, y) == pytest.approx(10) for x, y, _ in short)
+        assert len(long) > len(short)
+
+    def test_full_circle_helix(self):
+        state = apply(MachineState(), "G1 X10 Y0 Z0")
+
+        arc = state.arc_path(parse_line("G2 I-10 Z2"))
+
+        assert arc[-1] == (10, 0, 2)
+        assert len(arc) == math.ceil(2 * math.pi * 10)
+        assert arc[len(arc) // 2][2] == pytest.approx(1, abs=0.05)
+
+    def test_arc_without_center(self):
+        with pytest.raises(ValueError):
+            MachineState().arc_path(parse_line("G2 X10 Y10"))
@@ -1,13 +1,19 @@
+import threading
+import time
+
 import pytest
+from serial import SerialException
+
+from printer_device_connector.device import MotionSync
 from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.serial_reader import ResponseType
 
 
 class TestMarlinDevice:
     def test_no_line(self):
         lines = ("0", "1", "2", "G1")
-        numbered_lines = ("N00N0", "N11N1", "N22N2", "N3G1N3")
-        for l, n in zip(lines, numbered_lines):
-            n == MarlinDevice.no_line(l)
+        for i, l in enumerate(lines):
+            assert MarlinDevice.no_line(l, i) == f"N{i} {l} N{i}"
 
     @pytest.mark.parametrize(
         "example", (("0", 48), ("1", 49), ("2", 50), ("G1", 118), ("N1G1N1", 118))
@@ -29,3 +35,267 @@ class TestMarlinDevice:
     def test_cs_line(self, example):
         test, expected_value = example
         assert expected_value == MarlinDevice.cs_line(test)
+
+
+class FakeSerial:
+    """
+    In-memory stand-in for pyserial port, answers every written line with 'ok'.
+    """
+
+    port = "fake"
+    baudrate = 250000
+    timeout = 0.1
+
+    def __init__(self, replies_per_line=(b"ok\n",), scripted_replies=()):
+        self.replies_per_line = replies_per_line
+        self.scripted_replies = list(scripted_replies)
+        self.written = []
+        self.replies = []
+        self.max_in_flight = 0
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        # batched write holds several lines, each one is answered
+        for _ in range(max(bytes(data).count(b"\n"), 1)):
+            if len(self.scripted_replies) > 0:
+                self.replies.extend(self.scripted_replies.pop(0))
+            else:
+                self.replies.extend(self.replies_per_line)
+        self.max_in_flight = max(self.max_in_flight, self.replies.count(b"ok\n"))
+        return len(data)
+
+    @property
+    def lines(self):
+        """
+        Written lines, batched writes are split.
+        """
+        return b"".join(self.written).splitlines(keepends=True)
+
+    @property
+    def in_waiting(self):
+        return sum(len(reply) for reply in self.replies)
+
+    def readline(self):
+        if len(self.replies) == 0:
+            return b""
+        return self.replies.pop(0)
+
+    def close(self):
+        pass
+
+
+class TestMarlinDeviceStream:
+    def test_stream_sends_all_lines(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        sent = printer.stream([f"G1 X{x} Y0 Z0" for x in range(10)], window=3)
+
+        assert sent == 10
+        assert len(port.written) == 10
+        assert printer.get_current_position() == (9, 0, 0)
+
+    def test_stream_keeps_window_bounded(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        printer.stream([f"G1 X{x} Y0 Z0" for x in range(10)], window=3)
+
+        assert port.max_in_flight == 3
+
+    def test_stream_skips_unsolicited_messages(self):
+        port = FakeSerial(replies_per_line=(b"echo:busy: processing\n", b"ok\n"))
+        printer = MarlinDevice(port)
+
+        assert printer.stream(["G28", "G1 X1 Y1 Z1"], window=1) == 2
+
+    def test_send_rejects_move_outside_work_area(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        with pytest.raises(ValueError):
+            printer.send_and_await(f"G1 X{printer.x_size + 1} Y0 Z0")
+
+        assert port.written == []
+        assert printer.line_counter == 1
+
+    def test_stream_stops_at_move_outside_work_area(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        with pytest.raises(ValueError):
+            printer.stream(["G1 X1 Y0 Z0", "G1 X2 Y0 Z0", "G1 X-1 Y0 Z0", "G1 X3 Y0 Z0"], window=4)
+
+        assert len(port.lines) == 2
+        assert printer.get_current_position() == (2, 0, 0)
+
+    def test_stream_lines_sends_lines_as_they_are(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        assert printer.stream_lines(["M83", "G1 X1 Y2 E0.5", "M104 S200"]) == 3
+
+        assert port.lines == [
+            bytes(MarlinDevice.cs_line(MarlinDevice.no_line(line, number)) + "\n", "ascii")
+            for number, line in enumerate(["M83", "G1 X1 Y2 E0.5", "M104 S200"], start=1)
+        ]
+        assert printer.get_current_position() == (1, 2, 0)
+        assert printer.state.e == 0.5
+
+    def test_stream_raises_without_acknowledgement(self):
+        printer = MarlinDevice(FakeSerial(replies_per_line=()))
+
+        with pytest.raises(SerialException):
+            printer.stream(["G28"], window=1)
+
+    def test_stream_retransmits_requested_lines(self):
+        first_line = 1
+        # corrupted first line: error, resend request and its own 'ok' arrive before acknowledgement
+        port = FakeSerial(
+            scripted_replies=(
+                (
+                    b"Error:checksum mismatch, Last Line: 0\n",
+                    bytes(f"Resend: {first_line}\n", "ascii"),
+                    b"ok\n",
+                ),
+            )
+        )
+        printer = MarlinDevice(port)
+
+        printer.stream(["G1 X1 Y1 Z1"], window=1)
+
+        assert len(port.written) == 2
+        assert port.written[0] == port.written[1]
+        assert printer.resend_buffer.lines_resent == 1
+        assert port.replies == []
+
+    def test_stream_with_reader(self):
+        port = FakeSerial(replies_per_line=(b"T:21.0 /0.0 B:20.0 /0.0 @:0\n", b"ok\n"))
+        printer = MarlinDevice(port)
+        reader = printer.start_reader()
+
+        assert printer.stream([f"G1 X{x} Y0 Z0" for x in range(5)], window=2) == 5
+
+        printer.stop_reader()
+        assert len(reader.queues[ResponseType.TEMPERATURE]) == 5
+
+    def test_devices_keep_separate_line_numbering(self):
+        first, second = MarlinDevice(FakeSerial()), MarlinDevice(FakeSerial())
+
+        first.stream(["G28", "G1 X1 Y1 Z1"])
+        second.stream(["G28"])
+
+        assert first.line_counter == 3
+        assert second.line_counter == 2
+        assert second._device.written[0].startswith(b"N1 G28")
+
+    def test_set_line_number(self):
+        printer = MarlinDevice(FakeSerial())
+        printer.stream(["G28", "G28"])
+
+        printer.set_line_number(0)
+        printer.stream(["G28"])
+
+        assert printer._device.written[-2].startswith(b"N0 M110 N0")
+        assert printer._device.written[-1].startswith(b"N1 G28")
+
+
+class TestMotionSyncM114:
+    def test_position_is_read_in_mm_not_steps(self):
+        report = b"X:10.00 Y:20.00 Z:5.00 E:0.00 Count X:1000 Y:2000 Z:2000\n"
+        printer = MarlinDevice(FakeSerial(scripted_replies=[[report, b"ok\n"]]))
+
+        assert printer.query_position() == (10, 20, 5)
+
+    def test_head_that_never_arrives_raises(self):
+        report = b"X:0.00 Y:0.00 Z:0.00 E:0.00 Count X:0 Y:0 Z:0\n"
+        printer = MarlinDevice(FakeSerial(replies_per_line=(report, b"ok\n"), scripted_replies=[[b"ok\n"]]))
+        printer.set_current_position(0, 0, 0)
+        printer.motion_sync = MotionSync.M114
+        printer.motion_timeout_margin = 0.2
+
+        with pytest.raises(SerialException, match="did not reach"):
+            printer.send_and_await("G1 X1 F6000")
+
+
+class TestRealtimeCommands:
+    def test_realtime_command_is_written_unnumbered(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+
+        latency = printer.send_realtime("M410")
+        printer.stream(["G1 X1 Y1 Z1"], window=1)
+
+        assert port.written[0] == b"M410\n"
+        assert port.written[1].startswith(b"N1 G1")
+        # reply to M410 is skipped, G1 is acknowledged by its own 'ok'
+        assert port.replies == []
+        assert latency == printer.realtime_latencies[-1] < 0.01
+        assert printer.get_current_position() == (1, 1, 1)
+
+    def test_regular_command_is_rejected(self):
+        with pytest.raises(ValueError):
+            MarlinDevice(FakeSerial()).send_realtime("G1 X1")
+
+    def test_stop_interrupts_predicted_time_sleep(self):
+        printer = MarlinDevice(FakeSerial())
+        printer.set_current_position(0, 0, 0)
+        # about 200 s long move
+        sender = threading.Thread(target=printer.send_and_await, args=("G1 X200 F60",))
+        sender.start()
+
+        time.sleep(0.1)
+        printer.send_realtime("M410")
+        sender.join(timeout=2)
+
+        assert not sender.is_alive()
+
+    def test_pause_holds_regular_lines(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        printer.pause()
+
+        sender = threading.Thread(target=printer.stream, args=(["G28", "G1 X1 Y1 Z1"],))
+        sender.start()
+        time.sleep(0.1)
+
+        printer.send_realtime("M108")
+        assert port.written == [b"M108\n"]
+
+        printer.resume()
+        sender.join(timeout=2)
+        assert len(port.written) == 3
+
+
+class TestSendBatch:
+    def test_lines_are_coalesced_within_rx_budget(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        printer.speed = 900
+
+        assert printer.send_batch([f"G1 X{x % 10} Y1" for x in range(40)], rx_buffer_size=128) == 40
+
+        assert len(port.lines) == 40
+        assert len(port.written) < 20
+        assert all(len(write) <= 128 for write in port.written)
+        assert printer.write_calls == len(port.written)
+        assert printer.get_current_position()[0] == 9
+
+    def test_line_longer_than_rx_buffer(self):
+        with pytest.raises(ValueError):
+            MarlinDevice(FakeSerial()).send_batch(["G1 X1 Y1 Z1"], rx_buffer_size=10)
+
+    def test_resend_inside_batch(self):
+        # first line of first batch is corrupted, device drops it and everything after it
+        port = FakeSerial(
+            scripted_replies=(
+                (b"Error:checksum mismatch, Last Line: 0\n", b"Resend: 1\n", b"ok\n"),
+                (),
+                (),
+            )
+        )
+        printer = MarlinDevice(port)
+
+        assert printer.send_batch(["G1 X1", "G1 X2", "G1 X3"], rx_buffer_size=128) == 3
+        assert len(port.written) == 4
+        assert port.written[1:] == port.written[0].splitlines(keepends=True)
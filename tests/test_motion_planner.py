@@ -0,0 +1,80 @@
+import pytest
+
+from printer_device_connector.motion_planner import (
+    PrinterProfile,
+    estimate_move_time,
+    estimate_path_time,
+    plan_move_times,
+)
+
+
+class TestPrinterProfile:
+    @pytest.mark.parametrize(
+        "command, attribute, expected",
+        [
+            ("M201 X1000 Y1000 Z200 E5000", "max_acceleration", {"X": 1000, "Y": 1000, "Z": 200, "E": 5000}),
+            ("M203 X300 Z5", "max_feedrate", {"X": 300, "Y": 200, "Z": 5, "E": 120}),
+            ("M205 X10 Y10 Z0.2", "jerk", {"X": 10, "Y": 10, "Z": 0.2, "E": 4.5}),
+        ],
+    )
+    def test_apply_axis_limits(self, command, attribute, expected):
+        profile = PrinterProfile()
+        assert profile.apply_command(command)
+        assert getattr(profile, attribute) == expected
+
+    def test_apply_acceleration(self):
+        profile = PrinterProfile()
+        profile.apply_command("M204 S500")
+        assert (profile.print_acceleration, profile.travel_acceleration) == (500, 500)
+
+        profile.apply_command("M204 P800 T1500")
+        assert (profile.print_acceleration, profile.travel_acceleration) == (800, 1500)
+
+    def test_other_commands_are_ignored(self):
+        assert not PrinterProfile().apply_command("G1 X10")
+
+
+class TestMoveTime:
+    def test_long_move_cruises_at_feedrate(self):
+        profile = PrinterProfile(jerk={"X": 0, "Y": 0, "Z": 0})
+        # 100 mm at 50 mm/s with 1000 mm/s^2: 2 * 0.05 s ramps (1.25 mm each), 97.5 mm cruise
+        assert estimate_move_time(profile, (0, 0, 0), (100, 0, 0), 3000) == pytest.approx(0.1 + 97.5 / 50)
+
+    def test_short_move_never_reaches_feedrate(self):
+        profile = PrinterProfile(jerk={"X": 0, "Y": 0, "Z": 0})
+        # triangle profile: 2 * sqrt(d / a)
+        assert estimate_move_time(profile, (0, 0, 0), (1, 0, 0), 6000) == pytest.approx(2 * (1 / 1000) ** 0.5)
+
+    def test_z_move_is_limited_by_z_axis(self):
+        profile = PrinterProfile()
+        xy_time = estimate_move_time(profile, (0, 0, 0), (50, 0, 0), 3000)
+        z_time = estimate_move_time(profile, (0, 0, 0), (0, 0, 50), 3000)
+
+        # Z max feedrate is 12 mm/s
+        assert z_time > 50 / 12
+        assert z_time > 3 * xy_time
+
+    def test_zero_length_move(self):
+        assert estimate_move_time(PrinterProfile(), (1, 2, 3), (1, 2, 3), 900) == 0
+
+
+class TestPathTime:
+    def test_straight_path_is_faster_than_stopping(self):
+        profile = PrinterProfile()
+        points = [(x, 0, 0) for x in range(1, 21)]
+
+        continuous = estimate_path_time(profile, (0, 0, 0), points, 3000)
+        stopping = sum(plan_move_times(profile, (0, 0, 0), [point], 3000)[0] for point in points)
+
+        assert continuous < stopping
+        assert continuous == pytest.approx(estimate_move_time(profile, (0, 0, 0), (20, 0, 0), 3000))
+
+    def test_stop_at_every_point_adds_command_overhead(self):
+        profile = PrinterProfile()
+        points = [(10, 0, 0), (10, 10, 0)]
+        expected = sum(
+            estimate_move_time(profile, start, end, 900) + profile.command_overhead
+            for start, end in zip([(0, 0, 0)] + points, points)
+        )
+
+        assert estimate_path_time(profile, (0, 0, 0), points, 900, stop_at_every_point=True) == pytest.approx(expected)
@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+from serial import SerialException
+
+pytest.importorskip("tty", reason="requires pseudo-terminal")
+
+from printer_device_connector import port_discovery
+from printer_device_connector.firmware_simulator import FirmwareSimulator
+from printer_device_connector.port_discovery import PortCache, discover_port
+
+
+@pytest.fixture
+def silent_ports():
+    # ports with nothing connected, probe waits for whole timeout on them
+    terminals = [os.openpty() for _ in range(4)]
+    yield [(os.ttyname(slave), "silent", f"USB VID:PID=0000:000{index}") for index, (_, slave) in enumerate(terminals)]
+
+    for master, slave in terminals:
+        os.close(master)
+        os.close(slave)
+
+
+class TestPortCache:
+    def test_store_and_load(self, tmp_path):
+        cache = PortCache(str(tmp_path / "ports.json"))
+        cache.store("USB VID:PID=2C99:0002", "/dev/ttyACM0", 115200)
+
+        assert PortCache(cache.path).load() == {"USB VID:PID=2C99:0002": ("/dev/ttyACM0", 115200)}
+
+    @pytest.mark.parametrize("content", [None, "", "not json"])
+    def test_missing_or_broken_cache_is_empty(self, tmp_path, content):
+        path = tmp_path / "ports.json"
+        if content is not None:
+            path.write_text(content)
+
+        assert PortCache(str(path)).load() == {}
+
+
+class TestDiscoverPort:
+    def test_ports_are_probed_concurrently(self, silent_ports):
+        with FirmwareSimulator() as simulator:
+            ports = silent_ports + [(simulator.port, "simulator", "USB VID:PID=2C99:0002")]
+
+            started = time.monotonic()
+            device, info = discover_port([250000], timeout=0.5, ports=ports)
+            elapsed = time.monotonic() - started
+            device.close()
+
+        assert info[0] == simulator.port
+        # sequential scan would wait 0.5 s on every silent port
+        assert elapsed < 1.5
+
+    def test_cached_port_is_tried_first(self, tmp_path, silent_ports, monkeypatch):
+        probes = []
+        probe_port = port_discovery.probe_port
+
+        def recording_probe(port, baudrates, timeout=1):
+            probes.append((port, list(baudrates)))
+            return probe_port(port, baudrates, timeout)
+
+        monkeypatch.setattr(port_discovery, "probe_port", recording_probe)
+        cache = PortCache(str(tmp_path / "ports.json"))
+
+        with FirmwareSimulator() as simulator:
+            ports = silent_ports + [(simulator.port, "simulator", "USB VID:PID=2C99:0002")]
+
+            discover_port([250000, 115200], timeout=0.2, ports=ports, cache=cache)[0].close()
+            assert cache.load() == {"USB VID:PID=2C99:0002": (simulator.port, 250000)}
+
+            probes.clear()
+            # let simulator notice that port was closed, it resets when opened again
+            time.sleep(0.05)
+            discover_port([250000, 115200], timeout=0.2, ports=ports, cache=cache)[0].close()
+
+        assert probes == [(simulator.port, [250000])]
+
+    def test_device_not_found(self, silent_ports):
+        with pytest.raises(SerialException):
+            discover_port([250000], timeout=0.1, ports=silent_ports)
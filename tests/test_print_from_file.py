@@ -0,0 +1,134 @@
+import time
+
+import pytest
+from serial import SerialException
+
+from g_code_file_handler.g_code_file import GCodeFile
+from print_from_file import PrintEngine
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.prusa_device import PrusaDevice
+from printer_device_connector.resend_buffer import ResendBuffer
+from tests.test_marin_device import FakeSerial
+
+
+class SlowFile:
+    """
+    File stand-in, that reads lines slower than device acknowledges them.
+    """
+
+    def __init__(self, commands, delay):
+        self._commands = commands
+        self.delay = delay
+
+    def commands(self):
+        for command in self._commands:
+            time.sleep(self.delay)
+            yield command
+
+
+class TestPrintEngine:
+    def test_prints_whole_file(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        expected = [
+            command.partition(";")[0].strip()
+            for command in GCodeFile("assets/anycubic_cobra_testing_block.gcode").commands()
+        ]
+        expected = [command for command in expected if command != ""]
+
+        statistics = PrintEngine(printer, GCodeFile("assets/anycubic_cobra_testing_block.gcode")).run()
+
+        assert statistics.lines_sent == len(expected) == len(port.lines)
+        assert [ResendBuffer.line_number(line) for line in port.lines] == list(range(1, len(expected) + 1))
+        assert all(b";" not in line for line in port.lines)
+        assert port.lines[0].startswith(bytes(f"N1 {expected[0]} N1*", "ascii"))
+
+    def test_reports_progress_and_underruns(self):
+        reports = []
+        printer = MarlinDevice(FakeSerial())
+        file = SlowFile([f"G1 X{x} Y1 Z1 ; move {x}" for x in range(20)], delay=0.01)
+
+        statistics = PrintEngine(printer, file, report_interval=0.05, on_progress=reports.append).run()
+
+        assert statistics.lines_sent == 20
+        assert statistics.underruns > 0
+        assert len(reports) > 1
+        assert statistics.lines_per_second > 0
+        assert printer.get_current_position() == (19, 1, 1)
+
+    def test_stop(self):
+        printer = MarlinDevice(FakeSerial())
+        engine = PrintEngine(printer, SlowFile(["G28"] * 1000, delay=0.001), report_interval=0.01)
+        engine.on_progress = lambda statistics: engine.stop()
+
+        statistics = engine.run()
+
+        assert 0 < statistics.lines_sent < 1000
+
+    def test_stop_drops_lookahead(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        engine = PrintEngine(printer, SlowFile(["G28"] * 1000, delay=0.001), report_interval=0.01)
+        engine.on_progress = lambda statistics: engine.stop()
+
+        statistics = engine.run()
+        printer.stream(["G1 X1 Y1 Z1"])
+
+        assert len(port.lines) == statistics.lines_sent + 1
+        # numbering continues after the last written line
+        assert port.lines[-1].startswith(bytes(f"N{statistics.lines_sent + 1} G1", "ascii"))
+
+    def test_line_numbering_after_lost_device(self):
+        port = FakeSerial(replies_per_line=(), scripted_replies=[[b"ok\n"]] * 50)
+        printer = MarlinDevice(port)
+
+        with pytest.raises(SerialException):
+            PrintEngine(printer, SlowFile([f"G1 X{x} Y1 Z1" for x in range(500)], delay=0)).run()
+
+        written = ResendBuffer.line_number(port.lines[-1])
+        assert printer.line_counter == written + 1
+
+    def test_state_is_updated_once_per_line(self):
+        printer = PrusaDevice(FakeSerial())
+        file = SlowFile(["G90", "M83", "G1 X10 Y10 Z1", "G91", "G1 X5 E2", "G1 X5 E2"], delay=0)
+
+        PrintEngine(printer, file).run()
+
+        assert printer.get_current_position() == (20, 10, 1)
+        assert printer.state.e == 4
+
+    def test_marlin_print_is_supervised(self):
+        # first 10 lines are acknowledged, then device goes silent
+        printer = MarlinDevice(FakeSerial(replies_per_line=(), scripted_replies=[[b"ok\n"]] * 10))
+        supervisor = printer.supervise(backoff=0)
+        reopened = FakeSerial()
+        supervisor.reopen = lambda: (reopened, False)
+
+        statistics = PrintEngine(printer, SlowFile([f"G1 X{x} Y1 Z1" for x in range(40)], delay=0)).run()
+
+        assert statistics.lines_sent == 40
+        assert supervisor.reconnects == 1
+        assert reopened.lines[-1].startswith(b"N")
+        assert b"G1 X39 Y1 Z1" in reopened.lines[-1]
+        assert printer.get_current_position() == (39, 1, 1)
+
+    def test_marlin_print_checks_bounds(self):
+        port = FakeSerial()
+        printer = MarlinDevice(port)
+        file = SlowFile(["G28", "G1 X10 Y10 Z1", f"G1 X{printer.x_size + 10}", "G1 X20"], delay=0)
+
+        with pytest.raises(ValueError):
+            PrintEngine(printer, file).run()
+
+        assert len(port.lines) == 2
+        assert printer.get_current_position() == (10, 10, 1)
+
+    def test_prusa_prints_purge_line_outside_bed(self):
+        port = FakeSerial()
+        printer = PrusaDevice(port)
+        file = GCodeFile("assets/testing_block_0.1mm_PLA_MK3S_9m.gcode")
+
+        statistics = PrintEngine(printer, file).run()
+
+        assert statistics.lines_sent == len(port.lines)
+        assert any(line.startswith(b"G1 Y-3") for line in port.lines)
@@ -0,0 +1,62 @@
+import pytest
+from serial import SerialException
+
+from printer_device_connector.resend_buffer import ResendBuffer
+
+
+class TestResendBuffer:
+    @pytest.mark.parametrize(
+        "example",
+        (
+            ("Resend: 12", 12),
+            ("Resend:12\n", 12),
+            ("rs 7", 7),
+            ("rs N7", 7),
+            ("ok", None),
+            ("echo:busy: processing", None),
+        ),
+    )
+    def test_parse_resend_request(self, example):
+        response, expected_value = example
+        assert ResendBuffer.parse_resend_request(response) == expected_value
+
+    @pytest.mark.parametrize(
+        "response",
+        (
+            "Error:checksum mismatch, Last Line: 3",
+            "Error:Line Number is not Last Line Number+1, Last Line: 3",
+            "Error:No Line Number with checksum, Last Line: 3",
+        ),
+    )
+    def test_is_transmission_error(self, response):
+        assert ResendBuffer.is_transmission_error(response)
+
+    def test_printer_halted_is_not_transmission_error(self):
+        assert not ResendBuffer.is_transmission_error("Error:Printer halted. kill() called!")
+
+    def test_request_returns_lines_from_requested_number(self):
+        buffer = ResendBuffer()
+        for number in range(1, 6):
+            buffer.store(f"N{number} G1 X{number}*0")
+
+        assert buffer.request(3) == ["N3 G1 X3*0", "N4 G1 X4*0", "N5 G1 X5*0"]
+        assert buffer.lines_resent == 3
+        assert buffer.resend_rate == 3 / 5
+
+    def test_duplicated_requests_are_skipped(self):
+        buffer = ResendBuffer()
+        for number in range(1, 4):
+            buffer.store(f"N{number} G1 X{number}*0")
+
+        assert len(buffer.request(2)) == 2
+        assert buffer.request(2) == []
+        assert len(buffer.request(2)) == 2
+        assert buffer.resend_requests == 3
+
+    def test_request_evicted_line(self):
+        buffer = ResendBuffer(size=2)
+        for number in range(1, 4):
+            buffer.store(f"N{number} G1 X{number}*0")
+
+        with pytest.raises(SerialException):
+            buffer.request(1)
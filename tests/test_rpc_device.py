@@ -0,0 +1,135 @@
+import socket
+import threading
+import time
+
+import pytest
+from serial import SerialException
+
+if not hasattr(socket, "AF_UNIX"):
+    pytest.skip("requires Unix sockets", allow_module_level=True)
+
+from printer_device_connector.api_server_simulator import ApiServerSimulator
+from printer_device_connector.rpc_device import RpcDevice, RpcError, parse_address
+from printer_device_connector.trajectory import Trajectory
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def server(request):
+    address = "127.0.0.1:0" if request.param == "tcp" else None
+    with ApiServerSimulator(address, time_scale=0.01) as server:
+        yield server
+
+
+@pytest.fixture
+def printer(server):
+    printer = RpcDevice.connect_on_port(server.address, timeout=1)
+    yield printer
+    printer.close()
+
+
+class TestParseAddress:
+    def test_tcp(self):
+        assert parse_address("localhost:7125") == (socket.AF_INET, ("localhost", 7125))
+        assert parse_address(":7125") == (socket.AF_INET, ("127.0.0.1", 7125))
+
+    def test_unix_socket(self):
+        assert parse_address("/tmp/klippy_uds") == (socket.AF_UNIX, "/tmp/klippy_uds")
+
+
+class TestRpcDevice:
+    def test_script_is_single_request(self, server, printer):
+        assert printer.info["state"] == "ready"
+
+        assert printer.run_script("G28\nG1 X10 Y20 Z5\nG1 X15\nM400") == 4
+
+        assert len(server.scripts) == 1
+        assert server.position == (15, 20, 5)
+        assert printer.get_current_position() == (15, 20, 5)
+        assert printer.query_position() == (15, 20, 5)
+
+    def test_serpentine_rows_as_scripts(self, server, printer):
+        path = Trajectory.from_xy([10, 10, 10, 20, 20, 20], [10, 20, 30, 30, 20, 10], 5)
+        printer.send_and_await("G28")
+
+        for row in path.rows():
+            printer.send_batch([f"G1 X{x} Y{y} Z{z}" for x, y, z in row])
+        printer.run_script(["M400"])
+
+        assert len(server.scripts) == 1 + 2 + 1
+        assert server.moves_executed == 6
+        assert server.live_position == (20, 10, 5)
+
+    def test_stream_splits_scripts(self, server, printer):
+        printer.max_script_lines = 10
+        printer.run_script(["G28"])
+
+        assert printer.stream(f"G1 X{x} Y1 Z1" for x in range(25)) == 25
+        assert len(server.scripts) == 1 + 3
+
+    def test_motion_events(self, printer):
+        positions = []
+        printer.run_script(["G28"])
+        initial = printer.subscribe(
+            {"motion_report": ["live_position"], "idle_timeout": ["state"]},
+            lambda eventtime, status: positions.append(status.get("motion_report", {}).get("live_position")),
+        )
+
+        printer.run_script(["G1 X10 Y1 Z1", "G1 X20 Y1 Z1", "G1 X30 Y1 Z1", "M400"])
+        time.sleep(0.1)
+
+        assert initial["idle_timeout"]["state"] == "Ready"
+        assert [10, 1, 1, 0] in positions and [20, 1, 1, 0] in positions
+        assert printer.status["motion_report"]["live_position"][:3] == [30, 1, 1]
+        assert printer.status["idle_timeout"]["state"] == "Ready"
+
+    def test_output_subscription(self, printer):
+        output = []
+        printer.subscribe_output(output.append)
+
+        printer.run_script(["G28", "G1 X5 Y6 Z7", "M114"])
+        time.sleep(0.1)
+
+        assert output == ["X:5.000 Y:6.000 Z:7.000 E:0.000"]
+
+    def test_move_before_homing_fails(self, server, printer):
+        with pytest.raises(RpcError, match="Must home axis first"):
+            printer.run_script(["G1 X10 Y10", "G1 X20 Y20"])
+
+        printer.run_script(["G28", "G1 X10 Y10"])
+        assert server.position == (10, 10, 0)
+
+    def test_emergency_stop_mid_move(self, server, printer):
+        printer.run_script(["G28"])
+        errors = []
+
+        def move():
+            try:
+                printer.run_script(["G1 X200 Y200 Z10 F300", "M400"])
+            except RpcError as ex:
+                errors.append(ex)
+
+        sender = threading.Thread(target=move)
+        sender.start()
+        time.sleep(0.2)
+
+        printer.emergency_stop()
+        sender.join(timeout=2)
+
+        assert not sender.is_alive()
+        assert "shutdown" in errors[0].message
+        assert 0 < server.live_position[0] < 200
+        assert printer.get_current_position() == (None, None, None)
+
+        printer.run_script(["FIRMWARE_RESTART"])
+        assert printer.call("info")["state"] == "ready"
+
+    def test_lost_connection(self, server, printer):
+        server.disconnect_clients()
+        time.sleep(0.2)
+
+        with pytest.raises(SerialException):
+            printer.run_script(["G28"])
+
+    def test_unreachable_server(self):
+        with pytest.raises(SerialException):
+            RpcDevice.connect_on_port("/nonexistent/klippy_uds")
@@ -0,0 +1,79 @@
+import queue
+
+import pytest
+
+from printer_device_connector.serial_reader import (
+    ResponseType,
+    SerialReader,
+    classify_response,
+)
+
+
+class LinePort:
+    """
+    Serial port stand-in, returning lines put in its queue.
+    """
+
+    port = "lines"
+    timeout = 0.1
+
+    def __init__(self):
+        self.lines = queue.Queue()
+
+    def readline(self):
+        try:
+            return self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            return b""
+
+
+class TestClassifyResponse:
+    @pytest.mark.parametrize(
+        "example",
+        (
+            ("ok", ResponseType.ACK),
+            ("ok T:210.0 /210.0 B:60.0 /60.0", ResponseType.ACK),
+            ("Resend: 3", ResponseType.RESEND),
+            ("Error:checksum mismatch, Last Line: 2", ResponseType.ERROR),
+            ("echo:busy: processing", ResponseType.BUSY),
+            ("busy: processing", ResponseType.BUSY),
+            ("start", ResponseType.START),
+            ("T:210.00 /210.00 B:60.00 /60.00 @:0 B@:0", ResponseType.TEMPERATURE),
+            ("X:10.00 Y:20.00 Z:5.00 E:0.00 Count X:800 Y:1600 Z:2000", ResponseType.POSITION),
+            ("echo:Unknown command: \"G999\"", ResponseType.ECHO),
+            ("FIRMWARE_NAME:Marlin", ResponseType.OTHER),
+        ),
+    )
+    def test_classify_response(self, example):
+        response, expected_type = example
+        assert classify_response(response) == expected_type
+
+
+class TestSerialReader:
+    def test_replies_are_handed_out_in_order(self):
+        port = LinePort()
+        reader = SerialReader(port)
+        reader.start()
+
+        first = reader.next_reply()
+        second = reader.next_reply()
+        third = reader.next_reply()
+        for line in (b"echo:busy: processing\n", b"ok\n", b"T:20.0 /0.0\n", b"Resend: 2\n"):
+            port.lines.put(line)
+
+        # busy keepalive goes to sender as well, it adapts silence timeout and busy statistics
+        assert first.result(timeout=1) == b"echo:busy: processing\n"
+        assert second.result(timeout=1) == b"ok\n"
+        assert third.result(timeout=1) == b"Resend: 2\n"
+
+        reader.stop()
+        assert list(reader.queues[ResponseType.BUSY]) == ["echo:busy: processing"]
+        assert list(reader.queues[ResponseType.TEMPERATURE]) == ["T:20.0 /0.0"]
+
+    def test_readline_times_out_with_empty_line(self):
+        reader = SerialReader(LinePort())
+        reader.start()
+
+        assert reader.readline() == b""
+
+        reader.stop()
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from serial import SerialException
+
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.session_recorder import (
+    ReplaySerial,
+    TraceDirection,
+    read_trace,
+    record_session,
+)
+from tests.test_marin_device import FakeSerial
+
+MOVES = [f"G1 X{x} Y{x} Z1" for x in range(10)]
+
+
+@pytest.fixture
+def trace(tmp_path):
+    path = str(tmp_path / "session.trace")
+    printer = MarlinDevice(FakeSerial(replies_per_line=(b"echo:busy: processing\n", b"ok\n")))
+    recorder = record_session(printer, path)
+    printer.stream(MOVES)
+    recorder.close()
+    return path
+
+
+class TestSessionRecorder:
+    def test_trace_holds_every_read_and_write(self, trace):
+        header, events = read_trace(trace)
+
+        writes = [event for event in events if event.direction == TraceDirection.WRITE]
+        reads = [event for event in events if event.direction == TraceDirection.READ]
+
+        assert header["port"] == "fake"
+        assert len(writes) == 10
+        assert writes[0].data.startswith(b"N1 G1 X0 Y0 Z1")
+        assert [read.data for read in reads[:2]] == [b"echo:busy: processing\n", b"ok\n"]
+        assert all(a.timestamp <= b.timestamp for a, b in zip(events, events[1:]))
+
+    def test_not_a_trace(self, tmp_path):
+        path = tmp_path / "file.trace"
+        path.write_bytes(b"G28\n")
+
+        with pytest.raises(ValueError):
+            read_trace(str(path))
+
+
+class TestReplaySerial:
+    def test_replay_as_fast_as_possible(self, trace):
+        port = ReplaySerial(trace, realtime=False, strict=True)
+        printer = MarlinDevice(port)
+
+        assert printer.stream(MOVES) == 10
+        assert port.finished
+        assert printer.get_current_position() == (9, 9, 1)
+
+    def test_strict_replay_detects_other_traffic(self, trace):
+        printer = MarlinDevice(ReplaySerial(trace, realtime=False, strict=True))
+
+        with pytest.raises(SerialException):
+            printer.stream(["G28"])
+
+    def test_realtime_replay_keeps_recorded_delays(self, tmp_path):
+        simulator_module = pytest.importorskip("printer_device_connector.firmware_simulator")
+        path = str(tmp_path / "session.trace")
+        dwells = ["G4 P200", "G4 P200"]
+
+        with simulator_module.FirmwareSimulator() as simulator:
+            printer = MarlinDevice.connect_on_port(simulator.port, timeout=0.5)
+            recorder = record_session(printer, path)
+            printer.stream(dwells, window=1)
+            recorder.close()
+
+        started = time.monotonic()
+        MarlinDevice(ReplaySerial(path, realtime=True)).stream(dwells, window=1)
+        realtime = time.monotonic() - started
+
+        started = time.monotonic()
+        MarlinDevice(ReplaySerial(path, realtime=False)).stream(dwells, window=1)
+        fast = time.monotonic() - started
+
+        assert realtime >= 0.35
+        assert fast < 0.1
@@ -0,0 +1,75 @@
+import pytest
+from serial import SerialException
+
+from printer_device_connector.marlin_device import MarlinDevice
+from tests.test_marin_device import FakeSerial
+
+
+class TestStreamReplay:
+    @pytest.mark.parametrize("reset", [False, True])
+    def test_replayed_lines(self, reset):
+        # first 10 lines are acknowledged, then device goes silent
+        printer = MarlinDevice(FakeSerial(replies_per_line=(), scripted_replies=[[b"ok\n"]] * 10))
+        printer.set_current_position(0, 0, 0)
+        supervisor = printer.supervise(backoff=0, replay_depth=4)
+        reopened = FakeSerial()
+        supervisor.reopen = lambda: (reopened, reset)
+
+        assert printer.stream([f"G1 X{x} Y1 Z1" for x in range(20)], window=4) == 20
+
+        commands = [line.split(b" F ")[0].split(b" ", 1)[1] for line in reopened.lines]
+        first_replayed = next(command for command in commands if command.endswith(b" Y1 Z1"))
+        if reset:
+            # planner was lost, acknowledged moves are executed again after homing
+            assert supervisor.commands_replayed == 4 + 5
+            assert b"G28" in commands and first_replayed == b"G1 X6 Y1 Z1"
+        else:
+            # acknowledged moves are still planned by firmware, only not acknowledged ones are sent again
+            assert supervisor.commands_replayed == 5
+            assert b"G28" not in commands and first_replayed == b"G1 X10 Y1 Z1"
+        assert commands[-1] == b"G1 X19 Y1 Z1"
+        assert printer.get_current_position() == (19, 1, 1)
+
+
+class MoveFailingSerial(FakeSerial):
+    """
+    Port that restores session, but breaks whenever the move itself is written.
+    """
+
+    def write(self, data):
+        if b"G1 X1 Y1 Z1" in data:
+            raise SerialException("write failed")
+        return super().write(data)
+
+
+class TestMaxAttempts:
+    @pytest.mark.parametrize("streamed", [False, True])
+    def test_command_that_always_fails_after_recovery(self, streamed):
+        printer = MarlinDevice(MoveFailingSerial())
+        printer.set_current_position(0, 0, 0)
+        supervisor = printer.supervise(backoff=0, max_attempts=3)
+        reopened = []
+
+        def reopen():
+            reopened.append(MoveFailingSerial())
+            return reopened[-1], False
+
+        supervisor.reopen = reopen
+
+        with pytest.raises(SerialException, match="3 attempts"):
+            if streamed:
+                printer.stream(["G1 X1 Y1 Z1"])
+            else:
+                printer.send_and_await("G1 X1 Y1 Z1")
+
+        assert len(reopened) == supervisor.reconnects == 3
+
+    def test_attempts_are_counted_until_progress(self):
+        # every reopened port acknowledges 5 lines and goes silent
+        printer = MarlinDevice(FakeSerial(replies_per_line=(), scripted_replies=[[b"ok\n"]] * 5))
+        printer.set_current_position(0, 0, 0)
+        supervisor = printer.supervise(backoff=0, max_attempts=2)
+        supervisor.reopen = lambda: (FakeSerial(replies_per_line=(), scripted_replies=[[b"ok\n"]] * 10), False)
+
+        assert printer.stream([f"G1 X{x} Y1 Z1" for x in range(20)]) == 20
+        assert supervisor.reconnects > supervisor.max_attempts
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from printer_device_connector.marlin_device import MarlinDevice
+from printer_device_connector.traffic_log import Direction, LogLevel, TrafficLog
+from tests.test_marin_device import FakeSerial
+
+
+class TestTrafficLog:
+    def test_silent_log_records_nothing(self):
+        log = TrafficLog(LogLevel.SILENT)
+        log.record(Direction.SENT, b"G28\n")
+        log.event("predicted %s", "1s")
+
+        assert log.records() == []
+
+    def test_traffic_level_skips_events(self):
+        log = TrafficLog(LogLevel.TRAFFIC)
+        log.record(Direction.SENT, b"G28\n")
+        log.event("predicted %s", "1s")
+
+        assert [(direction, data) for _, _, direction, data in log.records()] == [(Direction.SENT, b"G28\n")]
+
+    def test_event_is_formatted(self):
+        log = TrafficLog(LogLevel.INFO)
+        log.event("predicted time of execution: %.3fs", 1.25)
+
+        assert log.records()[0][3] == b"predicted time of execution: 1.250s"
+
+    def test_ring_keeps_newest_records(self):
+        log = TrafficLog(LogLevel.TRAFFIC, capacity=8)
+        for n in range(20):
+            log.record(Direction.SENT, bytes(f"N{n}", "ascii"))
+
+        assert [data for _, _, _, data in log.records()] == [bytes(f"N{n}", "ascii") for n in range(12, 20)]
+
+    def test_concurrent_writers(self):
+        log = TrafficLog(LogLevel.TRAFFIC, capacity=4000)
+
+        def write(direction):
+            for _ in range(1000):
+                log.record(direction, b"ok\n")
+
+        threads = [threading.Thread(target=write, args=(Direction.RECEIVED,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [record[0] for record in log.records()] == list(range(4000))
+
+    def test_flushing_to_file(self, tmp_path):
+        path = tmp_path / "traffic.log"
+        log = TrafficLog(LogLevel.TRAFFIC)
+        log.start_flushing(str(path), interval=0.01)
+        log.record(Direction.SENT, b"N1 G28 N1*12\n")
+        log.record(Direction.RECEIVED, b"ok\n")
+        log.stop_flushing()
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        assert lines[0].endswith("SENT     N1 G28 N1*12")
+        assert lines[1].endswith("RECEIVED ok")
+        assert log.dropped == 0
+
+
+class TestDeviceTraffic:
+    @pytest.mark.parametrize("with_reader", [False, True])
+    def test_device_records_traffic(self, with_reader):
+        printer = MarlinDevice(FakeSerial())
+        printer.traffic_log.level = LogLevel.TRAFFIC
+        if with_reader:
+            printer.start_reader()
+
+        printer.stream(["G28", "G1 X1 Y1 Z1"])
+        printer.stop_reader()
+
+        directions = [direction for _, _, direction, _ in printer.traffic_log.records()]
+        assert directions.count(Direction.SENT) == 2
+        assert directions.count(Direction.RECEIVED) == 2
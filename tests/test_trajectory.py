@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from pass_generators.simple_pass import simple_pass_3d_for_gui
+from printer_device_connector.trajectory import Point3D, Trajectory
+
+
+class TestPoint3D:
+    def test_slotted(self):
+        point = Point3D(1, 2, 3)
+
+        with pytest.raises(AttributeError):
+            point.w = 4
+
+        assert not hasattr(point, "__dict__")
+        assert tuple(point) == point.as_tuple() == (1, 2, 3)
+
+    def test_unknown_axis(self):
+        assert Point3D(1, None, 3).is_none()
+
+
+class TestTrajectory:
+    def test_contiguous_float_array(self):
+        trajectory = Trajectory([(1, 2, 3), (4, 5, 6)])
+
+        assert trajectory.points.dtype == np.float64
+        assert trajectory.points.shape == (2, 3)
+        assert trajectory.points.flags["C_CONTIGUOUS"]
+        assert list(trajectory) == [(1, 2, 3), (4, 5, 6)]
+        assert trajectory[1] == (4, 5, 6)
+
+    def test_empty(self):
+        assert len(Trajectory()) == 0
+        assert Trajectory().points.shape == (0, 3)
+
+    def test_rejects_2d_points(self):
+        with pytest.raises(ValueError):
+            Trajectory([(1, 2), (3, 4)])
+
+    def test_offset_and_bounds(self):
+        trajectory = Trajectory([(0, 5, 1), (10, -5, 1)]).offset(1, 2)
+
+        assert trajectory.min() == (1, -3, 1)
+        assert trajectory.max() == (11, 7, 1)
+        assert trajectory.bounds() == ((1, -3, 1), (11, 7, 1))
+
+    def test_lengths(self):
+        trajectory = Trajectory([(0, 0, 0), (3, 4, 0), (3, 4, 2)])
+
+        np.testing.assert_allclose(trajectory.segment_lengths(), [5, 2])
+        np.testing.assert_allclose(trajectory.distances_from((0, 0, 0)), [0, 5, np.sqrt(29)])
+        assert trajectory.length == pytest.approx(7)
+
+    def test_slice(self):
+        trajectory = Trajectory([(x, 0, 0) for x in range(5)])
+
+        assert trajectory[2:] == Trajectory([(x, 0, 0) for x in range(2, 5)])
+
+
+class TestSimplePass:
+    def test_snake_pattern(self):
+        path, antenna_path = simple_pass_3d_for_gui((10, 20), (10, 10, 0), (1, 2), 5, 4)
+
+        assert antenna_path.as_tuples() == [
+            (12.5, 22.5, 4), (12.5, 27.5, 4), (12.5, 32.5, 4),
+            (17.5, 32.5, 4), (17.5, 27.5, 4), (17.5, 22.5, 4),
+            (22.5, 22.5, 4), (22.5, 27.5, 4), (22.5, 32.5, 4),
+        ]
+        assert path == antenna_path.offset(1, 2)
+
+    def test_rows_of_snake_pattern(self):
+        path, _ = simple_pass_3d_for_gui((10, 20), (10, 10, 0), (1, 2), 5, 4)
+
+        rows = path.rows()
+
+        assert [len(row) for row in rows] == [3, 3, 3]
+        assert rows[1] == path[3:6]
+        assert Trajectory([(0, 0, 0)]).rows() == [Trajectory([(0, 0, 0)])]
+        assert Trajectory().rows() == []